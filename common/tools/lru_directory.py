@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Evicting below the cap leaves headroom so a full cache is not rescanned on every write.
+EVICTION_TARGET_RATIO = 0.9
+
+
+class LRUDirectory:
+    # One file per key under a directory whose total size is capped. Reads refresh
+    # a file's mtime, and the files with the oldest mtimes are evicted first.
+    def __init__(self, directory: Path, max_bytes: int, suffix: str, label: str = "cache") -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.label = label
+        self.writes = 0
+        self.evictions = 0
+        self._size: int | None = None
+        self._lock = threading.Lock()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}{self.suffix}"
+
+    def read(self, key: str) -> bytes | None:
+        path = self.path(key)
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as exc:
+            logger.warning("Discarding unreadable %s entry %s: %s", self.label, path.name, exc)
+            path.unlink(missing_ok=True)
+            return None
+
+    def touch(self, key: str) -> None:
+        try:
+            os.utime(self.path(key))
+        except OSError:
+            pass
+
+    def discard(self, key: str) -> None:
+        self.path(key).unlink(missing_ok=True)
+
+    def write(self, key: str, payload: bytes) -> bool:
+        if len(payload) > self.max_bytes:
+            logger.debug("%s entry of %d bytes exceeds cache size; not cached", self.label, len(payload))
+            return False
+        self.directory.mkdir(parents=True, exist_ok=True)
+        handle, temp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, "wb") as temp_file:
+            temp_file.write(payload)
+        os.replace(temp_name, self.path(key))
+        with self._lock:
+            self.writes += 1
+            if self._size is None:
+                self._evict()
+            else:
+                self._size += len(payload)
+                if self._size > self.max_bytes:
+                    self._evict()
+        return True
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as iterator:
+            for entry in iterator:
+                if not entry.name.endswith(self.suffix):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        self._size = total
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * EVICTION_TARGET_RATIO)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+        self._size = total
+        logger.debug("%s evicted down to %d bytes", self.label, total)
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import logging
+import sys
+from pathlib import Path
+
+from settings import PROJECT_SETTINGS
+from common.tools.tools import load_workflow_module
+
+batch_module = load_workflow_module("workflow_2", "storeproc_batch")
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.DEBUG if PROJECT_SETTINGS.get("debug") else logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+    if len(sys.argv) < 2:
+        raise RuntimeError("Usage: python main-batch.py <directory|glob|file.sql> [domain_mapper.json]")
+    input_dir = Path(PROJECT_SETTINGS.get("input_dir", "."))
+    output_root = Path(PROJECT_SETTINGS.get("output_dir", "output"))
+    request_id = PROJECT_SETTINGS.get("request_id")
+    request_dir = input_dir / request_id if request_id else input_dir
+    request_output_dir = output_root / request_id if request_id else output_root
+    artifacts_dir = request_output_dir / PROJECT_SETTINGS.get("artifacts_subdir", "artifacts")
+    if len(sys.argv) > 2:
+        mapping_path = Path(sys.argv[2])
+    else:
+        mapping_path = request_dir / PROJECT_SETTINGS.get("domain_mapping_filename", "domain_mapper.json")
+    output_path = artifacts_dir / PROJECT_SETTINGS.get("batch_output_filename", "storeproc_batch.ndjson")
+
+    summary = batch_module.run_storeproc_batch(sys.argv[1], mapping_path, output_path)
+    print(f"Parsed {summary['procedures']} procedures from {summary['sources']} files in {summary['elapsed_seconds']}s")
+    print(f"Succeeded: {summary['succeeded']}  Failed: {summary['failed']}")
+    print(f"Parse cache: {summary['cache_hits']} hits, {summary['cache_misses']} misses")
+    print(f"NDJSON results stored at: {summary['output']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import logging
+import sys
+
+from settings import PROJECT_SETTINGS
+from common.tools.tools import load_workflow_module
+
+benchmark_module = load_workflow_module("workflow_2", "storeproc_benchmark")
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    results = benchmark_module.run_parser_benchmark()
+    for result in results:
+        print(
+            f"{result['statements']:>6} statements {result['layout']:<11} "
+            f"{result['bytes'] / 1_000_000:6.2f} MB  legacy {result['legacy_seconds']:.4f}s  "
+            f"tokenized {result['tokenized_seconds']:.4f}s  speedup x{result['speedup']}  "
+            f"identical={result['identical']}"
+        )
+    incremental = benchmark_module.run_incremental_benchmark()
+    print(
+        f"{incremental['statements']:>6} statements, {incremental['edits']} single-statement edits  "
+        f"full {incremental['full_seconds']:.4f}s  incremental {incremental['incremental_seconds']:.4f}s  "
+        f"speedup x{incremental['speedup']}  identical={incremental['identical']}"
+    )
+    phase_results = benchmark_module.run_phase_benchmark()
+    for result in phase_results:
+        phases = "  ".join(f"{phase} {seconds * 1000:.1f}ms" for phase, seconds in result["phases"].items())
+        print(
+            f"{result['case']:<16} {result['statements_per_second']:>8} stmt/s  {result['mb_per_second']:6.2f} MB/s  "
+            f"peak {result['peak_memory_mb']:.1f} MB  {phases}"
+        )
+    summary_results = benchmark_module.run_summary_token_benchmark()
+    for result in summary_results:
+        print(
+            f"{result['lines']:>7} lines {result['layout']:<11} naive {result['naive_tokens']:>8} tokens "
+            f"(fits={result['naive_fits']})  chunked {result['chunked_tokens']:>8} tokens in {result['chunks']} chunks "
+            f"x{result['ratio']}  largest call {result['largest_call_tokens']} (fits={result['fits']})"
+        )
+    if not all(result["identical"] for result in results):
+        raise RuntimeError("Tokenized parser output diverged from the legacy parser.")
+    # Gate on the aggregate so a noisy small case cannot fail the run; the large cases dominate the totals
+    # and per-phase regressions are caught by the baseline comparison below.
+    min_speedup = float(PROJECT_SETTINGS.get("benchmark_min_speedup", 0.9))
+    tokenized_total = sum(result["tokenized_seconds"] for result in results)
+    aggregate_speedup = round(sum(result["legacy_seconds"] for result in results) / tokenized_total, 2) if tokenized_total else None
+    print(f"Aggregate speedup over the legacy parser: x{aggregate_speedup}")
+    if not aggregate_speedup or aggregate_speedup < min_speedup:
+        raise RuntimeError(
+            f"Tokenized parser is below the x{min_speedup} aggregate speedup over the legacy parser: x{aggregate_speedup}"
+        )
+    if not incremental["identical"]:
+        raise RuntimeError("Incremental parser output diverged from a full parse.")
+    if not all(result["fits"] for result in summary_results):
+        raise RuntimeError("A chunked summary call exceeds the model context window.")
+    if "--record" in sys.argv[1:]:
+        print(f"Benchmark baseline stored at: {benchmark_module.save_baseline(phase_results)}")
+        return
+    regressions = benchmark_module.compare_with_baseline(phase_results)
+    if regressions:
+        raise RuntimeError("Parser benchmark regressed against the baseline:\n" + "\n".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
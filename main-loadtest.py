@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import logging
+import sys
+from contextlib import ExitStack
+
+from common.tools.tools import load_workflow_module
+
+mock_module = load_workflow_module("workflow_1", "llm_mock_server")
+loadtest_module = load_workflow_module("workflow_1", "llm_loadtest")
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    options = [argument for argument in sys.argv[1:] if argument.startswith("--")]
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+    base_urls = [option.split("=", 1)[1] for option in options if option.startswith("--base-url=")]
+    requests = int(arguments[0]) if arguments else None
+    concurrency = int(arguments[1]) if len(arguments) > 1 else None
+    servers = []
+    with ExitStack() as stack:
+        if not base_urls:
+            # --hedge adds a second mock endpoint so calls can be hedged across the two.
+            for seed_offset in range(2 if "--hedge" in options else 1):
+                config = mock_module.MockLLMConfig.from_settings()
+                if config.seed is not None:
+                    config = mock_module.MockLLMConfig.from_settings({"seed": config.seed + seed_offset})
+                servers.append(stack.enter_context(mock_module.MockLLMServer(config)))
+            base_urls = [server.base_url for server in servers]
+        overrides = {"endpoints": [{"base_url": base_url} for base_url in base_urls[1:]]}
+        report = loadtest_module.run_load_test(base_urls[0], requests, concurrency, overrides)
+        server_stats = [server.stats() for server in servers]
+    for line in loadtest_module.format_report(report):
+        print(line)
+    print(f"Connection pool: {report['pool']}")
+    print(f"LLM calls by agent: {report['agents']}")
+    for stats in server_stats:
+        print(f"Mock server: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ from common.tools.tools import load_workflow_module
 
 
 def main() -> None:
-    llm_module = load_workflow_module("workflow_1", "llm")
+    agents_module = load_workflow_module("workflow_1", "agents")
     parse_module = load_workflow_module("workflow_2", "storeproc_parse_mapper")
     domain_design_module = load_workflow_module("workflow_3", "domian_Service_Design")
     graph_module = load_workflow_module("workflow_3", "storeproc_graph")
@@ -18,7 +18,6 @@ def main() -> None:
     context_module = load_workflow_module("workflow_4", "service_context_creator")
     compiler_module = load_workflow_module("workflow_4", "complier")
 
-    client = llm_module.create_llm_client()
     input_dir = Path(PROJECT_SETTINGS.get("input_dir", "input"))
     request_id = PROJECT_SETTINGS.get("request_id")
     request_dir = input_dir / request_id if request_id else input_dir
@@ -33,60 +32,60 @@ def main() -> None:
     proc_path = request_dir / PROJECT_SETTINGS.get("stored_procedure_filename", "storeproc.sql")
     mapping_path = request_dir / PROJECT_SETTINGS.get("domain_mapping_filename", "domain_mapper.json")
 
-    stored_proc_text = proc_path.read_text(encoding="utf-8")
+    domain_mapped_proc = None
     try:
-        llm_response = client.chat(
-            [
-                {"role": "system", "content": "You are a helpful architect who summarises stored procedures."},
-                {"role": "user", "content": f"Summarise this stored procedure:\n{stored_proc_text}"},
-            ],
-            max_tokens=200,
-            purpose="stored-proc-summary",
+        domain_mapped_proc, overview_path = parse_module.run_storeproc_parse_mapper(
+            proc_path, mapping_path, artifacts_dir
         )
-    except RuntimeError as exc:
-        print(f"LLM summary call failed: {exc}")
-        llm_response = {"error": str(exc)}
-        summary = ""
-    else:
-        summary = ""
-        choices = llm_response.get("choices")
-        if choices:
-            summary = choices[0].get("message", {}).get("content", "") or ""
-    print("LLM summary:")
-    printable_summary = summary.strip()
-    if printable_summary:
+        overview_agent = agents_module.agent_registry().get("storeproc_overview")
         encoding = sys.stdout.encoding or "utf-8"
-        safe_summary = printable_summary.encode(encoding, errors="ignore").decode(encoding, errors="ignore")
-        print(safe_summary)
-    else:
-        print(llm_response)
+        print("LLM summary:")
+        try:
+            # Large procedures are summarised in token-budgeted chunks and reduced;
+            # the final summary streams either way.
+            with overview_agent.narrate_procedure(domain_mapped_proc, max_tokens=200) as summary_stream:
+                for delta in summary_stream:
+                    print(delta.encode(encoding, errors="ignore").decode(encoding, errors="ignore"), end="", flush=True)
+        except RuntimeError as exc:
+            print(f"LLM summary call failed: {exc}")
+        else:
+            print()
+            ttft = f"{summary_stream.ttft:.3f}s" if summary_stream.ttft is not None else "n/a"
+            print(f"LLM summary time to first token: {ttft}, total: {summary_stream.duration:.3f}s")
 
-    domain_mapped_proc, overview_path = parse_module.run_storeproc_parse_mapper(proc_path, mapping_path, artifacts_dir)
-    domain_services = domain_design_module.run_domain_service_design(domain_mapped_proc)
-    graph_artifacts = graph_module.run_storeproc_graph(domain_services, domain_mapped_proc, artifacts_dir)
-    mermaid_artifacts = viewer_module.run_storeproc_viewer(domain_services, domain_mapped_proc, artifacts_dir)
-    service_architecture = architecture_module.run_service_architecture(domain_services, domain_mapped_proc)
-    generated_paths = generator_module.run_code_generator(service_architecture, output_root=services_dir)
-    context_paths = context_module.run_service_context_creator(
-        service_architecture,
-        domain_services,
-        domain_mapped_proc,
-        output_root=services_dir,
-    )
-    compiler_summary = compiler_module.run_compiler(generated_paths + context_paths)
+        domain_services = domain_design_module.run_domain_service_design(domain_mapped_proc)
+        graph_artifacts = graph_module.run_storeproc_graph(domain_services, domain_mapped_proc, artifacts_dir)
+        mermaid_artifacts = viewer_module.run_storeproc_viewer(domain_services, domain_mapped_proc, artifacts_dir)
+        service_architecture = architecture_module.run_service_architecture(domain_services, domain_mapped_proc)
+        generated_paths = generator_module.run_code_generator(service_architecture, output_root=services_dir)
+        context_paths = context_module.run_service_context_creator(
+            service_architecture,
+            domain_services,
+            domain_mapped_proc,
+            output_root=services_dir,
+        )
+        compiler_summary = compiler_module.run_compiler(generated_paths + context_paths)
 
-    print(f"Graph stored at: {graph_artifacts['json']}")
-    print(f"GraphML stored at: {graph_artifacts['graphml']}")
-    if "graphdb" in graph_artifacts:
-        print(f"Graph DB updated at: {graph_artifacts['graphdb']}")
-    if overview_path:
-        print(f"Stored procedure overview stored at: {overview_path}")
-    print(f"Mermaid diagram stored at: {mermaid_artifacts['mermaid']}")
-    if mermaid_artifacts.get("png"):
-        print(f"Mermaid PNG stored at: {mermaid_artifacts['png']}")
-    print(f"Generated artifacts: {len(generated_paths)}")
-    print(f"Service context files created: {len(context_paths)}")
-    print(f"Compiler summary: {compiler_summary}")
+        print(f"Graph stored at: {graph_artifacts['json']}")
+        print(f"GraphML stored at: {graph_artifacts['graphml']}")
+        if "graphdb" in graph_artifacts:
+            print(f"Graph DB updated at: {graph_artifacts['graphdb']}")
+        if overview_path:
+            print(f"Stored procedure overview stored at: {overview_path}")
+        print(f"Mermaid diagram stored at: {mermaid_artifacts['mermaid']}")
+        if mermaid_artifacts.get("png"):
+            print(f"Mermaid PNG stored at: {mermaid_artifacts['png']}")
+        print(f"Generated artifacts: {len(generated_paths)}")
+        print(f"Service context files created: {len(context_paths)}")
+        print(f"Compiler summary: {compiler_summary}")
+    finally:
+        if domain_mapped_proc is not None:
+            # Every stage has read its spans; release the memory-mapped source.
+            domain_mapped_proc.close()
+        # The shared client and its pool are closed, and the counts logged, even when a stage fails.
+        agent_calls = agents_module.close_agent_registry()
+    for agent, counts in sorted(agent_calls.items()):
+        print(f"LLM calls by {agent}: {counts['calls']} ({counts['cache_hits']} from cache)")
 
 
 if __name__ == "__main__":
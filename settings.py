@@ -7,12 +7,70 @@ PROJECT_SETTINGS = {
         "api_key": "some-token",
         "model": "deepseek/deepseek-chat-v3.1:free",
         "timeout": 30.0,
+        "pool_max_connections": 10,
+        "pool_max_per_host": 4,
+        "pool_idle_timeout": 60.0,
+        "max_concurrency": 4,
+        "cache_enabled": True,
+        "cache_dir": "common/cache/llm",
+        "cache_max_bytes": 64 * 1024 * 1024,
+        "cache_ttl_seconds": 7 * 24 * 3600,
+        "cache_mode": "use",
+        "requests_per_minute": 20,
+        "tokens_per_minute": None,
+        "max_retries": 4,
+        "backoff_base_seconds": 1.0,
+        "backoff_max_seconds": 30.0,
+        "circuit_failure_threshold": 5,
+        "circuit_reset_seconds": 60.0,
+        "context_window_tokens": 32768,
+        "cassette_mode": "off",
+        "cassette_path": "common/cassettes/llm.jsonl",
+        "cassette_latency": "none",
+        "structured_output": "json_schema",
+        "structured_max_reprompts": 1,
+        # Further {"base_url", "model", "api_key", "headers"} endpoints; missing keys
+        # fall back to the primary endpoint above. Calls slower than the current
+        # endpoint's hedge_percentile latency are duplicated on the next one.
+        "endpoints": [],
+        "hedge_percentile": 0.95,
+        "hedge_delay_seconds": 10.0,
+        "hedge_min_delay_seconds": 1.0,
+        "hedge_min_samples": 20,
+        "hedge_max_in_flight": 2,
         "headers": {
             "HTTP-Referer": "https://store-proc-designer.local",
             "X-Title": "Store Proc Designer",
             "X-OpenRouter-Data-Collection-Opt-Out": "False",
         },
     },
+    "llm_mock": {
+        "host": "127.0.0.1",
+        "port": 0,
+        "ttft_median_seconds": 0.5,
+        "latency_sigma": 0.5,
+        "tokens_per_second": 40.0,
+        "completion_tokens": 120,
+        "error_rate": 0.02,
+        "rate_limit_rate": 0.05,
+        "retry_after_seconds": 1.0,
+        "malformed_json_rate": 0.1,
+        "seed": 7,
+    },
+    "loadtest": {
+        "requests": 150,
+        "concurrency": 50,
+        "client_overrides": {
+            "cache_enabled": False,
+            "requests_per_minute": 0,
+            "pool_max_connections": 50,
+            "pool_max_per_host": 50,
+            "backoff_base_seconds": 0.2,
+            "hedge_min_samples": 10,
+            # Small enough that the load test's large procedure is summarised map-reduce.
+            "context_window_tokens": 8192,
+        },
+    },
     "output_dir": "output",
     "prompts_dir": "common/prompts/generate",
     "generated_dir": "generated",
@@ -29,6 +87,30 @@ PROJECT_SETTINGS = {
     "artifacts_subdir": "artifacts",
     "graphdb_dir": "common/graphdb",
     "graphdb_file": "graphdb.json",
+    "batch_output_filename": "storeproc_batch.ndjson",
+    "batch_workers": None,
+    "parse_cache_enabled": True,
+    "parse_cache_dir": "common/cache/parse",
+    "parse_cache_max_bytes": 256 * 1024 * 1024,
+    "incremental_parse_enabled": True,
+    "incremental_state_dir": "common/cache/incremental",
+    "source_mmap_threshold_bytes": 16 * 1024 * 1024,
+    "statement_scan_timeout_seconds": 2.0,
+    "sql_dialect": "auto",
+    "column_type_catalog_filename": "column_types.json",
+    "type_inference_min_confidence": 0.6,
+    "overview_model_summary": False,
+    "overview_model_summary_max_tokens": 400,
+    "agent_llm_design": False,
+    # Chunks fill the context window unless capped here.
+    "summary_chunk_tokens": None,
+    "summary_chunk_overlap_tokens": 400,
+    "summary_chunk_max_tokens": 300,
+    "benchmark_baseline_path": "common/benchmarks/storeproc_parser_baseline.json",
+    "benchmark_regression_tolerance": 0.35,
+    # Minimum aggregate speedup of the tokenized parser over the legacy one. Kept below 1.0 as a margin for
+    # timing noise; regressions against the recorded baseline use benchmark_regression_tolerance.
+    "benchmark_min_speedup": 0.9,
     "maven_executable": "C:\\Program Files\\Apache\\apache-maven-3.9.11\\bin\\mvn.cmd",
     "service_base_package_pattern": "com.barclays.uscb.{service}",
     "java_home": "C:\Program Files\Java\jdk-21",
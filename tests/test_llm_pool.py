@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from typing import Iterator, List
+
+import pytest
+
+from common.tools.tools import load_workflow_module
+
+pool_module = load_workflow_module("workflow_1", "llm_pool")
+mock_module = load_workflow_module("workflow_1", "llm_mock_server")
+
+REQUEST_BODY = json.dumps(
+    {"model": "mock", "messages": [{"role": "user", "content": "Summarise the procedure."}], "max_tokens": 3}
+).encode("utf-8")
+REQUEST_HEADERS = {"Content-Type": "application/json"}
+
+
+@pytest.fixture
+def server() -> Iterator[mock_module.MockLLMServer]:
+    config = mock_module.MockLLMConfig(
+        port=0, ttft_median_seconds=0.0, latency_sigma=0.0, tokens_per_second=1000.0, completion_tokens=3, seed=7
+    )
+    with mock_module.MockLLMServer(config) as running:
+        yield running
+
+
+def _post(pool: pool_module.HTTPConnectionPool, server: mock_module.MockLLMServer) -> pool_module.HTTPResult:
+    result = pool.request("POST", f"{server.base_url}/chat/completions", REQUEST_BODY, REQUEST_HEADERS)
+    assert result.status == 200
+    return result
+
+
+def test_keep_alive_connection_is_reused(server: mock_module.MockLLMServer) -> None:
+    pool = pool_module.HTTPConnectionPool(max_connections=4, max_per_host=2)
+    try:
+        results = [_post(pool, server) for _ in range(3)]
+        assert [result.timings.reused for result in results] == [False, True, True]
+        assert pool.stats() == {"open": 1, "idle": 1, "created": 1, "reused": 2}
+    finally:
+        pool.close()
+    assert pool.stats()["open"] == 0
+
+
+def test_idle_connection_is_evicted(server: mock_module.MockLLMServer) -> None:
+    pool = pool_module.HTTPConnectionPool(idle_timeout=0.1)
+    try:
+        _post(pool, server)
+        time.sleep(0.3)
+        result = _post(pool, server)
+        assert not result.timings.reused
+        assert pool.stats() == {"open": 1, "idle": 1, "created": 2, "reused": 0}
+    finally:
+        pool.close()
+
+
+def test_per_host_limit_makes_callers_wait(server: mock_module.MockLLMServer) -> None:
+    pool = pool_module.HTTPConnectionPool(max_connections=4, max_per_host=1)
+    url = f"{server.base_url}/chat/completions"
+    results: List[pool_module.HTTPResult] = []
+    try:
+        with pool.send("POST", url, REQUEST_BODY, REQUEST_HEADERS) as (response, _):
+            waiter = threading.Thread(target=lambda: results.append(_post(pool, server)))
+            waiter.start()
+            time.sleep(0.2)
+            # The only connection to the host is busy, so the waiter has not been sent.
+            assert not results
+            assert pool.stats()["open"] == 1
+            response.read()
+        waiter.join(timeout=5)
+        assert len(results) == 1 and results[0].timings.reused
+        assert pool.stats() == {"open": 1, "idle": 1, "created": 1, "reused": 1}
+    finally:
+        pool.close()
+
+
+def test_waiter_gives_up_when_no_connection_frees(server: mock_module.MockLLMServer) -> None:
+    pool = pool_module.HTTPConnectionPool(max_connections=4, max_per_host=1, timeout=0.2)
+    url = f"{server.base_url}/chat/completions"
+    try:
+        with pool.send("POST", url, REQUEST_BODY, REQUEST_HEADERS) as (response, _):
+            with pytest.raises(pool_module.PoolExhaustedError):
+                pool.request("POST", url, REQUEST_BODY, REQUEST_HEADERS)
+            response.read()
+        assert pool.stats()["open"] == 1
+    finally:
+        pool.close()
+
+
+def test_connection_closed_by_server_is_retried(server: mock_module.MockLLMServer) -> None:
+    # The server drops keep-alive connections idle for longer than the handler timeout,
+    # while the pool still holds them as idle.
+    server.RequestHandlerClass = type("IdleClosingHandler", (server.RequestHandlerClass,), {"timeout": 0.1})
+    pool = pool_module.HTTPConnectionPool(idle_timeout=60.0)
+    try:
+        _post(pool, server)
+        time.sleep(0.4)
+        result = _post(pool, server)
+        assert not result.timings.reused
+        assert pool.stats() == {"open": 1, "idle": 1, "created": 2, "reused": 1}
+    finally:
+        pool.close()
+
+
+def test_timings_report_connect_only_for_new_connections(server: mock_module.MockLLMServer) -> None:
+    pool = pool_module.HTTPConnectionPool()
+    try:
+        first = _post(pool, server).timings
+        second = _post(pool, server).timings
+    finally:
+        pool.close()
+    assert not first.reused and first.connect > 0
+    # Plain HTTP has no TLS handshake.
+    assert first.tls == 0
+    assert second.reused and second.connect == 0 and second.tls == 0
+    for timings in (first, second):
+        assert 0 < timings.ttfb <= timings.total
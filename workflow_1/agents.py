@@ -1,38 +1,133 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import threading
 from collections import defaultdict
 from dataclasses import dataclass
-from typing import Any, Dict, List, Set
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Set, TypeVar
 
+from settings import PROJECT_SETTINGS
 from common.tools.tools import load_workflow_module
 
 logger = logging.getLogger(__name__)
 
 llm_module = load_workflow_module("workflow_1", "llm")
 LLMClient = llm_module.LLMClient
+AsyncLLMClient = llm_module.AsyncLLMClient
 create_llm_client = llm_module.create_llm_client
+ChatStream = llm_module.ChatStream
+limits_module = load_workflow_module("workflow_1", "llm_limits")
+chunks_module = load_workflow_module("workflow_2", "storeproc_chunks")
+ProcedureChunk = chunks_module.ProcedureChunk
+
+SUMMARY_SYSTEM_PROMPT = "You are a helpful architect who summarises stored procedures."
+DESIGN_SYSTEM_PROMPT = "You are a software architect who splits stored procedures into microservices."
+
+# Response schemas for agent methods that ask the LLM for structured output. They
+# follow the strict JSON-schema rules: every property required, none additional.
+DOMAIN_SERVICE_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "responsibilities": {"type": "array", "items": {"type": "string", "minLength": 1}, "minItems": 1},
+    },
+    "required": ["responsibilities"],
+    "additionalProperties": False,
+}
+SERVICE_DESIGN_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "api_operations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string", "minLength": 1},
+                    "method": {"type": "string", "enum": ["GET", "POST", "PUT", "PATCH", "DELETE"]},
+                    "path": {"type": "string", "minLength": 1},
+                },
+                "required": ["name", "method", "path"],
+                "additionalProperties": False,
+            },
+            "minItems": 1,
+        },
+    },
+    "required": ["api_operations"],
+    "additionalProperties": False,
+}
+
+T = TypeVar("T")
 
 
 @dataclass
 class AgentContext:
     llm: LLMClient
+    async_llm: AsyncLLMClient | None = None
+    agent: str | None = None
+
+    def __post_init__(self) -> None:
+        if self.async_llm is None:
+            self.async_llm = AsyncLLMClient(self.llm)
+
+
+def gather_in_order(calls: Iterable[Awaitable[T]]) -> List[T]:
+    # Runs agent calls concurrently from synchronous stage code. asyncio.run cannot
+    # start inside a running event loop, so code already in one awaits
+    # gather_in_order_async instead.
+    return asyncio.run(gather_in_order_async(calls))
+
+
+async def gather_in_order_async(calls: Iterable[Awaitable[T]]) -> List[T]:
+    # Results keep the order of the calls, and AsyncLLMClient bounds how many are in flight.
+    return list(await asyncio.gather(*calls))
 
 
 class DomainDesignAgent:
+    RESPONSE_SCHEMAS = {"describe_responsibilities": DOMAIN_SERVICE_SCHEMA}
+
     def __init__(self, context: AgentContext):
         self.context = context
 
     def plan_domain_services(self, domain_name: str, tables: List[str]) -> Dict[str, Any]:
         logger.debug("DomainDesignAgent LLM request: domain=%s tables=%s", domain_name, tables)
-        return {
+        plan = {
             "domain": domain_name,
             "service_name": f"{domain_name.title().replace(' ', '')}Service",
             "owned_tables": tables,
         }
+        if PROJECT_SETTINGS.get("agent_llm_design"):
+            try:
+                plan["responsibilities"] = self.describe_responsibilities(domain_name, tables)
+            except RuntimeError as exc:
+                logger.warning("Domain responsibilities for %s unavailable: %s", domain_name, exc)
+        return plan
+
+    def describe_responsibilities(self, domain_name: str, tables: List[str]) -> List[str]:
+        reply = self.context.llm.chat_json(
+            [
+                {"role": "system", "content": DESIGN_SYSTEM_PROMPT},
+                {
+                    "role": "user",
+                    "content": (
+                        f"List the responsibilities of a microservice for the {domain_name} domain "
+                        f"that owns these tables: {', '.join(tables) or 'none'}."
+                    ),
+                },
+            ],
+            DOMAIN_SERVICE_SCHEMA,
+            name="domain_service_responsibilities",
+            purpose="domain-service-plan",
+            agent=self.context.agent,
+        )
+        return reply["responsibilities"]
+
+    async def plan_domain_services_async(self, domain_name: str, tables: List[str]) -> Dict[str, Any]:
+        return await self.context.async_llm.run(self.plan_domain_services, domain_name, tables)
 
 
 class ArchitectAgent:
+    RESPONSE_SCHEMAS = {"propose_api_operations": SERVICE_DESIGN_SCHEMA}
+
     def __init__(self, context: AgentContext):
         self.context = context
 
@@ -48,12 +143,40 @@ class ArchitectAgent:
             {"path": "src/main/resources/application.yaml", "template": "application.yaml.txt"},
             {"path": "src/main/resources/openapi/openapi-spec.yml", "template": "openapi_spec.yml.txt"},
         ]
-        return {
+        design = {
             "service_name": service_name,
             "dependencies": dependencies,
             "modules": modules,
             "files": files,
         }
+        if PROJECT_SETTINGS.get("agent_llm_design"):
+            try:
+                design["api_operations"] = self.propose_api_operations(service_name, dependencies)
+            except RuntimeError as exc:
+                logger.warning("API operations for %s unavailable: %s", service_name, exc)
+        return design
+
+    def propose_api_operations(self, service_name: str, dependencies: List[str]) -> List[Dict[str, str]]:
+        reply = self.context.llm.chat_json(
+            [
+                {"role": "system", "content": DESIGN_SYSTEM_PROMPT},
+                {
+                    "role": "user",
+                    "content": (
+                        f"Propose the REST operations of {service_name}, which depends on "
+                        f"{', '.join(dependencies) or 'no other services'}."
+                    ),
+                },
+            ],
+            SERVICE_DESIGN_SCHEMA,
+            name="service_api_operations",
+            purpose="service-architecture",
+            agent=self.context.agent,
+        )
+        return reply["api_operations"]
+
+    async def design_service_async(self, service_name: str, dependencies: List[str]) -> Dict[str, Any]:
+        return await self.context.async_llm.run(self.design_service, service_name, dependencies)
 
 
 class CodeGeneratorAgent:
@@ -64,6 +187,9 @@ class CodeGeneratorAgent:
         logger.debug("CodeGeneratorAgent LLM request: service=%s", service_spec.get("service_name"))
         return {"service": service_spec}
 
+    async def prepare_generation_payload_async(self, service_spec: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.context.async_llm.run(self.prepare_generation_payload, service_spec)
+
 
 class ServiceContextAgent:
     def __init__(self, context: AgentContext):
@@ -86,6 +212,9 @@ class ServiceContextAgent:
             "one_liner": one_liner,
         }
 
+    async def describe_service_async(self, service_spec: Dict[str, Any]) -> Dict[str, str]:
+        return await self.context.async_llm.run(self.describe_service, service_spec)
+
 
 class StoreProcOverviewAgent:
     def __init__(self, context: AgentContext):
@@ -99,12 +228,8 @@ class StoreProcOverviewAgent:
             domain_lines.append(f"- {domain}: {', '.join(table_list)}")
         domain_section = "\n".join(domain_lines) or "No domain mappings found."
 
-        flow_lines = []
-        for step in domain_mapped_proc.get("procedure_steps", []):
-            descriptions = step.get("description", [])
-            if not descriptions:
-                continue
-            flow_lines.append(f"- {' '.join(descriptions)}")
+        source = domain_mapped_proc.get("source")
+        flow_lines = _flow_lines(domain_mapped_proc.get("procedure_steps", []), source, 0)
         flow_section = "\n".join(flow_lines) or "No explicit join flow detected."
 
         dependencies = _derive_domain_dependencies(
@@ -144,6 +269,160 @@ class StoreProcOverviewAgent:
         ]
         return "\n".join(overview)
 
+    def narrate_procedure(self, domain_mapped_proc: Dict[str, Any], max_tokens: int = 400) -> ChatStream:
+        return asyncio.run(self.narrate_procedure_async(domain_mapped_proc, max_tokens))
+
+    async def narrate_procedure_async(self, domain_mapped_proc: Dict[str, Any], max_tokens: int = 400) -> ChatStream:
+        # A procedure that fits the context window is summarised in one call. Larger
+        # ones are summarised chunk by chunk in parallel, and the chunk summaries are
+        # reduced into one overview.
+        procedure_name = domain_mapped_proc.get("procedure_name", "procedure")
+        chunks = self.plan_chunks(domain_mapped_proc, max_tokens)
+        logger.debug("StoreProcOverviewAgent LLM request: procedure=%s chunks=%d", procedure_name, len(chunks))
+        if len(chunks) <= 1:
+            return self.context.llm.chat_stream(
+                procedure_messages(chunks[0].text if chunks else ""),
+                max_tokens=max_tokens,
+                purpose="stored-proc-overview",
+                agent=self.context.agent,
+            )
+        chunk_max_tokens = int(PROJECT_SETTINGS.get("summary_chunk_max_tokens", 300))
+        summaries = await gather_in_order_async(
+            self._summarize_async(
+                chunk_messages(chunk, procedure_name, len(chunks)), chunk_max_tokens, "stored-proc-overview-chunk"
+            )
+            for chunk in chunks
+        )
+        return await self.reduce_summaries_async(summaries, procedure_name, max_tokens)
+
+    def plan_chunks(self, domain_mapped_proc: Dict[str, Any], max_tokens: int = 400) -> List[ProcedureChunk]:
+        source = domain_mapped_proc.get("source")
+        text = source.text() if source is not None else ""
+        procedure_name = domain_mapped_proc.get("procedure_name", "procedure")
+        window = self.context.llm.config.context_window_tokens
+        # Prompt overhead is measured on an empty chunk that still has the overlap heading.
+        template = ProcedureChunk(0, "", " ", (0, 0), 0, 0, 0)
+        prompt_tokens = max(
+            limits_module.estimate_prompt_tokens(procedure_messages("")),
+            limits_module.estimate_prompt_tokens(chunk_messages(template, procedure_name, 1)),
+        )
+        completion_tokens = max(max_tokens, int(PROJECT_SETTINGS.get("summary_chunk_max_tokens", 300)))
+        # The procedure is only split when it does not fit the window whole.
+        whole_budget = chunks_module.chunk_budget(window, prompt_tokens, completion_tokens)
+        budget = chunks_module.chunk_budget(
+            window, prompt_tokens, completion_tokens, PROJECT_SETTINGS.get("summary_chunk_tokens")
+        )
+        overlap_tokens = int(PROJECT_SETTINGS.get("summary_chunk_overlap_tokens", 400))
+        return chunks_module.chunk_procedure(
+            text, domain_mapped_proc.get("procedure_steps", []), budget, overlap_tokens, whole_budget
+        )
+
+    def reduce_summaries(self, summaries: List[str], procedure_name: str, max_tokens: int = 400) -> ChatStream:
+        return asyncio.run(self.reduce_summaries_async(summaries, procedure_name, max_tokens))
+
+    async def reduce_summaries_async(
+        self, summaries: List[str], procedure_name: str, max_tokens: int = 400
+    ) -> ChatStream:
+        budget = self.reduce_budget(len(summaries), procedure_name, max_tokens)
+        chunk_max_tokens = int(PROJECT_SETTINGS.get("summary_chunk_max_tokens", 300))
+        # Summaries that together overflow the window are reduced in groups first.
+        while len(summaries) > 1 and sum(map(limits_module.estimate_text_tokens, summaries)) > budget:
+            groups = group_by_tokens(summaries, budget)
+            if len(groups) == len(summaries):
+                break
+            summaries = await gather_in_order_async(
+                self._summarize_async(
+                    reduce_messages(group, procedure_name), chunk_max_tokens, "stored-proc-overview-reduce"
+                )
+                for group in groups
+            )
+        return self.context.llm.chat_stream(
+            reduce_messages(summaries, procedure_name),
+            max_tokens=max_tokens,
+            purpose="stored-proc-overview-reduce",
+            agent=self.context.agent,
+        )
+
+    def reduce_budget(self, summary_count: int, procedure_name: str, max_tokens: int = 400) -> int:
+        return chunks_module.chunk_budget(
+            self.context.llm.config.context_window_tokens,
+            limits_module.estimate_prompt_tokens(reduce_messages([""] * summary_count, procedure_name)),
+            max_tokens,
+        )
+
+    async def _summarize_async(self, messages: List[Dict[str, str]], max_tokens: int, purpose: str) -> str:
+        response = await self.context.async_llm.chat(
+            messages, max_tokens=max_tokens, purpose=purpose, agent=self.context.agent
+        )
+        choices = response.get("choices") or [{}]
+        return (choices[0].get("message", {}).get("content") or "").strip()
+
+
+def procedure_messages(procedure_text: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Summarise this stored procedure:\n{procedure_text}"},
+    ]
+
+
+def chunk_messages(chunk: ProcedureChunk, procedure_name: str, total: int) -> List[Dict[str, str]]:
+    part = f"part {chunk.index + 1} of {total}"
+    context = f"End of the previous part, for context only:\n{chunk.context}\n\n" if chunk.context else ""
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": (
+                f"This is {part} of stored procedure {procedure_name}. Summarise what this part does: "
+                f"the tables it reads and writes, its conditions and loops, and its side effects.\n\n"
+                f"{context}{part.capitalize()}:\n{chunk.text}"
+            ),
+        },
+    ]
+
+
+def reduce_messages(summaries: List[str], procedure_name: str) -> List[Dict[str, str]]:
+    parts = "\n\n".join(f"Part {index}:\n{summary}" for index, summary in enumerate(summaries, 1))
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": (
+                f"Combine these summaries of consecutive parts of stored procedure {procedure_name} "
+                f"into one overview of the whole procedure:\n\n{parts}"
+            ),
+        },
+    ]
+
+
+def group_by_tokens(texts: List[str], budget: int) -> List[List[str]]:
+    groups: List[List[str]] = []
+    group_tokens = 0
+    for text in texts:
+        tokens = limits_module.estimate_text_tokens(text)
+        if groups and group_tokens + tokens <= budget:
+            groups[-1].append(text)
+            group_tokens += tokens
+        else:
+            groups.append([text])
+            group_tokens = tokens
+    return groups
+
+
+def _flow_lines(steps: List[Dict[str, Any]], source: Any, depth: int) -> List[str]:
+    # Loop and IF bodies are indented under the step that controls them.
+    indent = "  " * depth
+    lines = []
+    for step in steps:
+        descriptions = source.describe_step(step) if source is not None else step.get("description", [])
+        if descriptions:
+            lines.append(f"{indent}- {' '.join(descriptions)}")
+        lines.extend(_flow_lines(step.get("steps", []), source, depth + 1))
+        if step.get("else_steps"):
+            lines.append(f"{indent}- Else:")
+            lines.extend(_flow_lines(step["else_steps"], source, depth + 1))
+    return lines
+
 
 def _derive_domain_dependencies(
     table_domains: Dict[str, List[str]],
@@ -170,14 +449,64 @@ def _derive_domain_dependencies(
     return converted
 
 
+AGENT_TYPES: Dict[str, Callable[[AgentContext], Any]] = {
+    "domain_design": DomainDesignAgent,
+    "architect": ArchitectAgent,
+    "code_generator": CodeGeneratorAgent,
+    "service_context": ServiceContextAgent,
+    "storeproc_overview": StoreProcOverviewAgent,
+}
+
+
+class AgentRegistry:
+    # Every agent shares one LLM client, and with it one connection pool,
+    # response cache and rate limiter. Each agent gets its own context so the
+    # client can count its calls separately.
+    def __init__(self, client: LLMClient | None = None) -> None:
+        self.client = client or create_llm_client()
+        self.async_client = AsyncLLMClient(self.client)
+        self.agents: Dict[str, Any] = {
+            name: factory(AgentContext(llm=self.client, async_llm=self.async_client, agent=name))
+            for name, factory in AGENT_TYPES.items()
+        }
+
+    def get(self, name: str) -> Any:
+        return self.agents.get(name)
+
+    def call_stats(self) -> Dict[str, Dict[str, int]]:
+        return self.client.agent_stats()
+
+    def close(self) -> None:
+        self.client.close()
+
+
+_registry: AgentRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def agent_registry() -> AgentRegistry:
+    # Created on first use and kept until close_agent_registry(), so every stage
+    # of a run, or every job of a long-lived process, reuses the same agents.
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = AgentRegistry()
+            logger.info("Bootstrapping agents with shared LLM context (model=%s)", _registry.client.config.model)
+        return _registry
+
+
+def close_agent_registry() -> Dict[str, Dict[str, int]]:
+    global _registry
+    with _registry_lock:
+        registry, _registry = _registry, None
+    if registry is None:
+        return {}
+    stats = registry.call_stats()
+    registry.close()
+    for agent, counts in sorted(stats.items()):
+        logger.info("Agent %s made %d LLM calls (%d from cache)", agent, counts["calls"], counts["cache_hits"])
+    return stats
+
+
 def bootstrap_agents() -> Dict[str, Any]:
-    client = create_llm_client()
-    context = AgentContext(llm=client)
-    logger.info("Bootstrapping agents with shared LLM context (model=%s)", client.config.model)
-    return {
-        "domain_design": DomainDesignAgent(context),
-        "architect": ArchitectAgent(context),
-        "code_generator": CodeGeneratorAgent(context),
-        "service_context": ServiceContextAgent(context),
-        "storeproc_overview": StoreProcOverviewAgent(context),
-    }
+    return dict(agent_registry().agents)
@@ -1,13 +1,59 @@
 from __future__ import annotations
 
+import asyncio
+import http.client
 import json
 import logging
+import math
+import threading
 import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack
 from dataclasses import dataclass, field
-from typing import Any, Dict, Iterable, Optional
-from urllib import error, request
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
 
 from settings import PROJECT_SETTINGS
+from common.tools.tools import load_workflow_module
+
+pool_module = load_workflow_module("workflow_1", "llm_pool")
+HTTPConnectionPool = pool_module.HTTPConnectionPool
+PoolExhaustedError = pool_module.PoolExhaustedError
+RequestCancellation = pool_module.RequestCancellation
+RequestCancelledError = pool_module.RequestCancelledError
+LatencyRecorder = pool_module.LatencyRecorder
+cache_module = load_workflow_module("workflow_1", "llm_cache")
+LLMResponseCache = cache_module.LLMResponseCache
+CACHE_MODES = cache_module.CACHE_MODES
+limits_module = load_workflow_module("workflow_1", "llm_limits")
+CircuitOpenError = limits_module.CircuitOpenError
+stream_module = load_workflow_module("workflow_1", "llm_stream")
+cassette_module = load_workflow_module("workflow_1", "llm_cassette")
+structured_module = load_workflow_module("workflow_1", "llm_structured")
+ChatStream = stream_module.ChatStream
+
+T = TypeVar("T")
+
+
+class LLMRequestError(RuntimeError):
+    def __init__(self, message: str, status: int | None = None, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        # status is None for network failures that never got an HTTP response.
+        self.status = status
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class LLMEndpoint:
+    base_url: str
+    model: str
+    api_key: str = ""
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def label(self) -> str:
+        return f"{self.model}@{self.base_url}"
 
 
 @dataclass(frozen=True)
@@ -18,26 +64,137 @@ class LLMConfig:
     model: str
     timeout: float = 30.0
     headers: Dict[str, str] = field(default_factory=dict)
+    pool_max_connections: int = 10
+    pool_max_per_host: int = 4
+    pool_idle_timeout: float = 60.0
+    max_concurrency: int = 4
+    cache_enabled: bool = True
+    cache_dir: str = "common/cache/llm"
+    cache_max_bytes: int = 64 * 1024 * 1024
+    cache_ttl_seconds: float = 7 * 24 * 3600.0
+    cache_mode: str = "use"
+    requests_per_minute: float = 0
+    tokens_per_minute: float = 0
+    max_retries: int = 4
+    backoff_base_seconds: float = 1.0
+    backoff_max_seconds: float = 30.0
+    circuit_failure_threshold: int = 5
+    circuit_reset_seconds: float = 60.0
+    context_window_tokens: int = 32768
+    cassette_mode: str = "off"
+    cassette_path: str = "common/cassettes/llm.jsonl"
+    cassette_latency: str = "none"
+    structured_output: str = "json_schema"
+    structured_max_reprompts: int = 1
+    # The first endpoint is base_url/model; further ones come from settings.
+    endpoints: Tuple[LLMEndpoint, ...] = ()
+    hedge_percentile: float = 0.95
+    hedge_delay_seconds: float = 10.0
+    hedge_min_delay_seconds: float = 1.0
+    hedge_min_samples: int = 20
+    hedge_max_in_flight: int = 2
 
     @classmethod
     def from_settings(cls, overrides: Optional[Dict[str, Any]] = None) -> "LLMConfig":
         source = dict(PROJECT_SETTINGS.get("llm", {}))
         if overrides:
             source.update(overrides)
-        return cls(
-            provider=source.get("provider", "custom"),
+        primary = LLMEndpoint(
             base_url=source.get("base_url", ""),
-            api_key=source.get("api_key", ""),
             model=source.get("model", ""),
-            timeout=float(source.get("timeout", 30.0)),
+            api_key=source.get("api_key", ""),
             headers=dict(source.get("headers", {})),
         )
+        # Extra endpoints inherit whatever they leave out from the primary one.
+        endpoints = [primary] + [
+            LLMEndpoint(
+                base_url=item.get("base_url") or primary.base_url,
+                model=item.get("model") or primary.model,
+                api_key=item.get("api_key", primary.api_key),
+                headers={**primary.headers, **item.get("headers", {})},
+            )
+            for item in source.get("endpoints") or []
+        ]
+        return cls(
+            provider=source.get("provider", "custom"),
+            base_url=primary.base_url,
+            api_key=primary.api_key,
+            model=primary.model,
+            timeout=float(source.get("timeout", 30.0)),
+            headers=primary.headers,
+            pool_max_connections=int(source.get("pool_max_connections", 10)),
+            pool_max_per_host=int(source.get("pool_max_per_host", 4)),
+            pool_idle_timeout=float(source.get("pool_idle_timeout", 60.0)),
+            max_concurrency=int(source.get("max_concurrency", 4)),
+            cache_enabled=bool(source.get("cache_enabled", True)),
+            cache_dir=str(source.get("cache_dir", "common/cache/llm")),
+            cache_max_bytes=int(source.get("cache_max_bytes", 64 * 1024 * 1024)),
+            cache_ttl_seconds=float(source.get("cache_ttl_seconds", 7 * 24 * 3600.0)),
+            cache_mode=source.get("cache_mode", "use"),
+            requests_per_minute=float(source.get("requests_per_minute") or 0),
+            tokens_per_minute=float(source.get("tokens_per_minute") or 0),
+            max_retries=int(source.get("max_retries", 4)),
+            backoff_base_seconds=float(source.get("backoff_base_seconds", 1.0)),
+            backoff_max_seconds=float(source.get("backoff_max_seconds", 30.0)),
+            circuit_failure_threshold=int(source.get("circuit_failure_threshold", 5)),
+            circuit_reset_seconds=float(source.get("circuit_reset_seconds", 60.0)),
+            context_window_tokens=int(source.get("context_window_tokens", 32768)),
+            cassette_mode=source.get("cassette_mode") or "off",
+            cassette_path=str(source.get("cassette_path", "common/cassettes/llm.jsonl")),
+            cassette_latency=source.get("cassette_latency") or "none",
+            structured_output=source.get("structured_output") or "json_schema",
+            structured_max_reprompts=int(source.get("structured_max_reprompts", 1)),
+            endpoints=tuple(endpoints),
+            hedge_percentile=float(source.get("hedge_percentile", 0.95)),
+            hedge_delay_seconds=float(source.get("hedge_delay_seconds", 10.0)),
+            hedge_min_delay_seconds=float(source.get("hedge_min_delay_seconds", 1.0)),
+            hedge_min_samples=int(source.get("hedge_min_samples", 20)),
+            hedge_max_in_flight=int(source.get("hedge_max_in_flight", 2)),
+        )
+
+
+@dataclass
+class _Route:
+    endpoint: LLMEndpoint
+    completions_url: str
+    rate_limiter: Any
+    circuit_breaker: Any
+    fallback: bool = False
 
 
 class LLMClient:
     def __init__(self, config: LLMConfig):
         self.config = config
-        self._completions_url = f"{self.config.base_url.rstrip('/')}/chat/completions"
+        # Keep-alive connections are reused across calls, so only the first call
+        # to a host pays the TCP and TLS handshakes.
+        self._pool = HTTPConnectionPool(
+            max_connections=self.config.pool_max_connections,
+            max_per_host=self.config.pool_max_per_host,
+            idle_timeout=self.config.pool_idle_timeout,
+            timeout=self.config.timeout,
+        )
+        self._transport = self._pool
+        if self.config.cassette_mode != "off":
+            self._transport = cassette_module.CassetteTransport(
+                self._pool, Path(self.config.cassette_path), self.config.cassette_mode, self.config.cassette_latency
+            )
+        self._cache = (
+            LLMResponseCache(Path(self.config.cache_dir), self.config.cache_max_bytes, self.config.cache_ttl_seconds)
+            if self.config.cache_enabled
+            else None
+        )
+        endpoints = self.config.endpoints or (
+            LLMEndpoint(self.config.base_url, self.config.model, self.config.api_key, self.config.headers),
+        )
+        self._routes = [self._route(endpoint) for endpoint in endpoints]
+        self._latency = LatencyRecorder()
+        self._endpoint_latency = LatencyRecorder()
+        self._endpoint_counts: Dict[str, Dict[str, int]] = {}
+        self._endpoint_lock = threading.Lock()
+        self._hedge_executor: ThreadPoolExecutor | None = None
+        self._agent_calls: Dict[str, Dict[str, int]] = {}
+        self._agent_lock = threading.Lock()
+        self._structured = structured_module.StructuredOutputStats()
         logger = logging.getLogger(__name__)
         logger.info(
             "Initialized LLM client with base_url=%s model=%s provider=%s",
@@ -47,75 +204,576 @@ class LLMClient:
         )
 
     def chat(self, messages: Iterable[Dict[str, str]], **kwargs: Any) -> Dict[str, Any]:
+        agent, cache_mode, payload = self._prepare(messages, kwargs)
+        if self._cache is None or cache_mode == "bypass":
+            self._count_agent_call(agent, cached=False)
+            return self._chat(payload, kwargs)
+        key = self._cache.key(payload)
+        response = self._cache.get(key, kwargs.get("purpose"), refresh=cache_mode == "refresh")
+        self._count_agent_call(agent, cached=response is not None)
+        if response is None:
+            response = self._chat(payload, kwargs)
+            if "error" not in response:
+                self._cache.put(key, response, kwargs.get("purpose"))
+        return response
+
+    def chat_stream(self, messages: Iterable[Dict[str, str]], **kwargs: Any) -> ChatStream:
+        # Iterating the returned stream yields content deltas as the server sends them;
+        # its ttft attribute is the time to the first delta.
+        agent, cache_mode, payload = self._prepare(messages, kwargs)
+        key = None
+        if self._cache is not None and cache_mode != "bypass":
+            key = self._cache.key(payload)
+            response = self._cache.get(key, kwargs.get("purpose"), refresh=cache_mode == "refresh")
+            if response is not None:
+                self._count_agent_call(agent, cached=True)
+                return ChatStream.from_response(response)
+        self._count_agent_call(agent, cached=False)
+        payload.update({"stream": True, "stream_options": {"include_usage": True}})
+        stream = self._chat(payload, kwargs, stream=True)
+        if key is not None:
+            stream.add_done_callback(lambda response: self._cache.put(key, response, kwargs.get("purpose")))
+        return stream
+
+    def chat_json(
+        self,
+        messages: Iterable[Dict[str, str]],
+        schema: Dict[str, Any],
+        name: str = "response",
+        stream: bool = False,
+        **kwargs: Any,
+    ) -> Any:
+        # Asks for JSON matching schema, through the provider's JSON mode unless
+        # structured_output is "prompt". A reply that misses the schema is repaired
+        # locally when it can be, and re-prompted with the errors only when it cannot.
+        logger = logging.getLogger(__name__)
+        messages = list(messages)
+        mode = self.config.structured_output
+        response_format = structured_module.response_format(mode, name, schema)
+        if response_format is not None:
+            kwargs["response_format"] = response_format
+        if mode != "json_schema":
+            messages.append({"role": "system", "content": structured_module.schema_instruction(schema)})
+        errors: List[str] = []
+        for reprompt in range(self.config.structured_max_reprompts + 1):
+            text, error = self._structured_reply(messages, schema, stream, dict(kwargs))
+            if error is None:
+                value, errors, repaired = structured_module.parse_structured(text, schema)
+                if not errors:
+                    self._structured.record(name, repaired, reprompt, failed=False)
+                    return value
+            else:
+                errors = [error]
+            logger.warning("LLM reply for %s does not match its schema: %s", name, "; ".join(errors))
+            messages = [
+                *messages,
+                {"role": "assistant", "content": text},
+                {
+                    "role": "user",
+                    "content": "That reply does not match the JSON schema: "
+                    + "; ".join(errors)
+                    + ". Reply again with the corrected JSON only.",
+                },
+            ]
+        self._structured.record(name, False, self.config.structured_max_reprompts, failed=True)
+        raise RuntimeError(
+            f"LLM reply for {name} does not match its schema after "
+            f"{self.config.structured_max_reprompts} re-prompts: {'; '.join(errors)}"
+        )
+
+    def structured_stats(self) -> Dict[str, Dict[str, Any]]:
+        return self._structured.stats()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self._cache.stats() if self._cache is not None else {}
+
+    def pool_stats(self) -> Dict[str, int]:
+        return self._transport.stats()
+
+    def endpoint_stats(self) -> Dict[str, Dict[str, Any]]:
+        # Per endpoint, with streams apart since their latency is time to first byte:
+        # attempts, errors, latency percentiles, hedges launched on it, and races it
+        # won after a hedge had been launched.
+        with self._endpoint_lock:
+            counts = {name: dict(values) for name, values in self._endpoint_counts.items()}
+        return {
+            name: {**stats, **counts.get(name, {"hedges": 0, "wins": 0})}
+            for name, stats in self._endpoint_latency.stats().items()
+        }
+
+    def latency_stats(self) -> Dict[str, Dict[str, Any]]:
+        # Per purpose: calls, errors and p50/p95/p99/mean seconds of calls that
+        # reached the endpoint, including retries and rate-limit waits.
+        return self._latency.stats()
+
+    def agent_stats(self) -> Dict[str, Dict[str, int]]:
+        # Per agent: calls made, and how many of them the response cache answered.
+        with self._agent_lock:
+            return {agent: dict(counts) for agent, counts in self._agent_calls.items()}
+
+    def _count_agent_call(self, agent: str, cached: bool) -> None:
+        with self._agent_lock:
+            counts = self._agent_calls.setdefault(agent, {"calls": 0, "cache_hits": 0})
+            counts["calls"] += 1
+            counts["cache_hits"] += int(cached)
+
+    def _structured_reply(
+        self, messages: List[Dict[str, str]], schema: Dict[str, Any], stream: bool, kwargs: Dict[str, Any]
+    ) -> Tuple[str, str | None]:
+        if not stream:
+            response = self.chat(messages, **kwargs)
+            choices = response.get("choices") or [{}]
+            return choices[0].get("message", {}).get("content") or "", None
+        # A streamed reply is abandoned as soon as it breaks the schema, which also
+        # keeps it out of the response cache.
+        validator = structured_module.JSONStreamValidator(schema)
+        with self.chat_stream(messages, **kwargs) as reply:
+            for delta in reply:
+                validator.feed(delta)
+                if validator.error is not None:
+                    break
+        return validator.text, validator.error
+
+    def _prepare(
+        self, messages: Iterable[Dict[str, str]], kwargs: Dict[str, Any]
+    ) -> Tuple[str, str, Dict[str, Any]]:
+        # agent names the caller for agent_stats() and is not sent to the endpoint.
+        # cache_mode "bypass" skips the response cache, "refresh" re-asks and overwrites it.
+        agent = kwargs.pop("agent", None) or "unassigned"
+        cache_mode = kwargs.pop("cache_mode", None) or self.config.cache_mode
+        if cache_mode not in CACHE_MODES:
+            raise RuntimeError(f"Unknown LLM cache mode {cache_mode!r}; expected one of {', '.join(CACHE_MODES)}")
         payload: Dict[str, Any] = {
             "model": self.config.model,
             "messages": list(messages),
         }
         if kwargs:
             payload.update(kwargs)
+        return agent, cache_mode, payload
+
+    def _chat(self, payload: Dict[str, Any], kwargs: Dict[str, Any], stream: bool = False) -> Any:
+        purpose = kwargs.get("purpose") or "unspecified"
+        started = time.perf_counter()
         try:
-            return self._dispatch(payload, purpose=kwargs.get("purpose"))
-        except RuntimeError as exc:
-            message = str(exc).lower()
-            if "data policy" in message and self.config.model.endswith(":free"):
-                logger = logging.getLogger(__name__)
-                logger.warning(
-                    "LLM data policy restriction encountered; retrying without ':free' suffix."
+            response = self._schedule(payload, kwargs.get("purpose"), stream)
+        except RuntimeError:
+            self._latency.record(purpose, time.perf_counter() - started, ok=False)
+            raise
+        if stream:
+            response.add_done_callback(
+                lambda completed: self._latency.record(purpose, time.perf_counter() - started)
+            )
+        else:
+            self._latency.record(purpose, time.perf_counter() - started)
+        return response
+
+    def _schedule(self, payload: Dict[str, Any], purpose: Optional[str], stream: bool) -> Any:
+        routes = self._ranked_routes(stream)
+        if len(routes) == 1:
+            try:
+                return self._attempt(routes[0], payload, purpose, stream)
+            except RuntimeError as exc:
+                fallback = self._fallback_route(routes[0], exc)
+                if fallback is None:
+                    raise
+                return self._attempt(fallback, payload, purpose, stream)
+        return self._hedge(routes, payload, purpose, stream)
+
+    def _hedge(self, routes: List[_Route], payload: Dict[str, Any], purpose: Optional[str], stream: bool) -> Any:
+        # The call starts on the first route. Once it has taken longer than that
+        # endpoint's hedge delay, a duplicate starts on the next route, up to
+        # hedge_max_in_flight at once. The first success wins and the others are
+        # cancelled: their requests are aborted in flight, which frees their pooled
+        # connections and refunds their rate limit reservations. A failure moves
+        # straight on to the next route.
+        logger = logging.getLogger(__name__)
+        waiting = list(routes)
+        cancellations: Dict[Future, RequestCancellation] = {}
+        in_flight: Dict[Future, _Route] = {}
+        latest: Dict[str, Any] = {"hedged": False}
+        last_error: RuntimeError | None = None
+
+        def launch(hedged: bool) -> None:
+            route = waiting.pop(0)
+            if hedged:
+                logger.info(
+                    "Hedging LLM call purpose=%s on %s", purpose or "unspecified", route.endpoint.label
                 )
-                fallback_payload = dict(payload)
-                fallback_payload["model"] = self.config.model.split(":")[0]
-                return self._dispatch(fallback_payload, purpose=kwargs.get("purpose"), fallback=True)
+                self._count_endpoint(self._endpoint_name(route, stream), "hedges")
+                latest["hedged"] = True
+            cancellation = RequestCancellation()
+            future = self._executor().submit(self._attempt, route, payload, purpose, stream, cancellation)
+            cancellations[future] = cancellation
+            in_flight[future] = route
+            latest.update(route=route, started=time.perf_counter())
+
+        launch(hedged=False)
+        while in_flight:
+            timeout = None
+            if waiting and len(in_flight) < self.config.hedge_max_in_flight:
+                elapsed = time.perf_counter() - latest["started"]
+                timeout = max(0.0, self._hedge_delay(latest["route"], stream) - elapsed)
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                launch(hedged=True)
+                continue
+            winner: Future | None = None
+            for future in done:
+                route = in_flight.pop(future)
+                if winner is not None:
+                    future.add_done_callback(_discard_response)
+                    continue
+                try:
+                    future.result()
+                except RuntimeError as exc:
+                    last_error = exc
+                    fallback = self._fallback_route(route, exc)
+                    if fallback is not None:
+                        waiting.insert(0, fallback)
+                    continue
+                winner = future
+                if latest["hedged"]:
+                    self._count_endpoint(self._endpoint_name(route, stream), "wins")
+            if winner is not None:
+                for future in in_flight:
+                    cancellations[future].set()
+                    future.add_done_callback(_discard_response)
+                return winner.result()
+            if waiting and not in_flight:
+                launch(hedged=False)
+        raise last_error or RuntimeError("LLM call failed on every endpoint")
+
+    def _attempt(
+        self,
+        route: _Route,
+        payload: Dict[str, Any],
+        purpose: Optional[str],
+        stream: bool,
+        cancelled: RequestCancellation | None = None,
+    ) -> Any:
+        name = self._endpoint_name(route, stream)
+        started = time.perf_counter()
+        try:
+            response = self._send(
+                {**payload, "model": route.endpoint.model},
+                route,
+                purpose=purpose,
+                fallback=route.fallback,
+                stream=stream,
+                cancelled=cancelled,
+            )
+        except RuntimeError:
+            if cancelled is None or not cancelled.is_set():
+                self._endpoint_latency.record(name, time.perf_counter() - started, ok=False)
             raise
+        self._endpoint_latency.record(name, time.perf_counter() - started)
+        return response
+
+    def _fallback_route(self, route: _Route, exc: RuntimeError) -> _Route | None:
+        # Free-tier models refused under the account's data policy are retried on
+        # the paid model at the same endpoint.
+        if "data policy" in str(exc).lower() and route.endpoint.model.endswith(":free"):
+            logger = logging.getLogger(__name__)
+            logger.warning(
+                "LLM data policy restriction encountered; retrying without ':free' suffix."
+            )
+            endpoint = LLMEndpoint(
+                route.endpoint.base_url,
+                route.endpoint.model.split(":")[0],
+                route.endpoint.api_key,
+                route.endpoint.headers,
+            )
+            return self._route(endpoint, fallback=True)
+        return None
+
+    def _route(self, endpoint: LLMEndpoint, fallback: bool = False) -> _Route:
+        # Replayed calls never reach the endpoint, so they are not throttled.
+        rate_limiter = (
+            limits_module.RateLimiter()
+            if self.config.cassette_mode == "replay"
+            else limits_module.shared_rate_limiter(
+                endpoint.base_url, self.config.requests_per_minute, self.config.tokens_per_minute
+            )
+        )
+        circuit_breaker = limits_module.shared_circuit_breaker(
+            endpoint.base_url, self.config.circuit_failure_threshold, self.config.circuit_reset_seconds
+        )
+        completions_url = f"{endpoint.base_url.rstrip('/')}/chat/completions"
+        return _Route(endpoint, completions_url, rate_limiter, circuit_breaker, fallback)
+
+    def _ranked_routes(self, stream: bool) -> List[_Route]:
+        # Endpoints whose circuit is open go last. The rest are ordered by recent
+        # median latency once they have enough samples, and keep their configured
+        # order until then.
+        def rank(indexed: Tuple[int, _Route]) -> Tuple[bool, float, int]:
+            index, route = indexed
+            name = self._endpoint_name(route, stream)
+            median = None
+            if self._endpoint_latency.count(name) >= self.config.hedge_min_samples:
+                median = self._endpoint_latency.percentile(name, 0.5)
+            return route.circuit_breaker.state == "open", median if median is not None else math.inf, index
+
+        return [route for _, route in sorted(enumerate(self._routes), key=rank)]
+
+    def _hedge_delay(self, route: _Route, stream: bool) -> float:
+        name = self._endpoint_name(route, stream)
+        if self._endpoint_latency.count(name) < self.config.hedge_min_samples:
+            return self.config.hedge_delay_seconds
+        threshold = self._endpoint_latency.percentile(name, self.config.hedge_percentile) or 0.0
+        return max(self.config.hedge_min_delay_seconds, threshold)
+
+    def _endpoint_name(self, route: _Route, stream: bool) -> str:
+        return f"{route.endpoint.label} (stream)" if stream else route.endpoint.label
 
-    def _dispatch(self, payload: Dict[str, Any], *, purpose: Optional[str] = None, fallback: bool = False) -> Dict[str, Any]:
+    def _count_endpoint(self, name: str, counter: str) -> None:
+        with self._endpoint_lock:
+            counts = self._endpoint_counts.setdefault(name, {"hedges": 0, "wins": 0})
+            counts[counter] += 1
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._endpoint_lock:
+            if self._hedge_executor is None:
+                # Each call may hold up to hedge_max_in_flight workers at once.
+                self._hedge_executor = ThreadPoolExecutor(
+                    max_workers=max(4, self.config.pool_max_connections * self.config.hedge_max_in_flight),
+                    thread_name_prefix="llm-hedge",
+                )
+            return self._hedge_executor
+
+    def _send(
+        self,
+        payload: Dict[str, Any],
+        route: _Route,
+        *,
+        purpose: Optional[str] = None,
+        fallback: bool = False,
+        stream: bool = False,
+        cancelled: RequestCancellation | None = None,
+    ) -> Any:
+        # Rate limiting, retries and the circuit breaker are shared by every client
+        # for this endpoint in the process.
+        logger = logging.getLogger(__name__)
+        estimated_tokens = limits_module.estimate_tokens(payload)
+        dispatch = self._open_stream if stream else self._dispatch
+        attempt = 0
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                raise RequestCancelledError("LLM call cancelled; another endpoint answered first")
+            route.circuit_breaker.before_call()
+            route.rate_limiter.acquire(estimated_tokens)
+            try:
+                response = dispatch(payload, route, purpose=purpose, fallback=fallback, cancelled=cancelled)
+            except RequestCancelledError:
+                # Another endpoint answered first; this one proved nothing and used nothing.
+                route.circuit_breaker.release_trial()
+                route.rate_limiter.settle(estimated_tokens, 0)
+                raise
+            except PoolExhaustedError:
+                # Local saturation is not an endpoint failure and does not trip the breaker.
+                route.circuit_breaker.release_trial()
+                route.rate_limiter.settle(estimated_tokens, 0)
+                raise
+            except LLMRequestError as exc:
+                # A failed attempt gives its reservation back, so retries do not charge
+                # the token budget again for the same prompt.
+                route.rate_limiter.settle(estimated_tokens, 0)
+                retryable = exc.status is None or exc.status in limits_module.RETRYABLE_STATUSES
+                if exc.status == 429:
+                    route.circuit_breaker.record_success()
+                    if exc.retry_after is not None:
+                        route.rate_limiter.pause(exc.retry_after)
+                elif retryable:
+                    route.circuit_breaker.record_failure()
+                else:
+                    route.circuit_breaker.record_success()
+                if not retryable or attempt >= self.config.max_retries:
+                    raise
+                if cancelled is not None and cancelled.is_set():
+                    raise
+                delay = limits_module.backoff_delay(
+                    attempt, self.config.backoff_base_seconds, self.config.backoff_max_seconds, exc.retry_after
+                )
+                logger.warning(
+                    "LLM call failed (%s); retry %d/%d in %.2f seconds",
+                    exc.status or "network error",
+                    attempt + 1,
+                    self.config.max_retries,
+                    delay,
+                )
+                time.sleep(delay)
+                attempt += 1
+                continue
+            route.circuit_breaker.record_success()
+            if stream:
+                # Only errors before the first byte are retried; usage arrives with the last event.
+                response.add_done_callback(
+                    lambda completed: route.rate_limiter.settle(
+                        estimated_tokens, completed.get("usage", {}).get("total_tokens")
+                    )
+                )
+                response.add_close_callback(
+                    lambda: self._settle_abandoned_stream(response, route, payload, estimated_tokens)
+                )
+            else:
+                route.rate_limiter.settle(estimated_tokens, response.get("usage", {}).get("total_tokens"))
+            return response
+
+    def _settle_abandoned_stream(
+        self, response: ChatStream, route: _Route, payload: Dict[str, Any], estimated_tokens: int
+    ) -> None:
+        # A stream closed before its last event never reports usage. It is charged
+        # for its prompt and the text it delivered.
+        if response.completed:
+            return
+        used_tokens = limits_module.estimate_prompt_tokens(payload.get("messages", []))
+        route.rate_limiter.settle(estimated_tokens, used_tokens + limits_module.estimate_text_tokens(response.text))
+
+    def _dispatch(
+        self,
+        payload: Dict[str, Any],
+        route: _Route,
+        *,
+        purpose: Optional[str] = None,
+        fallback: bool = False,
+        cancelled: RequestCancellation | None = None,
+    ) -> Dict[str, Any]:
         logger = logging.getLogger(__name__)
         logger.info(
             "LLM chat call start model=%s url=%s purpose=%s fallback=%s",
             payload.get("model"),
-            self._completions_url,
+            route.completions_url,
             purpose or "unspecified",
             fallback,
         )
         data = json.dumps(payload).encode("utf-8")
         headers = {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.config.api_key}",
+            "Authorization": f"Bearer {route.endpoint.api_key}",
         }
-        headers.update(self.config.headers)
-        req = request.Request(
-            url=self._completions_url,
-            data=data,
-            headers=headers,
-            method="POST",
-        )
+        headers.update(route.endpoint.headers)
+        result = None
         try:
-            start = time.perf_counter()
-            with request.urlopen(req, timeout=self.config.timeout) as response:
-                body = response.read().decode("utf-8")
-            duration = time.perf_counter() - start
+            result = self._transport.request("POST", route.completions_url, data, headers, cancelled)
+            if result.status >= 400:
+                body = result.body.decode("utf-8", errors="ignore")
+                logger.error("LLM request failed with HTTP %s: %s", result.status, body)
+                retry_after = limits_module.parse_retry_after(result.headers.get("Retry-After"))
+                raise LLMRequestError(f"LLM request failed: {result.status} {body}", result.status, retry_after)
+            body = result.body.decode("utf-8")
             logger.debug(
                 "LLM chat response received (%s bytes) in %.3f seconds",
                 len(body),
-                duration,
+                result.timings.total,
             )
             return json.loads(body)
-        except error.HTTPError as exc:
-            body = exc.read().decode("utf-8", errors="ignore")
-            logger.error("LLM request failed with HTTP %s: %s", exc.code, body)
-            raise RuntimeError(f"LLM request failed: {exc.code} {body}") from exc
-        except error.URLError as exc:
-            logger.error("LLM request failed due to network error: %s", exc.reason)
-            raise RuntimeError(f"LLM request failed: {exc.reason}") from exc
+        except (OSError, http.client.HTTPException) as exc:
+            logger.error("LLM request failed due to network error: %s", exc)
+            raise LLMRequestError(f"LLM request failed: {exc}") from exc
         finally:
-            if "duration" not in locals():
-                duration = None
             logger.info(
-                "LLM chat call end model=%s purpose=%s duration=%s seconds",
+                "LLM chat call end model=%s purpose=%s duration=%s seconds %s",
                 payload.get("model"),
                 purpose or "unspecified",
-                f"{duration:.3f}" if duration is not None else "n/a",
+                f"{result.timings.total:.3f}" if result is not None else "n/a",
+                result.timings.describe() if result is not None else "",
             )
 
+    def _open_stream(
+        self,
+        payload: Dict[str, Any],
+        route: _Route,
+        *,
+        purpose: Optional[str] = None,
+        fallback: bool = False,
+        cancelled: RequestCancellation | None = None,
+    ) -> ChatStream:
+        logger = logging.getLogger(__name__)
+        logger.info(
+            "LLM chat stream start model=%s url=%s purpose=%s fallback=%s",
+            payload.get("model"),
+            route.completions_url,
+            purpose or "unspecified",
+            fallback,
+        )
+        data = json.dumps(payload).encode("utf-8")
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+            "Authorization": f"Bearer {route.endpoint.api_key}",
+        }
+        headers.update(route.endpoint.headers)
+        started = time.perf_counter()
+        # The pooled connection stays checked out until the stream is read or closed.
+        exit_stack = ExitStack()
+        try:
+            response, timings = exit_stack.enter_context(
+                self._transport.send("POST", route.completions_url, data, headers, cancelled)
+            )
+            if response.status >= 400:
+                body = response.read().decode("utf-8", errors="ignore")
+                exit_stack.close()
+                logger.error("LLM request failed with HTTP %s: %s", response.status, body)
+                retry_after = limits_module.parse_retry_after(response.getheader("Retry-After"))
+                raise LLMRequestError(f"LLM request failed: {response.status} {body}", response.status, retry_after)
+        except (OSError, http.client.HTTPException) as exc:
+            exit_stack.close()
+            logger.error("LLM request failed due to network error: %s", exc)
+            raise LLMRequestError(f"LLM request failed: {exc}") from exc
+        stream = ChatStream(stream_module.iter_sse_data(response), started, timings, exit_stack.close)
+        stream.add_done_callback(
+            lambda completed: logger.info(
+                "LLM chat stream end model=%s purpose=%s ttft=%s duration=%.3f seconds %s",
+                payload.get("model"),
+                purpose or "unspecified",
+                f"{stream.ttft:.3f}" if stream.ttft is not None else "n/a",
+                stream.duration,
+                timings.describe(),
+            )
+        )
+        return stream
+
+    def close(self) -> None:
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+        self._transport.close()
+
+
+def _discard_response(future: Future) -> None:
+    # A hedged attempt that lost the race: its stream is closed unread.
+    if future.cancelled() or future.exception() is not None:
+        return
+    response = future.result()
+    if isinstance(response, ChatStream):
+        response.close()
+
+
+class AsyncLLMClient:
+    def __init__(self, client: LLMClient, max_concurrency: int | None = None):
+        self.client = client
+        self.config = client.config
+        self.max_concurrency = max(1, max_concurrency or client.config.max_concurrency)
+        # asyncio semaphores bind to the loop that first waits on them, and each
+        # stage runs its own loop.
+        self._limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    async def chat(self, messages: Iterable[Dict[str, str]], **kwargs: Any) -> Dict[str, Any]:
+        return await self.run(self.client.chat, list(messages), **kwargs)
+
+    async def chat_json(self, messages: Iterable[Dict[str, str]], schema: Dict[str, Any], **kwargs: Any) -> Any:
+        return await self.run(self.client.chat_json, list(messages), schema, **kwargs)
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        # The blocking call runs on a worker thread; the pooled transport is shared
+        # across threads, and at most max_concurrency calls are in flight per loop.
+        loop = asyncio.get_running_loop()
+        limiter = self._limiters.get(loop)
+        if limiter is None:
+            limiter = self._limiters[loop] = asyncio.Semaphore(self.max_concurrency)
+        async with limiter:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
 
 def create_llm_client(config_overrides: Optional[Dict[str, Any]] = None) -> LLMClient:
     config = LLMConfig.from_settings(config_overrides)
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List
+
+from common.tools.lru_directory import LRUDirectory
+
+logger = logging.getLogger(__name__)
+
+ENTRY_SUFFIX = ".json.z"
+CACHE_MODES = ("use", "bypass", "refresh")
+# Payload fields that label a call without changing the completion.
+UNKEYED_FIELDS = frozenset({"purpose"})
+
+
+class LLMResponseCache:
+    def __init__(self, directory: Path, max_bytes: int, ttl_seconds: float) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.expired = 0
+        self._purposes: Dict[str, List[int]] = {}
+        self._store = LRUDirectory(self.directory, max_bytes, ENTRY_SUFFIX, "LLM cache")
+        self._lock = threading.Lock()
+
+    def key(self, payload: Dict[str, Any]) -> str:
+        # Line endings and surrounding whitespace in message text do not change the
+        # answer, so they do not change the key either.
+        normalized = {field: value for field, value in payload.items() if field not in UNKEYED_FIELDS}
+        normalized["messages"] = [
+            {
+                name: value.replace("\r\n", "\n").strip() if isinstance(value, str) else value
+                for name, value in message.items()
+            }
+            for message in payload.get("messages", [])
+        ]
+        encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, purpose: str | None = None, refresh: bool = False) -> Dict[str, Any] | None:
+        value = None if refresh else self._read(key)
+        self._record(purpose or "unspecified", value is not None)
+        return value
+
+    def put(self, key: str, response: Dict[str, Any], purpose: str | None = None) -> None:
+        entry = {"created": time.time(), "purpose": purpose or "unspecified", "response": response}
+        self._store.write(key, zlib.compress(json.dumps(entry, separators=(",", ":")).encode("utf-8"), 6))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": sum(hits for hits, _ in self._purposes.values()),
+                "misses": sum(misses for _, misses in self._purposes.values()),
+                "writes": self._store.writes,
+                "evictions": self._store.evictions,
+                "expired": self.expired,
+                "purposes": {
+                    purpose: {"hits": hits, "misses": misses} for purpose, (hits, misses) in self._purposes.items()
+                },
+            }
+
+    def _read(self, key: str) -> Dict[str, Any] | None:
+        payload = self._store.read(key)
+        if payload is None:
+            return None
+        try:
+            entry = json.loads(zlib.decompress(payload))
+        except (ValueError, zlib.error) as exc:
+            logger.warning("Discarding unreadable LLM cache entry %s: %s", self._store.path(key).name, exc)
+            self._store.discard(key)
+            return None
+        if time.time() - entry.get("created", 0.0) > self.ttl_seconds:
+            self._store.discard(key)
+            with self._lock:
+                self.expired += 1
+            return None
+        self._store.touch(key)
+        return entry.get("response")
+
+    def _record(self, purpose: str, hit: bool) -> None:
+        with self._lock:
+            counts = self._purposes.setdefault(purpose, [0, 0])
+            counts[0 if hit else 1] += 1
+            hits, misses = counts
+        logger.info(
+            "LLM cache %s purpose=%s hit_rate=%.0f%% (%d/%d)",
+            "hit" if hit else "miss",
+            purpose,
+            100.0 * hits / (hits + misses),
+            hits,
+            hits + misses,
+        )
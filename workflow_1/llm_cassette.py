@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from common.tools.tools import load_workflow_module
+
+logger = logging.getLogger(__name__)
+
+pool_module = load_workflow_module("workflow_1", "llm_pool")
+HTTPResult = pool_module.HTTPResult
+RequestTimings = pool_module.RequestTimings
+
+CASSETTE_MODES = ("off", "record", "replay")
+LATENCY_MODES = ("none", "recorded")
+INDEX_SUFFIX = ".index.json"
+
+
+class CassetteTransport:
+    # Stands in for HTTPConnectionPool. Recording passes requests through to the
+    # pool and appends each exchange to a JSON-lines cassette. Replaying answers
+    # from the cassette without touching the network.
+    def __init__(self, pool: Any, path: Path, mode: str, latency: str = "none") -> None:
+        if mode not in ("record", "replay"):
+            raise RuntimeError(f"Unknown LLM cassette mode {mode!r}; expected one of {', '.join(CASSETTE_MODES)}")
+        if latency not in LATENCY_MODES:
+            raise RuntimeError(f"Unknown LLM cassette latency {latency!r}; expected one of {', '.join(LATENCY_MODES)}")
+        self.pool = pool
+        self.path = Path(path)
+        self.mode = mode
+        self.latency = latency
+        self.recorded = 0
+        self.replayed = 0
+        self._index: Dict[str, List[int]] = {}
+        self._indexed_bytes = 0
+        self._plays: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if mode == "replay" and not self.path.is_file():
+            raise RuntimeError(f"LLM cassette {self.path} does not exist; record it first")
+        self._load_index()
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        body: bytes | None = None,
+        headers: Dict[str, str] | None = None,
+        cancelled: Any = None,
+    ) -> HTTPResult:
+        with self.send(method, url, body, headers, cancelled) as (response, timings):
+            data = response.read()
+            status, reason, response_headers = response.status, response.reason, dict(response.getheaders())
+        return HTTPResult(status, reason, response_headers, data, timings)
+
+    @contextmanager
+    def send(
+        self,
+        method: str,
+        url: str,
+        body: bytes | None = None,
+        headers: Dict[str, str] | None = None,
+        cancelled: Any = None,
+    ) -> Iterator[Tuple[Any, RequestTimings]]:
+        key = exchange_key(method, url, body)
+        if self.mode == "replay":
+            entry = self._next_entry(key, url)
+            response = _ReplayedResponse(entry, self.latency == "recorded")
+            timings = RequestTimings(reused=True, ttfb=entry["ttfb"] if self.latency == "recorded" else 0.0)
+            started = time.perf_counter()
+            if self.latency == "recorded":
+                if cancelled is None:
+                    time.sleep(entry["ttfb"])
+                elif cancelled.wait(entry["ttfb"]):
+                    raise pool_module.RequestCancelledError(f"Replayed request to {url} was cancelled")
+            try:
+                yield response, timings
+            finally:
+                timings.total = time.perf_counter() - started
+            return
+        started = time.perf_counter()
+        with self.pool.send(method, url, body, headers, cancelled) as (response, timings):
+            recorder = _RecordingResponse(response, started)
+            try:
+                yield recorder, timings
+            finally:
+                if recorder.complete:
+                    self._append(key, method, url, body, recorder, timings)
+
+    def close(self) -> None:
+        with self._lock:
+            self._write_index()
+        self.pool.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                **self.pool.stats(),
+                "recorded": self.recorded,
+                "replayed": self.replayed,
+                "exchanges": sum(len(offsets) for offsets in self._index.values()),
+            }
+
+    def _next_entry(self, key: str, url: str) -> Dict[str, Any]:
+        with self._lock:
+            offsets = self._index.get(key)
+            if not offsets:
+                raise RuntimeError(f"No recorded LLM exchange for {url} in cassette {self.path}")
+            # Repeated identical requests replay their recordings in order and then
+            # keep repeating the last one.
+            play = self._plays.get(key, 0)
+            self._plays[key] = play + 1
+            self.replayed += 1
+            offset = offsets[min(play, len(offsets) - 1)]
+        with self.path.open("rb") as handle:
+            handle.seek(offset)
+            return json.loads(handle.readline())
+
+    def _append(
+        self,
+        key: str,
+        method: str,
+        url: str,
+        body: bytes | None,
+        recorder: "_RecordingResponse",
+        timings: RequestTimings,
+    ) -> None:
+        # Request headers are not stored; they carry the API key.
+        entry = {
+            "key": key,
+            "method": method,
+            "url": url,
+            "request": json.loads(body) if body else None,
+            "status": recorder.status,
+            "reason": recorder.reason,
+            "headers": dict(recorder.getheaders()),
+            "ttfb": round(timings.ttfb, 6),
+            "total": round(time.perf_counter() - recorder.started, 6),
+            "recorded_at": time.time(),
+        }
+        if recorder.lines is not None:
+            entry["lines"] = recorder.lines
+        else:
+            entry["body"] = recorder.body.decode("utf-8", errors="replace")
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("ab") as handle:
+                offset = handle.tell()
+                handle.write(line)
+            if offset > self._indexed_bytes:
+                # Another client or process appended since this one last wrote.
+                self._scan(offset)
+            self._index.setdefault(key, []).append(offset)
+            self._indexed_bytes = offset + len(line)
+            self.recorded += 1
+
+    def _load_index(self) -> None:
+        index_path = self.path.with_name(self.path.name + INDEX_SUFFIX)
+        if index_path.is_file():
+            try:
+                stored = json.loads(index_path.read_text(encoding="utf-8"))
+                self._index = {key: list(offsets) for key, offsets in stored["offsets"].items()}
+                self._indexed_bytes = int(stored["bytes"])
+            except (OSError, ValueError, KeyError) as exc:
+                logger.warning("Rebuilding unreadable LLM cassette index %s: %s", index_path.name, exc)
+                self._index, self._indexed_bytes = {}, 0
+        if not self.path.is_file():
+            return
+        size = self.path.stat().st_size
+        if self._indexed_bytes > size:
+            self._index, self._indexed_bytes = {}, 0
+        if self._indexed_bytes < size:
+            # Exchanges appended after the index was last written are indexed from the file.
+            self._scan(size)
+        logger.debug(
+            "LLM cassette %s holds %d exchanges",
+            self.path,
+            sum(len(offsets) for offsets in self._index.values()),
+        )
+
+    def _scan(self, stop: int) -> None:
+        with self.path.open("rb") as handle:
+            handle.seek(self._indexed_bytes)
+            offset = self._indexed_bytes
+            while offset < stop:
+                line = handle.readline()
+                if not line.endswith(b"\n"):
+                    break
+                self._index.setdefault(json.loads(line)["key"], []).append(offset)
+                offset += len(line)
+        self._indexed_bytes = offset
+
+    def _write_index(self) -> None:
+        if self.mode != "record" or not self.path.is_file():
+            return
+        index_path = self.path.with_name(self.path.name + INDEX_SUFFIX)
+        temp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+        temp_path.write_text(json.dumps({"bytes": self._indexed_bytes, "offsets": self._index}), encoding="utf-8")
+        temp_path.replace(index_path)
+
+
+def exchange_key(method: str, url: str, body: bytes | None) -> str:
+    request = json.loads(body) if body else None
+    encoded = json.dumps([method, url, request], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class _RecordingResponse:
+    # Passes the pooled response through and keeps what the caller read. Streamed
+    # lines are kept with their arrival time so replay can pace them the same way.
+    def __init__(self, response: Any, started: float) -> None:
+        self._response = response
+        self.started = started
+        self.status = response.status
+        self.reason = response.reason
+        self.body = b""
+        self.lines: List[Tuple[float, str]] | None = None
+        self.complete = False
+
+    def getheader(self, name: str, default: str | None = None) -> str | None:
+        return self._response.getheader(name, default)
+
+    def getheaders(self) -> List[Tuple[str, str]]:
+        return self._response.getheaders()
+
+    def read(self, amount: int | None = None) -> bytes:
+        data = self._response.read(amount)
+        self.body += data
+        self.complete = self._response.isclosed()
+        return data
+
+    def __iter__(self) -> Iterator[bytes]:
+        self.lines = []
+        for line in self._response:
+            self.lines.append((round(time.perf_counter() - self.started, 6), line.decode("utf-8", errors="replace")))
+            yield line
+        self.complete = True
+
+
+class _ReplayedResponse:
+    def __init__(self, entry: Dict[str, Any], paced: bool) -> None:
+        self._entry = entry
+        self._paced = paced
+        self.status = entry["status"]
+        self.reason = entry.get("reason", "")
+        self._headers = entry.get("headers", {})
+
+    def getheader(self, name: str, default: str | None = None) -> str | None:
+        for header, value in self._headers.items():
+            if header.lower() == name.lower():
+                return value
+        return default
+
+    def getheaders(self) -> List[Tuple[str, str]]:
+        return list(self._headers.items())
+
+    def read(self, amount: int | None = None) -> bytes:
+        if "body" in self._entry:
+            if self._paced:
+                time.sleep(max(0.0, self._entry["total"] - self._entry["ttfb"]))
+            return self._entry["body"].encode("utf-8")
+        return "".join(line for _, line in self._entry["lines"]).encode("utf-8")
+
+    def __iter__(self) -> Iterator[bytes]:
+        if "lines" not in self._entry:
+            yield from self.read().splitlines(keepends=True)
+            return
+        started = time.perf_counter() - self._entry["ttfb"]
+        for arrived, line in self._entry["lines"]:
+            if self._paced:
+                delay = arrived - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            yield line.encode("utf-8")
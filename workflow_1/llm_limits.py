@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import email.utils
+import logging
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+# Words count one token per CHARS_PER_TOKEN characters and every symbol counts as
+# its own token. That is closer to BPE tokenizers on SQL than a flat character
+# ratio, and errs on the high side.
+TOKEN_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+DEFAULT_COMPLETION_TOKENS = 512
+# Role and separator tokens the chat format adds around each message.
+MESSAGE_OVERHEAD_TOKENS = 4
+# 429 is handled by pausing the shared rate limiter, not by the circuit breaker.
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+_registry_lock = threading.Lock()
+_rate_limiters: Dict[Tuple[Any, ...], "RateLimiter"] = {}
+_circuit_breakers: Dict[Tuple[Any, ...], "CircuitBreaker"] = {}
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: float | None = None) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        # The amount is taken at once and the balance may go negative; each caller
+        # waits for its own share of the debt, so concurrent callers queue in order.
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def refund(self, amount: float) -> None:
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._refill()
+            # Overlapping Retry-After pauses take the longest one, not their sum.
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0) -> None:
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.waited = 0.0
+
+    def acquire(self, estimated_tokens: int) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = self.requests.reserve(1)
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(estimated_tokens))
+        if wait > 0:
+            logger.debug("LLM rate limiter delaying call by %.2f seconds", wait)
+            self.waited += wait
+            time.sleep(wait)
+        return wait
+
+    def settle(self, estimated_tokens: int, used_tokens: int | None) -> None:
+        if self.tokens is not None and used_tokens is not None:
+            self.tokens.refund(estimated_tokens - used_tokens)
+
+    def pause(self, seconds: float) -> None:
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.pause(seconds)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 60.0) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == "open":
+                remaining = self.reset_seconds - (time.monotonic() - self._opened_at)
+                if remaining > 0:
+                    raise CircuitOpenError(f"LLM circuit open after {self.failures} failures; retry in {remaining:.1f}s")
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open":
+                # One trial call decides whether the endpoint has recovered.
+                if self._trial_in_flight:
+                    raise CircuitOpenError("LLM circuit half-open; a trial call is already in flight")
+                self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                logger.info("LLM circuit closed after a successful call")
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        # The call never reached the endpoint, so it proves nothing either way.
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning("LLM circuit opened after %d consecutive failures", self.failures)
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+def shared_rate_limiter(endpoint: str, requests_per_minute: float, tokens_per_minute: float) -> RateLimiter:
+    # Every client for the same endpoint and quota in this process draws from one budget.
+    key = (endpoint, requests_per_minute, tokens_per_minute)
+    with _registry_lock:
+        limiter = _rate_limiters.get(key)
+        if limiter is None:
+            limiter = _rate_limiters[key] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return limiter
+
+
+def shared_circuit_breaker(endpoint: str, failure_threshold: int, reset_seconds: float) -> CircuitBreaker:
+    key = (endpoint, failure_threshold, reset_seconds)
+    with _registry_lock:
+        breaker = _circuit_breakers.get(key)
+        if breaker is None:
+            breaker = _circuit_breakers[key] = CircuitBreaker(failure_threshold, reset_seconds)
+        return breaker
+
+
+def estimate_text_tokens(text: str) -> int:
+    return sum(-(-len(piece) // CHARS_PER_TOKEN) for piece in TOKEN_PIECE_PATTERN.findall(text))
+
+
+def estimate_prompt_tokens(messages: Iterable[Dict[str, Any]]) -> int:
+    return sum(
+        MESSAGE_OVERHEAD_TOKENS + estimate_text_tokens(str(message.get("content", ""))) for message in messages
+    )
+
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    prompt = estimate_prompt_tokens(payload.get("messages", []))
+    return prompt + int(payload.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float, retry_after: float | None = None) -> float:
+    if retry_after is not None:
+        # The server named its own wait; the jitter only spreads callers resuming together.
+        return retry_after + random.uniform(0, base_seconds)
+    return random.uniform(0, min(max_seconds, base_seconds * 2**attempt))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from settings import PROJECT_SETTINGS
+from common.tools.tools import load_workflow_module
+
+logger = logging.getLogger(__name__)
+
+agents_module = load_workflow_module("workflow_1", "agents")
+benchmark_module = load_workflow_module("workflow_2", "storeproc_benchmark")
+parse_module = load_workflow_module("workflow_2", "storeproc_parse_mapper")
+source_module = load_workflow_module("workflow_2", "storeproc_source")
+
+# Jobs cycle in this order: a plain summary call, a streamed overview of a
+# procedure that fits one call, a map-reduce overview of one that does not, and
+# the structured-output calls of the design agents.
+LOAD_JOBS = ("summary", "overview", "chunked-overview", "domain-design", "architecture")
+SMALL_PROCEDURE_STATEMENTS = 20
+LARGE_PROCEDURE_STATEMENTS = 150
+OVERVIEW_MAX_TOKENS = 200
+
+
+def run_load_test(
+    base_url: str,
+    requests: int | None = None,
+    concurrency: int | None = None,
+    client_overrides: Optional[Dict[str, Any]] = None,
+    seed: int = 7,
+) -> Dict[str, Any]:
+    settings = PROJECT_SETTINGS.get("loadtest", {})
+    requests = requests or int(settings.get("requests", 150))
+    concurrency = concurrency or int(settings.get("concurrency", 50))
+    overrides = {**settings.get("client_overrides", {}), **(client_overrides or {}), "base_url": base_url}
+    registry = agents_module.AgentRegistry(agents_module.create_llm_client(overrides))
+    client = registry.client
+    agent = registry.get("storeproc_overview")
+    domain_agent = registry.get("domain_design")
+    architect = registry.get("architect")
+    procedures = {
+        "small": _procedure(SMALL_PROCEDURE_STATEMENTS, seed),
+        "large": _procedure(LARGE_PROCEDURE_STATEMENTS, seed),
+    }
+    chunk_count = len(agent.plan_chunks(procedures["large"], max_tokens=OVERVIEW_MAX_TOKENS))
+    if chunk_count < 2:
+        registry.close()
+        raise RuntimeError(
+            f"The load test's {LARGE_PROCEDURE_STATEMENTS}-statement procedure fits one call, so chunked-overview "
+            "would not exercise map-reduce; lower loadtest.client_overrides.context_window_tokens."
+        )
+    runners: Dict[str, Callable[[], None]] = {
+        "summary": lambda: _summary_job(client, procedures["small"]),
+        "overview": lambda: _overview_job(agent, procedures["small"]),
+        "chunked-overview": lambda: _overview_job(agent, procedures["large"]),
+        "domain-design": lambda: domain_agent.describe_responsibilities("Orders", ["Orders", "OrderLines"]),
+        "architecture": lambda: architect.propose_api_operations("OrdersService", ["CustomersService"]),
+    }
+    jobs = [LOAD_JOBS[index % len(LOAD_JOBS)] for index in range(requests)]
+    logger.info("Load test: %d jobs at concurrency %d against %s", len(jobs), concurrency, base_url)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        failures = list(executor.map(lambda job: _run_job(job, runners[job]), jobs))
+    elapsed = time.perf_counter() - started
+    report = {
+        "base_url": base_url,
+        "jobs": len(jobs),
+        "concurrency": concurrency,
+        "failed_jobs": sum(failures),
+        "elapsed_seconds": round(elapsed, 3),
+        "jobs_per_second": round(len(jobs) / elapsed, 2) if elapsed else None,
+        "purposes": client.latency_stats(),
+        "pool": client.pool_stats(),
+        "agents": registry.call_stats(),
+        "structured": client.structured_stats(),
+        "endpoints": client.endpoint_stats(),
+    }
+    registry.close()
+    return report
+
+
+def _procedure(statement_count: int, seed: int) -> Dict[str, Any]:
+    source = benchmark_module.generate_procedure(statement_count, seed=seed)
+    parsed = parse_module.parse_store_procedure(source)
+    return {
+        "procedure_name": f"LoadTest{statement_count}",
+        "procedure_steps": parsed["procedure_steps"],
+        "source": source_module.SourceBuffer.from_text(source),
+    }
+
+
+def _run_job(job: str, runner: Callable[[], None]) -> bool:
+    try:
+        runner()
+    except RuntimeError as exc:
+        logger.warning("Load test job %s failed: %s", job, exc)
+        return True
+    return False
+
+
+def _summary_job(client: Any, procedure: Dict[str, Any]) -> None:
+    client.chat(
+        agents_module.procedure_messages(procedure["source"].text()),
+        max_tokens=200,
+        purpose="stored-proc-summary",
+    )
+
+
+def _overview_job(agent: Any, procedure: Dict[str, Any]) -> None:
+    with agent.narrate_procedure(procedure, max_tokens=OVERVIEW_MAX_TOKENS) as stream:
+        for _ in stream:
+            pass
+
+
+def format_report(report: Dict[str, Any]) -> List[str]:
+    lines = [
+        f"{report['jobs']} jobs at concurrency {report['concurrency']} in {report['elapsed_seconds']}s "
+        f"({report['jobs_per_second']} jobs/s), {report['failed_jobs']} failed",
+        f"{'purpose':<30} {'calls':>6} {'errors':>6} {'p50':>8} {'p95':>8} {'p99':>8}",
+    ]
+    for purpose, stats in sorted(report["purposes"].items()):
+        percentiles = " ".join(
+            f"{stats[name]:>7.3f}s" if stats[name] is not None else f"{'n/a':>8}" for name in ("p50", "p95", "p99")
+        )
+        lines.append(f"{purpose:<30} {stats['calls']:>6} {stats['errors']:>6} {percentiles}")
+    for endpoint, stats in sorted(report.get("endpoints", {}).items()):
+        percentiles = " ".join(
+            f"{stats[name]:.3f}s" if stats[name] is not None else "n/a" for name in ("p50", "p95", "p99")
+        )
+        lines.append(
+            f"Endpoint {endpoint}: {stats['calls']} attempts, {stats['errors']} errors, "
+            f"{stats['hedges']} hedges, {stats['wins']} hedged wins, p50/p95/p99 {percentiles}"
+        )
+    for name, stats in sorted(report.get("structured", {}).items()):
+        lines.append(
+            f"Structured {name}: {stats['calls']} calls, {stats['repaired']} repaired locally, "
+            f"{stats['reprompts']} re-prompts (rate {stats['reprompt_rate']:.2%}), {stats['failed']} failed"
+        )
+    return lines
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from settings import PROJECT_SETTINGS
+from common.tools.tools import load_workflow_module
+
+logger = logging.getLogger(__name__)
+
+limits_module = load_workflow_module("workflow_1", "llm_limits")
+
+MOCK_WORDS = (
+    "the procedure reads orders joins customers and payments filters by status "
+    "updates inventory totals inserts audit rows and returns a summary per region"
+).split()
+
+
+@dataclass(frozen=True)
+class MockLLMConfig:
+    host: str = "127.0.0.1"
+    port: int = 0
+    # Time to first token follows a log-normal distribution around its median;
+    # the rest of the completion is paced at tokens_per_second.
+    ttft_median_seconds: float = 0.5
+    latency_sigma: float = 0.5
+    tokens_per_second: float = 40.0
+    completion_tokens: int = 120
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_seconds: float = 1.0
+    # Share of JSON-mode replies damaged the way models damage them: fenced,
+    # with a trailing comma, or cut off.
+    malformed_json_rate: float = 0.0
+    seed: int | None = None
+
+    @classmethod
+    def from_settings(cls, overrides: Optional[Dict[str, Any]] = None) -> "MockLLMConfig":
+        source = dict(PROJECT_SETTINGS.get("llm_mock", {}))
+        if overrides:
+            source.update(overrides)
+        return cls(
+            host=source.get("host", "127.0.0.1"),
+            port=int(source.get("port", 0)),
+            ttft_median_seconds=float(source.get("ttft_median_seconds", 0.5)),
+            latency_sigma=float(source.get("latency_sigma", 0.5)),
+            tokens_per_second=float(source.get("tokens_per_second", 40.0)),
+            completion_tokens=int(source.get("completion_tokens", 120)),
+            error_rate=float(source.get("error_rate", 0.0)),
+            rate_limit_rate=float(source.get("rate_limit_rate", 0.0)),
+            retry_after_seconds=float(source.get("retry_after_seconds", 1.0)),
+            malformed_json_rate=float(source.get("malformed_json_rate", 0.0)),
+            seed=source.get("seed"),
+        )
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    # Speaks enough of the OpenAI-compatible /chat/completions protocol for
+    # LLMClient: JSON replies, SSE streaming, usage, response_format JSON modes,
+    # 429 with Retry-After and 5xx.
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, config: MockLLMConfig | None = None) -> None:
+        self.config = config or MockLLMConfig.from_settings()
+        super().__init__((self.config.host, self.config.port), _MockHandler)
+        self.counters = {
+            "requests": 0,
+            "completed": 0,
+            "streamed": 0,
+            "rate_limited": 0,
+            "errors": 0,
+            "json_replies": 0,
+            "malformed_json": 0,
+        }
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        logger.info("Mock LLM server listening at %s", self.base_url)
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+    def plan(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        # Draws the outcome and timing of one request.
+        with self._lock:
+            self.counters["requests"] += 1
+            roll = self._random.random()
+            if roll < self.config.rate_limit_rate:
+                self.counters["rate_limited"] += 1
+                return {"status": 429}
+            if roll < self.config.rate_limit_rate + self.config.error_rate:
+                self.counters["errors"] += 1
+                return {"status": self._random.choice((500, 502, 503))}
+            ttft = self._random.lognormvariate(0.0, self.config.latency_sigma) * self.config.ttft_median_seconds
+            offset = self._random.randrange(len(MOCK_WORDS))
+            self.counters["streamed" if payload.get("stream") else "completed"] += 1
+            response_format = payload.get("response_format") or {}
+            if response_format.get("type") in ("json_schema", "json_object"):
+                self.counters["json_replies"] += 1
+                schema = (response_format.get("json_schema") or {}).get("schema") or {
+                    "type": "object",
+                    "properties": {"summary": {"type": "string"}},
+                }
+                content = json.dumps(sample_json(schema, self._random))
+                if self._random.random() < self.config.malformed_json_rate:
+                    self.counters["malformed_json"] += 1
+                    content = damage_json(content, self._random)
+                # Roughly four characters per token.
+                pieces = [content[index : index + 4] for index in range(0, len(content), 4)]
+                return {"status": 200, "ttft": ttft, "pieces": pieces}
+        tokens = min(int(payload.get("max_tokens") or self.config.completion_tokens), self.config.completion_tokens)
+        words = [MOCK_WORDS[(offset + index) % len(MOCK_WORDS)] for index in range(max(1, tokens))]
+        return {"status": 200, "ttft": ttft, "pieces": [words[0], *(f" {word}" for word in words[1:])]}
+
+
+def sample_json(schema: Dict[str, Any], rng: random.Random) -> Any:
+    # A value that satisfies the subset of JSON Schema the agents use.
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    kind = schema.get("type", "object")
+    kind = kind if isinstance(kind, str) else kind[0]
+    if kind == "object":
+        return {name: sample_json(item, rng) for name, item in schema.get("properties", {}).items()}
+    if kind == "array":
+        count = max(schema.get("minItems", 0), rng.randint(1, 3))
+        return [sample_json(schema.get("items", {"type": "string"}), rng) for _ in range(count)]
+    if kind == "string":
+        offset = rng.randrange(len(MOCK_WORDS))
+        return " ".join(MOCK_WORDS[(offset + index) % len(MOCK_WORDS)] for index in range(3))
+    if kind in ("integer", "number"):
+        return rng.randint(1, 100)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    return None
+
+
+def damage_json(content: str, rng: random.Random) -> str:
+    damage = rng.choice(("fence", "trailing_comma", "truncate"))
+    if damage == "fence":
+        return f"Here is the JSON:\n```json\n{content}\n```"
+    if damage == "trailing_comma":
+        return content[:-1] + ",}" if content.endswith("}") else content
+    return content[: max(1, len(content) * 2 // 3)]
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: MockLLMServer
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "code": 404}})
+            return
+        try:
+            payload = json.loads(raw)
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Request body is not JSON", "code": 400}})
+            return
+        plan = self.server.plan(payload)
+        status = plan["status"]
+        if status == 429:
+            retry_after = self.server.config.retry_after_seconds
+            self._send_json(429, {"error": {"message": "Rate limit exceeded", "code": 429}}, {"Retry-After": f"{retry_after:g}"})
+            return
+        if status != 200:
+            self._send_json(status, {"error": {"message": "Mock upstream failure", "code": status}})
+            return
+        time.sleep(plan["ttft"])
+        usage = {
+            "prompt_tokens": limits_module.estimate_prompt_tokens(payload.get("messages", [])),
+            "completion_tokens": len(plan["pieces"]),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        if payload.get("stream"):
+            self._stream(payload, completion_id, plan["pieces"], usage)
+            return
+        time.sleep(len(plan["pieces"]) / self.server.config.tokens_per_second)
+        self._send_json(
+            200,
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "model": payload.get("model", "mock"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(plan["pieces"])},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            },
+        )
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("Mock LLM server: " + format, *args)
+
+    def _stream(self, payload: Dict[str, Any], completion_id: str, pieces: List[str], usage: Dict[str, int]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = 1.0 / self.server.config.tokens_per_second
+        for index, piece in enumerate(pieces):
+            if index:
+                time.sleep(delay)
+            self._send_event(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "model": payload.get("model", "mock"),
+                    "choices": [{"index": 0, "delta": {"content": piece}}],
+                }
+            )
+        final: Dict[str, Any] = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            final["usage"] = usage
+        self._send_event(final)
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def _send_event(self, event: Dict[str, Any]) -> None:
+        self._send_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+
+    def _send_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] | None = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
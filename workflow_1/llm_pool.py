@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import http.client
+import logging
+import math
+import socket
+import ssl
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Set, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, str, int]
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# A keep-alive socket the server has already closed fails like this on reuse;
+# such a request is retried once on a fresh connection.
+STALE_CONNECTION_ERRORS = (http.client.BadStatusLine, ConnectionResetError, ConnectionAbortedError, BrokenPipeError)
+
+
+class PoolExhaustedError(RuntimeError):
+    # The local pool had no connection to give; the endpoint itself was not reached.
+    pass
+
+
+class RequestCancelledError(RuntimeError):
+    pass
+
+
+class RequestCancellation(threading.Event):
+    # Setting it also aborts the requests watched by it: their sockets are shut
+    # down, so a read blocked on a slow server returns at once instead of running on.
+    def __init__(self) -> None:
+        super().__init__()
+        self._connections: Set[http.client.HTTPConnection] = set()
+        self._lock = threading.Lock()
+
+    def set(self) -> None:
+        with self._lock:
+            super().set()
+            connections = list(self._connections)
+        for connection in connections:
+            _abort(connection)
+
+    def watch(self, connection: http.client.HTTPConnection) -> bool:
+        with self._lock:
+            if self.is_set():
+                return False
+            self._connections.add(connection)
+            return True
+
+    def unwatch(self, connection: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._connections.discard(connection)
+
+
+@dataclass
+class RequestTimings:
+    reused: bool = False
+    connect: float = 0.0
+    tls: float = 0.0
+    ttfb: float = 0.0
+    total: float = 0.0
+
+    def describe(self) -> str:
+        return (
+            f"connect={self.connect:.3f} tls={self.tls:.3f} ttfb={self.ttfb:.3f} "
+            f"reused={self.reused}"
+        )
+
+
+@dataclass(frozen=True)
+class HTTPResult:
+    status: int
+    reason: str
+    headers: Dict[str, str]
+    body: bytes
+    timings: RequestTimings = field(default_factory=RequestTimings)
+
+
+class LatencyRecorder:
+    # Percentiles are taken over the most recent samples per name, so they follow
+    # the endpoint's current behaviour rather than the whole run.
+    def __init__(self, window: int = 1000) -> None:
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, ok: bool = True) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(name, [0, 0])
+            counts[0] += 1
+            if not ok:
+                counts[1] += 1
+                return
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            return len(self._samples.get(name, ()))
+
+    def percentile(self, name: str, fraction: float) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        return samples[max(0, math.ceil(fraction * len(samples)) - 1)]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            names = list(self._counts)
+        report: Dict[str, Dict[str, Any]] = {}
+        for name in names:
+            with self._lock:
+                calls, errors = self._counts[name]
+                samples = list(self._samples.get(name, ()))
+            report[name] = {
+                "calls": calls,
+                "errors": errors,
+                "p50": self.percentile(name, 0.50),
+                "p95": self.percentile(name, 0.95),
+                "p99": self.percentile(name, 0.99),
+                "mean": sum(samples) / len(samples) if samples else None,
+            }
+        return report
+
+
+class _TimedHTTPConnection(http.client.HTTPConnection):
+    connect_seconds = 0.0
+    tls_seconds = 0.0
+
+    def connect(self) -> None:
+        started = time.perf_counter()
+        super().connect()
+        self.connect_seconds = time.perf_counter() - started
+
+
+class _TimedHTTPSConnection(http.client.HTTPSConnection):
+    connect_seconds = 0.0
+    tls_seconds = 0.0
+
+    def connect(self) -> None:
+        # HTTPSConnection.connect does the TCP and TLS handshakes in one call;
+        # they are split here so each can be timed.
+        started = time.perf_counter()
+        http.client.HTTPConnection.connect(self)
+        connected = time.perf_counter()
+        self.sock = self._context.wrap_socket(self.sock, server_hostname=self._tunnel_host or self.host)
+        self.connect_seconds = connected - started
+        self.tls_seconds = time.perf_counter() - connected
+
+
+class HTTPConnectionPool:
+    def __init__(
+        self,
+        max_connections: int = 10,
+        max_per_host: int = 4,
+        idle_timeout: float = 60.0,
+        timeout: float = 30.0,
+    ) -> None:
+        self.max_connections = max(1, max_connections)
+        self.max_per_host = max(1, min(max_per_host, self.max_connections))
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.created = 0
+        self.reused = 0
+        self._idle: Dict[PoolKey, Deque[Tuple[http.client.HTTPConnection, float]]] = {}
+        self._open: Dict[PoolKey, int] = {}
+        self._total = 0
+        self._condition = threading.Condition()
+        self._ssl_context = ssl.create_default_context()
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        body: bytes | None = None,
+        headers: Dict[str, str] | None = None,
+        cancelled: RequestCancellation | None = None,
+    ) -> HTTPResult:
+        with self.send(method, url, body, headers, cancelled) as (response, timings):
+            data = response.read()
+            status, reason, response_headers = response.status, response.reason, dict(response.getheaders())
+        if cancelled is not None and cancelled.is_set():
+            # A body without a length reads as complete when its socket is shut down.
+            raise RequestCancelledError(f"Request to {url} was cancelled")
+        return HTTPResult(status, reason, response_headers, data, timings)
+
+    @contextmanager
+    def send(
+        self,
+        method: str,
+        url: str,
+        body: bytes | None = None,
+        headers: Dict[str, str] | None = None,
+        cancelled: RequestCancellation | None = None,
+    ) -> Iterator[Tuple[http.client.HTTPResponse, RequestTimings]]:
+        # The connection goes back to the pool only if the caller read the body to the end.
+        # Setting cancelled aborts the request wherever it is and raises RequestCancelledError.
+        parts = urlsplit(url)
+        if parts.scheme not in DEFAULT_PORTS or not parts.hostname:
+            raise RuntimeError(f"Unsupported URL for the HTTP connection pool: {url}")
+        key = (parts.scheme, parts.hostname, parts.port or DEFAULT_PORTS[parts.scheme])
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        started = time.perf_counter()
+        timings = RequestTimings()
+        while True:
+            connection, reused = self._acquire(key)
+            if cancelled is not None and not cancelled.watch(connection):
+                self._release(key, connection, reusable=reused)
+                raise RequestCancelledError(f"Request to {url} was cancelled before it was sent")
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                if cancelled is not None and cancelled.is_set():
+                    # Cancelled while connecting, before there was a socket to shut down.
+                    raise RequestCancelledError(f"Request to {url} was cancelled")
+                sent = time.perf_counter()
+                response = connection.getresponse()
+            except BaseException as exc:
+                self._finish(key, connection, False, cancelled)
+                if cancelled is not None and cancelled.is_set() and not isinstance(exc, RequestCancelledError):
+                    raise RequestCancelledError(f"Request to {url} was cancelled") from exc
+                if reused and isinstance(exc, STALE_CONNECTION_ERRORS):
+                    logger.debug("Pooled connection to %s:%s was closed by the server; reconnecting", key[1], key[2])
+                    continue
+                raise
+            break
+        timings.ttfb = time.perf_counter() - sent
+        timings.reused = reused
+        if not reused:
+            timings.connect = connection.connect_seconds
+            timings.tls = connection.tls_seconds
+        reusable = False
+        try:
+            yield response, timings
+            reusable = response.isclosed() and not response.will_close
+        except (OSError, http.client.HTTPException) as exc:
+            if cancelled is not None and cancelled.is_set():
+                raise RequestCancelledError(f"Request to {url} was cancelled") from exc
+            raise
+        finally:
+            timings.total = time.perf_counter() - started
+            self._finish(key, connection, reusable, cancelled)
+
+    def close(self) -> None:
+        with self._condition:
+            for key, idle in self._idle.items():
+                while idle:
+                    connection, _ = idle.popleft()
+                    connection.close()
+                    self._discard(key)
+            self._condition.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            idle = sum(len(connections) for connections in self._idle.values())
+            return {"open": self._total, "idle": idle, "created": self.created, "reused": self.reused}
+
+    def _acquire(self, key: PoolKey) -> Tuple[http.client.HTTPConnection, bool]:
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while True:
+                self._evict_idle(time.monotonic())
+                idle = self._idle.get(key)
+                if idle:
+                    # Most recently used first: the server is least likely to have closed it.
+                    connection, _ = idle.pop()
+                    self.reused += 1
+                    return connection, True
+                if self._open.get(key, 0) < self.max_per_host:
+                    if self._total >= self.max_connections:
+                        self._evict_oldest_idle()
+                    if self._total < self.max_connections:
+                        self._open[key] = self._open.get(key, 0) + 1
+                        self._total += 1
+                        self.created += 1
+                        break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhaustedError(f"No pooled connection to {key[1]}:{key[2]} became free within {self.timeout}s")
+                self._condition.wait(remaining)
+        scheme, host, port = key
+        if scheme == "https":
+            return _TimedHTTPSConnection(host, port, timeout=self.timeout, context=self._ssl_context), False
+        return _TimedHTTPConnection(host, port, timeout=self.timeout), False
+
+    def _finish(
+        self,
+        key: PoolKey,
+        connection: http.client.HTTPConnection,
+        reusable: bool,
+        cancelled: RequestCancellation | None,
+    ) -> None:
+        if cancelled is not None:
+            cancelled.unwatch(connection)
+            # The socket of a cancelled request may already be shut down.
+            reusable = reusable and not cancelled.is_set()
+        self._release(key, connection, reusable)
+
+    def _release(self, key: PoolKey, connection: http.client.HTTPConnection, reusable: bool) -> None:
+        with self._condition:
+            if reusable:
+                self._idle.setdefault(key, deque()).append((connection, time.monotonic()))
+            else:
+                connection.close()
+                self._discard(key)
+            # Waiters for different hosts share the condition, so all of them are woken.
+            self._condition.notify_all()
+
+    def _discard(self, key: PoolKey) -> None:
+        self._open[key] -= 1
+        self._total -= 1
+
+    def _evict_idle(self, now: float) -> None:
+        for key, idle in self._idle.items():
+            while idle and now - idle[0][1] > self.idle_timeout:
+                connection, _ = idle.popleft()
+                connection.close()
+                self._discard(key)
+
+    def _evict_oldest_idle(self) -> None:
+        # Frees a slot held by an idle connection to another host once the pool is full.
+        oldest_key = None
+        oldest_time = float("inf")
+        for key, idle in self._idle.items():
+            if idle and idle[0][1] < oldest_time:
+                oldest_key, oldest_time = key, idle[0][1]
+        if oldest_key is not None:
+            connection, _ = self._idle[oldest_key].popleft()
+            connection.close()
+            self._discard(oldest_key)
+
+
+def _abort(connection: http.client.HTTPConnection) -> None:
+    sock = connection.sock
+    if sock is None:
+        return
+    try:
+        # The plain socket's shutdown, because SSLSocket.shutdown also drops the TLS
+        # state under a reader that may be using it.
+        socket.socket.shutdown(sock, socket.SHUT_RDWR)
+    except OSError:
+        pass
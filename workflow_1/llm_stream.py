@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import http.client
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+DONE_EVENT = "[DONE]"
+
+
+def iter_sse_data(lines: Iterable[bytes]) -> Iterator[str]:
+    # Yields the data of each server-sent event; comment lines such as
+    # ": PROCESSING" keep-alives and other fields are skipped.
+    data: List[str] = []
+    for raw in lines:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield "\n".join(data)
+                data = []
+            continue
+        if line.startswith(":"):
+            continue
+        name, _, value = line.partition(":")
+        if name == "data":
+            data.append(value[1:] if value.startswith(" ") else value)
+    if data:
+        yield "\n".join(data)
+
+
+class ChatStream:
+    def __init__(
+        self,
+        events: Iterator[str],
+        started: float | None = None,
+        timings: Any = None,
+        close: Callable[[], None] | None = None,
+    ) -> None:
+        self.started = time.perf_counter() if started is None else started
+        self.timings = timings
+        self.ttft: float | None = None
+        self.duration: float | None = None
+        self.id: str | None = None
+        self.model: str | None = None
+        self.finish_reason: str | None = None
+        self.usage: Dict[str, Any] | None = None
+        self.completed = False
+        self._consumed = False
+        self._events = events
+        self._close = close
+        self._parts: List[str] = []
+        self._callbacks: List[Callable[[Dict[str, Any]], None]] = []
+        self._close_callbacks: List[Callable[[], None]] = []
+
+    @classmethod
+    def from_response(cls, response: Dict[str, Any]) -> "ChatStream":
+        # Replays a complete response, e.g. from the cache, as a single delta.
+        choice = (response.get("choices") or [{}])[0]
+        chunk = {
+            "id": response.get("id"),
+            "model": response.get("model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "delta": {"content": choice.get("message", {}).get("content") or ""},
+                    "finish_reason": choice.get("finish_reason"),
+                }
+            ],
+            "usage": response.get("usage"),
+        }
+        return cls(iter([json.dumps(chunk)]))
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def __iter__(self) -> Iterator[str]:
+        if self._consumed:
+            return
+        self._consumed = True
+        try:
+            for data in self._events:
+                if data.strip() == DONE_EVENT:
+                    # Reading to the end of the body lets the connection go back to the pool.
+                    for _ in self._events:
+                        pass
+                    break
+                chunk = json.loads(data)
+                if chunk.get("error"):
+                    raise RuntimeError(f"LLM stream failed: {chunk['error']}")
+                self.id = self.id or chunk.get("id")
+                self.model = self.model or chunk.get("model")
+                if chunk.get("usage"):
+                    self.usage = chunk["usage"]
+                for choice in chunk.get("choices") or []:
+                    if choice.get("finish_reason"):
+                        self.finish_reason = choice["finish_reason"]
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        if self.ttft is None:
+                            self.ttft = time.perf_counter() - self.started
+                        self._parts.append(content)
+                        yield content
+            self.completed = True
+        except (OSError, http.client.HTTPException, ValueError) as exc:
+            raise RuntimeError(f"LLM stream failed: {exc}") from exc
+        finally:
+            self.close()
+        response = self.response()
+        for callback in self._callbacks:
+            callback(response)
+
+    def add_done_callback(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        # Runs with the assembled response once the stream has been read to the end.
+        self._callbacks.append(callback)
+
+    def add_close_callback(self, callback: Callable[[], None]) -> None:
+        # Runs once when the stream is closed, whether or not it was read to the end.
+        self._close_callbacks.append(callback)
+
+    def response(self) -> Dict[str, Any]:
+        if not self._consumed:
+            for _ in self:
+                pass
+        response: Dict[str, Any] = {
+            "id": self.id,
+            "model": self.model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.text},
+                    "finish_reason": self.finish_reason,
+                }
+            ],
+        }
+        if self.usage is not None:
+            response["usage"] = self.usage
+        return response
+
+    def close(self) -> None:
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.started
+        close, self._close = self._close, None
+        if close is not None:
+            close()
+        callbacks, self._close_callbacks = self._close_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def __enter__(self) -> "ChatStream":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
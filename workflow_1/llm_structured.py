@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import json
+import re
+import threading
+from typing import Any, Dict, List, Tuple
+
+STRUCTURED_OUTPUT_MODES = ("json_schema", "json_object", "prompt")
+JSON_TYPES: Dict[str, Tuple[type, ...]] = {
+    "object": (dict,),
+    "array": (list,),
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "null": (type(None),),
+}
+FENCE_PATTERN = re.compile(r"^```[a-zA-Z]*\s*|\s*```\s*$")
+LITERAL_PATTERN = re.compile(r'("(?:\\.|[^"\\])*")|\b(True|False|None)\b')
+LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def response_format(mode: str, name: str, schema: Dict[str, Any]) -> Dict[str, Any] | None:
+    if mode not in STRUCTURED_OUTPUT_MODES:
+        raise RuntimeError(
+            f"Unknown structured output mode {mode!r}; expected one of {', '.join(STRUCTURED_OUTPUT_MODES)}"
+        )
+    if mode == "json_schema":
+        return {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
+def schema_instruction(schema: Dict[str, Any]) -> str:
+    return "Reply with a single JSON value, and nothing else, that matches this JSON schema:\n" + json.dumps(schema)
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = "$", partial: bool = False) -> List[str]:
+    # Checks the subset of JSON Schema the agent schemas use. With partial, the
+    # top-level object may still be missing required properties.
+    errors: List[str] = []
+    expected = schema.get("type")
+    if expected is not None:
+        types = [expected] if isinstance(expected, str) else list(expected)
+        allowed = tuple(kind for name in types for kind in JSON_TYPES[name])
+        # bool is an int subclass in Python but not a JSON number.
+        if not isinstance(value, allowed) or (isinstance(value, bool) and "boolean" not in types):
+            return [f"{path}: expected {' or '.join(types)}, got {_json_type(value)}"]
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} is not one of {schema['enum']}")
+    if isinstance(value, str) and len(value) < schema.get("minLength", 0):
+        errors.append(f"{path}: shorter than {schema['minLength']} characters")
+    if isinstance(value, list):
+        if len(value) < schema.get("minItems", 0):
+            errors.append(f"{path}: fewer than {schema['minItems']} items")
+        if "items" in schema:
+            for index, item in enumerate(value):
+                errors.extend(validate(item, schema["items"], f"{path}[{index}]"))
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        if not partial:
+            errors.extend(f"{path}: missing property {name!r}" for name in schema.get("required", []) if name not in value)
+        for name, item in value.items():
+            if name in properties:
+                errors.extend(validate(item, properties[name], f"{path}.{name}"))
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}: unexpected property {name!r}")
+    return errors
+
+
+def repair_json(text: str) -> str:
+    # Cheap fixes for the usual ways model output misses valid JSON: code fences,
+    # prose around the value, trailing commas, Python literals, and a reply cut
+    # off by max_tokens, whose open strings and brackets are closed.
+    text = FENCE_PATTERN.sub("", text.strip())
+    starts = [index for index in (text.find("{"), text.find("[")) if index >= 0]
+    if not starts:
+        return text
+    out: List[str] = []
+    closers: List[str] = []
+    in_string = escaped = False
+    for char in text[min(starts):]:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]":
+            _drop_trailing_comma(out)
+            if closers:
+                out.append(closers.pop())
+            if not closers:
+                break
+            continue
+        out.append(char)
+    if in_string:
+        if escaped:
+            out.pop()
+        out.append('"')
+    if closers:
+        _drop_dangling_member(out, closers[-1])
+    while closers:
+        _drop_trailing_comma(out)
+        out.append(closers.pop())
+    repaired = "".join(out)
+    return LITERAL_PATTERN.sub(lambda match: match.group(1) or LITERALS[match.group(2)], repaired)
+
+
+def parse_structured(text: str, schema: Dict[str, Any]) -> Tuple[Any, List[str], bool]:
+    # Returns the value, the schema errors left, and whether local repair was needed.
+    try:
+        value = json.loads(text)
+    except ValueError:
+        value = None
+    else:
+        errors = validate(value, schema)
+        if not errors:
+            return value, [], False
+    try:
+        repaired = json.loads(repair_json(text))
+    except ValueError as exc:
+        return value, [f"$: not valid JSON ({exc})"], True
+    return repaired, validate(repaired, schema), True
+
+
+class JSONStreamValidator:
+    # Follows streamed JSON as it arrives. Each time a top-level member completes,
+    # the members so far are checked against the schema, so a reply that has
+    # already gone wrong can be abandoned without waiting for the rest of it.
+    def __init__(self, schema: Dict[str, Any]) -> None:
+        self.schema = schema
+        self.text = ""
+        self.error: str | None = None
+        self.complete = False
+        self._closers: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._start: int | None = None
+
+    def feed(self, delta: str) -> None:
+        offset = len(self.text)
+        self.text += delta
+        if self.error is not None or self.complete:
+            return
+        for index, char in enumerate(delta, offset):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if self._start is None:
+                # Prose or a code fence before the value is left to repair.
+                if char in "{[":
+                    self._start = index
+                    self._closers.append("}" if char == "{" else "]")
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._closers.append("}" if char == "{" else "]")
+            elif char in "}]":
+                if char != self._closers.pop():
+                    self.error = f"unexpected {char!r} at offset {index}"
+                    return
+                if not self._closers:
+                    self.complete = True
+                    self._check(self.text[self._start : index + 1], partial=False)
+                    return
+            elif char == "," and len(self._closers) == 1:
+                self._check(self.text[self._start : index] + self._closers[0], partial=True)
+                if self.error is not None:
+                    return
+
+    def _check(self, text: str, partial: bool) -> None:
+        try:
+            value = json.loads(text)
+        except ValueError:
+            # Malformed but possibly repairable; the final parse decides.
+            return
+        errors = validate(value, self.schema, partial=partial)
+        if errors:
+            self.error = "; ".join(errors)
+
+
+class StructuredOutputStats:
+    def __init__(self) -> None:
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, repaired: bool, reprompts: int, failed: bool) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(name, {"calls": 0, "repaired": 0, "reprompts": 0, "failed": 0})
+            counts["calls"] += 1
+            counts["repaired"] += int(repaired)
+            counts["reprompts"] += reprompts
+            counts["failed"] += int(failed)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        # reprompt_rate is extra round trips per structured call; every repair that
+        # succeeds locally is one fewer.
+        with self._lock:
+            return {
+                name: {**counts, "reprompt_rate": round(counts["reprompts"] / counts["calls"], 4)}
+                for name, counts in self._counts.items()
+            }
+
+
+def _json_type(value: Any) -> str:
+    for name, kinds in JSON_TYPES.items():
+        if isinstance(value, kinds) and not (isinstance(value, bool) and name in ("integer", "number")):
+            return name
+    return type(value).__name__
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _drop_dangling_member(out: List[str], closer: str) -> None:
+    # A reply cut off after a key, a colon or a comma ends in an incomplete member.
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ":":
+        out.append("null")
+        return
+    if closer != "}" or not out or out[-1] != '"':
+        return
+    text = "".join(out)
+    match = re.search(r'[{,]\s*"(?:\\.|[^"\\])*"$', text)
+    if match:
+        del out[match.start() + 1 :]
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import glob
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from settings import PROJECT_SETTINGS
+from common.tools.tools import load_workflow_module
+
+logger = logging.getLogger(__name__)
+
+parse_module = load_workflow_module("workflow_2", "storeproc_parse_mapper")
+lexer_module = load_workflow_module("workflow_2", "storeproc_lexer")
+model_module = load_workflow_module("workflow_2", "storeproc_model")
+
+PROCEDURE_WORDS = frozenset({"procedure", "proc"})
+GLOB_CHARACTERS = frozenset("*?[")
+# Fields that are identical for every procedure (the shared mapping) or
+# already on disk (the source text) are left out of each NDJSON line. Step
+# spans are offsets into the procedure's own text.
+EXCLUDED_RESULT_FIELDS = frozenset({"source", "domains"})
+
+_worker_domain_mapping: Dict[str, List[str]] = {}
+_worker_type_catalog: Dict[str, Dict[str, str]] = {}
+_worker_cache: Any = None
+
+
+def discover_sql_sources(target: str | Path) -> List[Path]:
+    target_text = str(target)
+    if GLOB_CHARACTERS.intersection(target_text):
+        return sorted(Path(match) for match in glob.glob(target_text, recursive=True) if Path(match).is_file())
+    path = Path(target_text)
+    if path.is_dir():
+        return sorted(candidate for candidate in path.rglob("*.sql") if candidate.is_file())
+    if path.is_file():
+        return [path]
+    raise RuntimeError(f"No stored procedure sources found at {target_text}")
+
+
+def split_procedures(sql_text: str, dialect: lexer_module.DialectProfile = lexer_module.ANSI) -> List[str]:
+    # The dialect decides what the lexer treats as strings and comments, so a CREATE
+    # inside a T-SQL bracketed name or a PL/SQL q-quote is not a boundary.
+    stream = lexer_module.tokenize(sql_text, dialect=dialect)
+    values, starts = stream.values, stream.starts
+    token_count = len(stream)
+    offsets: List[int] = []
+    for index in stream.keyword_positions:
+        if values[index] != "create":
+            continue
+        position = index + 1
+        if position + 1 < token_count and values[position].lower() == "or":
+            position += 2
+        if position < token_count and values[position].lower() in PROCEDURE_WORDS:
+            offsets.append(starts[index])
+    if len(offsets) < 2:
+        return [sql_text]
+    offsets[0] = 0
+    offsets.append(len(sql_text))
+    return [sql_text[start:end] for start, end in zip(offsets, offsets[1:])]
+
+
+def iter_procedure_jobs(sources: Iterable[Path], dialect: str | None = None) -> Iterator[Tuple[str, int, str, str]]:
+    for source in sources:
+        try:
+            sql_text = parse_module.read_file(source)
+        except (OSError, UnicodeDecodeError) as exc:
+            logger.error("Unable to read %s: %s", source, exc)
+            # A negative index marks an unreadable source; the text slot carries the error.
+            yield str(source), -1, f"{type(exc).__name__}: {exc}", ""
+            continue
+        # Resolved once per file so every procedure in it is split and parsed alike.
+        profile = lexer_module.resolve_dialect(sql_text, dialect or PROJECT_SETTINGS.get("sql_dialect", "auto"))
+        for index, procedure_text in enumerate(split_procedures(sql_text, profile)):
+            yield str(source), index, procedure_text, profile.name
+
+
+def iter_batch_results(
+    jobs: Iterable[Tuple[str, int, str, str]],
+    domain_mapping: Dict[str, List[str]],
+    max_workers: int | None = None,
+    type_catalog: Dict[str, Dict[str, str]] | None = None,
+) -> Iterator[Dict[str, Any]]:
+    workers = max_workers or PROJECT_SETTINGS.get("batch_workers") or os.cpu_count() or 1
+    type_catalog = type_catalog or {}
+    max_pending = workers * 4
+    job_iterator = iter(jobs)
+    pending: Dict[Future, Tuple[str, int, ProcessPoolExecutor]] = {}
+    executor = _start_pool(workers, domain_mapping, type_catalog)
+    try:
+        while True:
+            for source, index, procedure_text, dialect in job_iterator:
+                if index < 0:
+                    yield _failure_record(source, index, procedure_text, 0.0)
+                    continue
+                try:
+                    future = executor.submit(_parse_procedure_job, source, index, procedure_text, dialect)
+                except BrokenProcessPool:
+                    executor = _restart_pool(executor, workers, domain_mapping, type_catalog)
+                    future = executor.submit(_parse_procedure_job, source, index, procedure_text, dialect)
+                pending[future] = (source, index, executor)
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                source, index, pool = pending.pop(future)
+                try:
+                    yield future.result()
+                except BrokenProcessPool as exc:
+                    # A worker died (crash, OOM kill) and took the pool with it. Every job
+                    # that was in flight fails with it; the rest go to a fresh pool.
+                    logger.error("Worker pool broke while parsing %s#%d: %s", source, index, exc)
+                    yield _failure_record(source, index, f"{type(exc).__name__}: {exc}", 0.0)
+                    broken = broken or pool is executor
+                except Exception as exc:
+                    logger.error("Worker failed for %s#%d: %s", source, index, exc)
+                    yield _failure_record(source, index, f"{type(exc).__name__}: {exc}", 0.0)
+            if broken:
+                executor = _restart_pool(executor, workers, domain_mapping, type_catalog)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _start_pool(
+    workers: int,
+    domain_mapping: Dict[str, List[str]],
+    type_catalog: Dict[str, Dict[str, str]],
+) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(domain_mapping, type_catalog))
+
+
+def _restart_pool(
+    executor: ProcessPoolExecutor,
+    workers: int,
+    domain_mapping: Dict[str, List[str]],
+    type_catalog: Dict[str, Dict[str, str]],
+) -> ProcessPoolExecutor:
+    logger.warning("Replacing the broken batch worker pool")
+    executor.shutdown(wait=False, cancel_futures=True)
+    return _start_pool(workers, domain_mapping, type_catalog)
+
+
+def run_storeproc_batch(
+    target: str | Path,
+    mapping_path: Path,
+    output_path: Path,
+    max_workers: int | None = None,
+    catalog_path: Path | None = None,
+    dialect: str | None = None,
+) -> Dict[str, Any]:
+    domain_mapping = parse_module.load_domain_mapping(mapping_path)
+    type_catalog = parse_module.load_type_catalog(catalog_path or parse_module.default_catalog_path(mapping_path))
+    sources = discover_sql_sources(target)
+    logger.info("Batch parsing %d source files from %s", len(sources), target)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    succeeded = 0
+    failed = 0
+    cache_counts = {"hit": 0, "miss": 0}
+    with output_path.open("w", encoding="utf-8") as handle:
+        for record in iter_batch_results(iter_procedure_jobs(sources, dialect), domain_mapping, max_workers, type_catalog):
+            handle.write(json.dumps(_record_json(record)) + "\n")
+            handle.flush()
+            if record["status"] == "ok":
+                succeeded += 1
+                if record["cache"] in cache_counts:
+                    cache_counts[record["cache"]] += 1
+            else:
+                failed += 1
+    elapsed = time.perf_counter() - started
+    summary = {
+        "sources": len(sources),
+        "procedures": succeeded + failed,
+        "succeeded": succeeded,
+        "failed": failed,
+        "cache_hits": cache_counts["hit"],
+        "cache_misses": cache_counts["miss"],
+        "elapsed_seconds": round(elapsed, 3),
+        "output": str(output_path),
+    }
+    logger.info("Batch parse summary: %s", summary)
+    return summary
+
+
+def _init_worker(domain_mapping: Dict[str, List[str]], type_catalog: Dict[str, Dict[str, str]]) -> None:
+    global _worker_domain_mapping, _worker_type_catalog, _worker_cache
+    _worker_domain_mapping = domain_mapping
+    _worker_type_catalog = type_catalog
+    _worker_cache = parse_module.get_parse_cache()
+
+
+def _parse_procedure_job(source: str, index: int, procedure_text: str, dialect: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    hits_before = _worker_cache.hits if _worker_cache is not None else 0
+    try:
+        mapped = parse_module.parse_and_map(
+            procedure_text, _worker_domain_mapping, _worker_cache, dialect=dialect, type_catalog=_worker_type_catalog
+        )
+    except Exception as exc:
+        return _failure_record(source, index, f"{type(exc).__name__}: {exc}", time.perf_counter() - started)
+    finished = time.perf_counter()
+    # The source is dropped from the result, so the worker closes it here.
+    mapped.pop("source").close()
+    if _worker_cache is None:
+        cache_status = "disabled"
+    else:
+        cache_status = "hit" if _worker_cache.hits > hits_before else "miss"
+    return {
+        "source": source,
+        "index": index,
+        "procedure_name": mapped.get("procedure_name", "procedure"),
+        "status": "ok",
+        "cache": cache_status,
+        "elapsed_ms": round((finished - started) * 1000, 3),
+        # The slotted model pickles smaller than the nested dicts on the way back to the parent.
+        "result": model_module.Procedure.from_dict(
+            {key: value for key, value in mapped.items() if key not in EXCLUDED_RESULT_FIELDS}
+        ),
+    }
+
+
+def _record_json(record: Dict[str, Any]) -> Dict[str, Any]:
+    if "result" not in record:
+        return record
+    return {**record, "result": record["result"].to_dict(exclude=EXCLUDED_RESULT_FIELDS)}
+
+
+def _failure_record(source: str, index: int, error: str, elapsed: float) -> Dict[str, Any]:
+    return {
+        "source": source,
+        "index": index,
+        "procedure_name": None,
+        "status": "error",
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "error": error,
+    }
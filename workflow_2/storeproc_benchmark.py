@@ -0,0 +1,572 @@
+from __future__ import annotations
+
+import gc
+import json
+import logging
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from settings import PROJECT_SETTINGS
+from common.tools.tools import load_workflow_module
+
+logger = logging.getLogger(__name__)
+
+parse_module = load_workflow_module("workflow_2", "storeproc_parse_mapper")
+legacy_module = load_workflow_module("workflow_2", "storeproc_parse_legacy")
+source_module = load_workflow_module("workflow_2", "storeproc_source")
+agents_module = load_workflow_module("workflow_1", "agents")
+limits_module = load_workflow_module("workflow_1", "llm_limits")
+
+TABLE_NAMES = [
+    "customers",
+    "orders",
+    "order_items",
+    "products",
+    "inventory",
+    "suppliers",
+    "payments",
+    "shipments",
+    "invoices",
+    "audit_logs",
+]
+STATEMENT_KINDS = ("select", "insert", "update", "delete")
+LEGACY_STEP_TYPES = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE"})
+COLUMN_NAMES = [
+    "id",
+    "customer_id",
+    "order_id",
+    "product_id",
+    "supplier_id",
+    "status",
+    "amount",
+    "quantity",
+    "created_at",
+    "updated_at",
+    "description",
+    "region",
+]
+
+
+# Share of generated statements per kind; anything left over becomes a SET.
+DEFAULT_STATEMENT_MIX = {"select": 0.55, "insert": 0.15, "update": 0.15, "delete": 0.05}
+BENCHMARK_SHAPES: Dict[str, Dict[str, Any]] = {
+    "default": {},
+    "wide-joins": {"join_fanout": 8, "alias_density": 0.5},
+    "dml-heavy": {"statement_mix": {"select": 0.2, "insert": 0.3, "update": 0.3, "delete": 0.15}},
+    "nested": {"nesting": 4, "comment_ratio": 0.3},
+}
+# Each phase is the exclusive time of the parser function that implements it,
+# timed inside a real parse_and_map call; "other" is whatever parse_and_map
+# spends outside them.
+PHASE_FUNCTIONS = {
+    "tokenize": "tokenize",
+    "split_statements": "iter_statements",
+    "analyze_statements": "_analyze_statement",
+    "tables_and_aliases": "_collect_tables_and_aliases",
+    "crud_details": "_collect_crud_details",
+    "column_types": "_collect_column_types",
+    "procedure_flow": "_collect_procedure_flow",
+    "column_lineage": "_collect_column_lineage",
+    "map_domains": "map_domains",
+}
+ITERATOR_PHASES = frozenset({"split_statements"})
+_EXHAUSTED = object()
+PHASES = (*PHASE_FUNCTIONS, "other")
+# Each parser benchmark case runs for at least this long, so a case that parses in
+# a fraction of a second is not decided by a handful of noisy rounds.
+PARSER_BENCHMARK_MIN_SECONDS = 3.0
+# Phases this fast are dominated by timer noise and are not checked for regressions.
+REGRESSION_MIN_SECONDS = 0.01
+
+
+def generate_procedure(
+    statement_count: int,
+    seed: int = 7,
+    single_line: bool = False,
+    join_fanout: int = 4,
+    alias_density: float = 1.0,
+    comment_ratio: float = 1.0,
+    statement_mix: Dict[str, float] | None = None,
+    nesting: int = 0,
+) -> str:
+    rng = random.Random(seed)
+    thresholds = list(accumulate((statement_mix or DEFAULT_STATEMENT_MIX).get(kind, 0.0) for kind in STATEMENT_KINDS))
+    join_fanout = max(1, min(join_fanout, len(TABLE_NAMES)))
+    lines = [
+        "CREATE PROCEDURE dbo.BenchmarkProcedure(",
+        "   IN p_customer_id INT,",
+        "   IN p_start_date DATE",
+        ")",
+        "BEGIN",
+        "   DECLARE v_total DECIMAL(10,2) DEFAULT 0.00;",
+    ]
+    depth = 0
+    for index in range(statement_count):
+        if nesting:
+            if depth < nesting and rng.random() < 0.1:
+                lines.append(f"   IF v_total > {rng.randint(1, 500)}")
+                lines.append("   BEGIN")
+                depth += 1
+            elif depth and rng.random() < 0.1:
+                lines.append("   END")
+                depth -= 1
+        if comment_ratio >= 1 or rng.random() < comment_ratio:
+            lines.append(f"   -- Step {index}: {rng.choice(['load', 'refresh', 'reconcile', 'archive'])} data")
+        roll = rng.random()
+        if roll < thresholds[0]:
+            lines.extend(_select_statement(rng, join_fanout, alias_density))
+        elif roll < thresholds[1]:
+            lines.extend(_insert_statement(rng))
+        elif roll < thresholds[2]:
+            lines.extend(_update_statement(rng))
+        elif roll < thresholds[3]:
+            table = rng.choice(TABLE_NAMES)
+            lines.append(f"   DELETE FROM {table} WHERE {rng.choice(COLUMN_NAMES)} = p_customer_id;")
+        else:
+            lines.append("   -- running total")
+            lines.append(f"   SET v_total = v_total + {rng.randint(1, 500)};")
+    lines.extend("   END" for _ in range(depth))
+    lines.append("END")
+    if single_line:
+        return " ".join(line.strip() for line in lines if not line.strip().startswith("--"))
+    return "\n".join(lines)
+
+
+def _select_statement(rng: random.Random, join_fanout: int = 4, alias_density: float = 1.0) -> List[str]:
+    tables = rng.sample(TABLE_NAMES, rng.randint(1, join_fanout))
+    aliases = [
+        f"{table[:2]}{position}" if alias_density >= 1 or rng.random() < alias_density else ""
+        for position, table in enumerate(tables)
+    ]
+    names = [alias or table for table, alias in zip(tables, aliases)]
+    columns = [
+        f"{rng.choice(names)}.{rng.choice(COLUMN_NAMES)}" for _ in range(rng.randint(2, 8))
+    ]
+    if rng.random() < 0.3:
+        columns.append(f"COALESCE(SUM({names[0]}.amount), 0) AS total_amount")
+    lines = ["   SELECT"]
+    lines.extend(f"      {column}," for column in columns[:-1])
+    lines.append(f"      {columns[-1]}")
+    lines.append(f"   FROM {tables[0]} {aliases[0]}".rstrip())
+    for table, alias, name in zip(tables[1:], aliases[1:], names[1:]):
+        lines.append(f"      JOIN {f'{table} {alias}'.rstrip()} ON {name}.id = {names[0]}.{rng.choice(COLUMN_NAMES)}")
+    lines.append(f"   WHERE {names[0]}.customer_id = p_customer_id")
+    lines.append(f"     AND {names[0]}.created_at >= p_start_date")
+    if rng.random() < 0.4:
+        lines.append(f"   ORDER BY {names[0]}.created_at DESC")
+    lines[-1] += ";"
+    return lines
+
+
+def _insert_statement(rng: random.Random) -> List[str]:
+    table = rng.choice(TABLE_NAMES)
+    columns = rng.sample(COLUMN_NAMES, rng.randint(2, 6))
+    values = ", ".join("NOW()" if column.endswith("_at") else "p_customer_id" for column in columns)
+    return [
+        f"   INSERT INTO {table} ({', '.join(columns)})",
+        f"   VALUES ({values});",
+    ]
+
+
+def _update_statement(rng: random.Random) -> List[str]:
+    table = rng.choice(TABLE_NAMES)
+    columns = rng.sample(COLUMN_NAMES, rng.randint(1, 4))
+    assignments = ", ".join(f"{column} = 'value_{position}'" for position, column in enumerate(columns))
+    return [
+        f"   UPDATE {table}",
+        f"   SET {assignments}",
+        f"   WHERE {rng.choice(COLUMN_NAMES)} = p_customer_id;",
+    ]
+
+
+def _best_time(func: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _best_times(funcs: List[Callable[[], Any]], repeat: int, min_seconds: float = 0.0) -> List[float]:
+    # The runs are interleaved so a slow spell on the machine hits every function
+    # alike instead of skewing the ratio between them. Short cases get extra rounds
+    # until min_seconds have been spent on them.
+    best = [float("inf")] * len(funcs)
+    rounds = 0
+    deadline = time.perf_counter() + min_seconds
+    while rounds < repeat or time.perf_counter() < deadline:
+        for position, func in enumerate(funcs):
+            start = time.perf_counter()
+            func()
+            best[position] = min(best[position], time.perf_counter() - start)
+        rounds += 1
+    return best
+
+
+def run_parser_benchmark(
+    statement_counts: List[int] | None = None,
+    repeat: int = 5,
+    seed: int = 7,
+) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    for statement_count in statement_counts or [1000, 5000, 20000]:
+        for single_line in (False, True):
+            source = generate_procedure(statement_count, seed=seed, single_line=single_line)
+            identical = not legacy_differences(source)
+            legacy_seconds, current_seconds = _best_times(
+                [lambda: legacy_module.parse_store_procedure(source), lambda: parse_module.parse_store_procedure(source)],
+                repeat,
+                PARSER_BENCHMARK_MIN_SECONDS,
+            )
+            result = {
+                "statements": statement_count,
+                "layout": "single-line" if single_line else "multi-line",
+                "lines": source.count("\n") + 1,
+                "bytes": len(source.encode("utf-8")),
+                "legacy_seconds": round(legacy_seconds, 4),
+                "tokenized_seconds": round(current_seconds, 4),
+                "speedup": round(legacy_seconds / current_seconds, 2) if current_seconds else None,
+                "identical": identical,
+            }
+            logger.info("Parser benchmark: %s", result)
+            results.append(result)
+    return results
+
+
+def run_incremental_benchmark(
+    statement_count: int = 5000,
+    edits: int = 20,
+    seed: int = 7,
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    source = generate_procedure(statement_count, seed=seed)
+    parser = parse_module.IncrementalParser()
+    parser.parse(source)
+    full_seconds: List[float] = []
+    incremental_seconds: List[float] = []
+    identical = True
+    for _ in range(edits):
+        anchor = source.find(" = p_customer_id", rng.randrange(len(source)))
+        if anchor == -1:
+            anchor = source.find(" = p_customer_id")
+        source = f"{source[:anchor]} = {rng.randint(1, 9999)}{source[anchor + len(' = p_customer_id'):]}"
+        start = time.perf_counter()
+        incremental = parser.parse(source)
+        incremental_seconds.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        full = parse_module.parse_store_procedure(source, lineage=True)
+        full_seconds.append(time.perf_counter() - start)
+        identical = identical and incremental == full
+    full_median = statistics.median(full_seconds)
+    incremental_median = statistics.median(incremental_seconds)
+    result = {
+        "statements": statement_count,
+        "edits": edits,
+        "full_seconds": round(full_median, 4),
+        "incremental_seconds": round(incremental_median, 4),
+        "speedup": round(full_median / incremental_median, 2) if incremental_median else None,
+        "identical": identical,
+    }
+    logger.info("Incremental parse benchmark: %s", result)
+    return result
+
+
+def legacy_differences(source: str) -> List[str]:
+    # Names the top-level keys where the tokenized parser disagrees with the legacy one.
+    legacy = _comparable(legacy_module.parse_store_procedure(source))
+    current = _comparable(parse_module.parse_store_procedure(source))
+    return sorted(key for key in legacy.keys() | current.keys() if legacy.get(key) != current.get(key))
+
+
+def _comparable(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    comparable = dict(parsed)
+    comparable.pop("raw", None)
+    comparable.pop("flagged_statements", None)
+    comparable.pop("column_lineage", None)
+    source = comparable.pop("source", None)
+    if source is not None:
+        # The legacy parser reports a flat list of SQL statements; control-flow steps
+        # only contribute the statements nested inside them.
+        comparable["procedure_steps"] = [
+            {
+                "type": step["type"],
+                "base_table": step["base_table"],
+                "tables": step["tables"],
+                "description": source.describe_step(step),
+            }
+            for step in parse_module.iter_procedure_steps(parsed["procedure_steps"])
+            if step["type"] in LEGACY_STEP_TYPES
+        ]
+    comparable["table_fields"] = {table: sorted(fields) for table, fields in parsed["table_fields"].items()}
+    # The legacy parser types every column as a string, so only names are compared.
+    comparable["table_field_details"] = {
+        table: sorted(detail["name"] for detail in details) for table, details in parsed["table_field_details"].items()
+    }
+    return comparable
+
+
+def run_phase_benchmark(
+    statement_counts: List[int] | None = None,
+    shapes: Dict[str, Dict[str, Any]] | None = None,
+    repeat: int = 5,
+    seed: int = 7,
+    min_seconds: float = PARSER_BENCHMARK_MIN_SECONDS,
+) -> List[Dict[str, Any]]:
+    domain_mapping = _benchmark_domain_mapping()
+    calibration_source = _calibration_source()
+    results: List[Dict[str, Any]] = []
+    for shape_name, shape in (shapes or BENCHMARK_SHAPES).items():
+        for statement_count in statement_counts or [1000, 5000]:
+            source = generate_procedure(statement_count, seed=seed, **shape)
+            phases = dict.fromkeys(PHASES, float("inf"))
+            # The machine's speed drifts over a run, so every case is calibrated in
+            # the same rounds it is timed in.
+            calibration = float("inf")
+            parsed_statements = 0
+            rounds = 0
+            deadline = time.perf_counter() + min_seconds
+            while rounds < repeat or time.perf_counter() < deadline:
+                timings, parsed_statements = _time_phases(source, domain_mapping)
+                for phase, seconds in timings.items():
+                    phases[phase] = min(phases[phase], seconds)
+                start = time.perf_counter()
+                _calibration_workload(calibration_source)
+                calibration = min(calibration, time.perf_counter() - start)
+                rounds += 1
+            total = sum(phases.values())
+            megabytes = len(source.encode("utf-8")) / 1_000_000
+            result = {
+                "case": f"{shape_name}/{statement_count}",
+                "statements": parsed_statements,
+                "bytes": len(source.encode("utf-8")),
+                "phases": {phase: round(seconds, 5) for phase, seconds in phases.items()},
+                "total_seconds": round(total, 5),
+                "statements_per_second": round(parsed_statements / total) if total else None,
+                "mb_per_second": round(megabytes / total, 3) if total else None,
+                "peak_memory_mb": round(_peak_memory(source, domain_mapping) / 1_000_000, 3),
+                "calibration_seconds": round(calibration, 5),
+            }
+            logger.info("Phase benchmark: %s", result)
+            results.append(result)
+    return results
+
+
+def _time_phases(source: str, domain_mapping: Dict[str, List[str]]) -> Tuple[Dict[str, float], int]:
+    # The parser's phase functions are swapped for timed wrappers for the length of
+    # one uncached parse_and_map, so the pipeline that runs is the real one.
+    # Like timeit, collection is paused while timing: a full collection lands in
+    # whichever phase happens to allocate next and would be charged to it.
+    timer = _PhaseTimer()
+    originals = {name: getattr(parse_module, name) for name in PHASE_FUNCTIONS.values()}
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for phase, name in PHASE_FUNCTIONS.items():
+            wrap = timer.timed_iterator if phase in ITERATOR_PHASES else timer.timed
+            setattr(parse_module, name, wrap(phase, originals[name]))
+        timer.timed("other", parse_module.parse_and_map)(source, domain_mapping)
+    finally:
+        if gc_enabled:
+            gc.enable()
+        for name, func in originals.items():
+            setattr(parse_module, name, func)
+    return timer.seconds, timer.calls["analyze_statements"]
+
+
+class _PhaseTimer:
+    # Time spent in a phase called from inside another is charged to the inner
+    # phase only.
+    def __init__(self) -> None:
+        self.seconds: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.calls: Dict[str, int] = dict.fromkeys(PHASES, 0)
+        self._nested: List[float] = []
+
+    def timed(self, phase: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            self._nested.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.seconds[phase] += elapsed - self._nested.pop()
+                self.calls[phase] += 1
+                if self._nested:
+                    self._nested[-1] += elapsed
+
+        return wrapper
+
+    def timed_iterator(self, phase: str, func: Callable[..., Iterator[Any]]) -> Callable[..., Iterator[Any]]:
+        # A generator does its work as it is consumed, so each step is timed.
+        def wrapper(*args: Any, **kwargs: Any) -> Iterator[Any]:
+            iterator = func(*args, **kwargs)
+            step = self.timed(phase, next)
+            return iter(lambda: step(iterator, _EXHAUSTED), _EXHAUSTED)
+
+        return wrapper
+
+
+def _peak_memory(source: str, domain_mapping: Dict[str, List[str]]) -> int:
+    tracemalloc.start()
+    try:
+        parse_module.parse_and_map(source, domain_mapping)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_summary_token_benchmark(
+    statement_counts: List[int] | None = None,
+    max_tokens: int = 400,
+    seed: int = 7,
+) -> List[Dict[str, Any]]:
+    # Counts estimated prompt tokens only; no model is called. Chunk summaries are
+    # assumed to use their whole completion budget, so reduce figures are upper bounds.
+    client = agents_module.create_llm_client({"cache_enabled": False})
+    agent = agents_module.StoreProcOverviewAgent(agents_module.AgentContext(llm=client))
+    window = client.config.context_window_tokens
+    chunk_max_tokens = int(PROJECT_SETTINGS.get("summary_chunk_max_tokens", 300))
+    placeholder_summary = " ".join(["word"] * chunk_max_tokens)
+    results: List[Dict[str, Any]] = []
+    for statement_count in statement_counts or [1000, 10000]:
+        for single_line in (False, True):
+            source = generate_procedure(statement_count, seed=seed, single_line=single_line)
+            parsed = parse_module.parse_store_procedure(source)
+            procedure = {
+                "procedure_name": "BenchmarkProcedure",
+                "procedure_steps": parsed["procedure_steps"],
+                "source": source_module.SourceBuffer.from_text(source),
+            }
+            naive_tokens = limits_module.estimate_prompt_tokens(agents_module.procedure_messages(source))
+            chunks = agent.plan_chunks(procedure, max_tokens)
+            if len(chunks) == 1:
+                calls = [(agents_module.procedure_messages(chunks[0].text), max_tokens)]
+            else:
+                calls = [
+                    (agents_module.chunk_messages(chunk, "BenchmarkProcedure", len(chunks)), chunk_max_tokens)
+                    for chunk in chunks
+                ]
+                summaries = [placeholder_summary] * len(chunks)
+                # Mirrors StoreProcOverviewAgent.reduce_summaries, including grouped reduce rounds.
+                budget = agent.reduce_budget(len(summaries), "BenchmarkProcedure", max_tokens)
+                while len(summaries) > 1 and sum(map(limits_module.estimate_text_tokens, summaries)) > budget:
+                    groups = agents_module.group_by_tokens(summaries, budget)
+                    if len(groups) == len(summaries):
+                        break
+                    calls.extend(
+                        (agents_module.reduce_messages(group, "BenchmarkProcedure"), chunk_max_tokens) for group in groups
+                    )
+                    summaries = [placeholder_summary] * len(groups)
+                calls.append((agents_module.reduce_messages(summaries, "BenchmarkProcedure"), max_tokens))
+            call_tokens = [limits_module.estimate_prompt_tokens(messages) for messages, _ in calls]
+            result = {
+                "statements": statement_count,
+                "layout": "single-line" if single_line else "multi-line",
+                "lines": source.count("\n") + 1,
+                "naive_tokens": naive_tokens,
+                "naive_fits": naive_tokens + max_tokens <= window,
+                "chunks": len(chunks),
+                "chunked_tokens": sum(call_tokens),
+                "largest_call_tokens": max(tokens + completion for tokens, (_, completion) in zip(call_tokens, calls)),
+                "ratio": round(sum(call_tokens) / naive_tokens, 3) if naive_tokens else None,
+            }
+            result["fits"] = result["largest_call_tokens"] <= window
+            logger.info("Summary token benchmark: %s", result)
+            results.append(result)
+    client.close()
+    return results
+
+
+def calibration_seconds(repeat: int = 7) -> float:
+    source = _calibration_source()
+    return _best_time(lambda: _calibration_workload(source), repeat)
+
+
+def _calibration_source() -> str:
+    return generate_procedure(2000, seed=1)
+
+
+def _calibration_workload(source: str) -> None:
+    counts: Dict[str, int] = {}
+    for word in source.split():
+        counts[word.lower()] = counts.get(word.lower(), 0) + 1
+    sorted(counts.items())
+
+
+def _benchmark_domain_mapping() -> Dict[str, List[str]]:
+    return {
+        "customerManagement": ["customers", "audit_*"],
+        "orderManagement": ["orders", "order_*", "invoices", "shipments"],
+        "productCatalog": ["products", "inventory"],
+        "supplierManagement": ["suppliers"],
+        "paymentProcessing": ["payments"],
+    }
+
+
+def compare_with_baseline(
+    results: List[Dict[str, Any]],
+    baseline_path: Path | None = None,
+    tolerance: float | None = None,
+) -> List[str]:
+    path = _baseline_path(baseline_path)
+    allowed = 1 + (tolerance if tolerance is not None else PROJECT_SETTINGS.get("benchmark_regression_tolerance", 0.35))
+    if not path.exists():
+        raise RuntimeError(f"No benchmark baseline at {path}; record one with `python main-benchmark.py --record`.")
+    stored = json.loads(path.read_text(encoding="utf-8"))
+    baseline = {case["case"]: case for case in stored["cases"]}
+    # Timings are compared relative to a fixed CPU-bound workload so a slower or busier
+    # machine does not read as a parser regression.
+    speed = 1.0
+    if stored.get("calibration_seconds"):
+        speed = max(1.0, calibration_seconds() / stored["calibration_seconds"])
+    regressions: List[str] = []
+    for result in results:
+        expected = baseline.get(result["case"])
+        if expected is None:
+            continue
+        case_speed = speed
+        if result.get("calibration_seconds") and expected.get("calibration_seconds"):
+            case_speed = max(1.0, result["calibration_seconds"] / expected["calibration_seconds"])
+        for phase, seconds in result["phases"].items():
+            reference = expected["phases"].get(phase)
+            if reference is None or seconds < REGRESSION_MIN_SECONDS:
+                continue
+            if seconds > reference * case_speed * allowed:
+                regressions.append(
+                    f"{result['case']} {phase}: {seconds:.4f}s vs baseline {reference:.4f}s "
+                    f"(machine speed x{case_speed:.2f})"
+                )
+        if result["peak_memory_mb"] > expected["peak_memory_mb"] * allowed:
+            regressions.append(
+                f"{result['case']} peak memory: {result['peak_memory_mb']:.2f} MB "
+                f"vs baseline {expected['peak_memory_mb']:.2f} MB"
+            )
+    for regression in regressions:
+        logger.error("Benchmark regression: %s", regression)
+    return regressions
+
+
+def save_baseline(results: List[Dict[str, Any]], baseline_path: Path | None = None) -> Path:
+    path = _baseline_path(baseline_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "parser_version": parse_module.PARSER_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "calibration_seconds": round(calibration_seconds(), 5),
+        "cases": results,
+    }
+    path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    logger.info("Benchmark baseline written to %s", path)
+    return path
+
+
+def _baseline_path(baseline_path: Path | None) -> Path:
+    return Path(baseline_path or PROJECT_SETTINGS.get("benchmark_baseline_path", "common/benchmarks/storeproc_parser_baseline.json"))
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import marshal
+import zlib
+from pathlib import Path
+from typing import Any, Dict
+
+from common.tools.lru_directory import LRUDirectory
+
+logger = logging.getLogger(__name__)
+
+ENTRY_SUFFIX = ".bin"
+
+
+class ParseCache:
+    def __init__(self, directory: Path, max_bytes: int) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._store = LRUDirectory(self.directory, max_bytes, ENTRY_SUFFIX, "Parse cache")
+
+    def key(
+        self,
+        sql_text: str | bytes,
+        domain_mapping: Dict[str, Any],
+        parser_version: str,
+        type_catalog: Dict[str, Dict[str, str]] | None = None,
+    ) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{parser_version}\0{marshal.version}\0".encode("utf-8"))
+        digest.update(json.dumps(domain_mapping, sort_keys=True).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(json.dumps(type_catalog or {}, sort_keys=True).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(sql_text.encode("utf-8") if isinstance(sql_text, str) else sql_text)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Dict[str, Any] | None:
+        payload = self._store.read(key)
+        if payload is None:
+            self.misses += 1
+            return None
+        try:
+            value = marshal.loads(zlib.decompress(payload))
+        except (ValueError, EOFError, TypeError, zlib.error) as exc:
+            logger.warning("Discarding unreadable parse cache entry %s: %s", self._store.path(key).name, exc)
+            self._store.discard(key)
+            self.misses += 1
+            return None
+        self._store.touch(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        self._store.write(key, zlib.compress(marshal.dumps(value), 6))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self._store.writes,
+            "evictions": self._store.evictions,
+        }
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Tuple
+
+from common.tools.tools import load_workflow_module
+
+logger = logging.getLogger(__name__)
+
+limits_module = load_workflow_module("workflow_1", "llm_limits")
+estimate_text_tokens = limits_module.estimate_text_tokens
+
+# Lines that carry no logic for a summary.
+BOILERPLATE_LINE_PATTERN = re.compile(
+    r"(?:--.*|go|print\b.*|set\s+(?:nocount|ansi_nulls|ansi_warnings|quoted_identifier|xact_abort)\s+(?:on|off)\s*;?)",
+    re.IGNORECASE,
+)
+# The overlap is capped at this share of the chunk budget, since every chunk
+# repeats it.
+MAX_OVERLAP_SHARE = 0.1
+
+
+@dataclass(frozen=True)
+class ProcedureChunk:
+    index: int
+    text: str
+    context: str
+    span: Tuple[int, int]
+    tokens: int
+    context_tokens: int
+    segments: int
+
+
+def chunk_budget(
+    context_window: int,
+    prompt_tokens: int,
+    completion_tokens: int,
+    chunk_tokens: int | None = None,
+) -> int:
+    # The chunk and its overlap must fit beside the instructions and the reply.
+    available = context_window - prompt_tokens - completion_tokens
+    if available <= 0:
+        raise RuntimeError(
+            f"Context window of {context_window} tokens leaves no room for procedure text "
+            f"after {prompt_tokens} prompt and {completion_tokens} completion tokens"
+        )
+    return min(available, chunk_tokens) if chunk_tokens else available
+
+
+def compact_sql(text: str) -> str:
+    lines = (line.strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line and not BOILERPLATE_LINE_PATTERN.fullmatch(line))
+
+
+def chunk_procedure(
+    text: str,
+    steps: Iterable[Dict[str, Any]],
+    budget: int,
+    overlap_tokens: int = 0,
+    whole_budget: int | None = None,
+) -> List[ProcedureChunk]:
+    # Every step start, at any depth, is a place the text may be cut, so no
+    # statement is split unless it alone exceeds the budget. The whole text is
+    # covered, including statements the parser keeps out of the step tree. Text
+    # that fits whole_budget, usually the context window, is not split at all.
+    overlap_tokens = min(overlap_tokens, int(budget * MAX_OVERLAP_SHARE))
+    cuts = sorted({0, *(start for start in _step_starts(steps) if 0 < start < len(text))})
+    units: List[Tuple[Tuple[int, int], str, int]] = []
+    for start, end in zip(cuts, [*cuts[1:], len(text)]):
+        compacted = compact_sql(text[start:end])
+        if compacted:
+            units.extend(_split_unit((start, end), compacted, budget - overlap_tokens))
+    if units and whole_budget is not None and sum(tokens for _, _, tokens in units) <= whole_budget:
+        return [_make_chunk(0, units, [])]
+
+    chunks: List[ProcedureChunk] = []
+    current: List[Tuple[Tuple[int, int], str, int]] = []
+    current_tokens = 0
+    context: List[Tuple[Tuple[int, int], str, int]] = []
+    for unit in units:
+        context_tokens = sum(tokens for _, _, tokens in context)
+        if current and current_tokens + unit[2] + context_tokens > budget:
+            chunks.append(_make_chunk(len(chunks), current, context))
+            context = _overlap(current, overlap_tokens)
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += unit[2]
+    if current:
+        chunks.append(_make_chunk(len(chunks), current, context))
+    logger.debug(
+        "Packed %d segments into %d chunks of at most %d tokens",
+        sum(chunk.segments for chunk in chunks),
+        len(chunks),
+        budget,
+    )
+    return chunks
+
+
+def _step_starts(steps: Iterable[Dict[str, Any]]) -> Iterable[int]:
+    for step in steps:
+        if step.get("span") is not None:
+            yield step["span"][0]
+        yield from _step_starts(step.get("steps", ()))
+        yield from _step_starts(step.get("else_steps", ()))
+
+
+def _split_unit(
+    span: Tuple[int, int],
+    text: str,
+    budget: int,
+) -> List[Tuple[Tuple[int, int], str, int]]:
+    tokens = estimate_text_tokens(text)
+    if tokens <= budget:
+        return [(span, text, tokens)]
+    # A statement larger than the budget is cut at line breaks, or inside a line
+    # when the procedure is written on one line.
+    pieces: List[Tuple[Tuple[int, int], str, int]] = []
+    lines: List[str] = []
+    lines_tokens = 0
+    for line in text.splitlines():
+        line_tokens = estimate_text_tokens(line)
+        if lines and lines_tokens + line_tokens > budget:
+            pieces.append((span, "\n".join(lines), lines_tokens))
+            lines, lines_tokens = [], 0
+        if line_tokens > budget:
+            pieces.extend((span, part, estimate_text_tokens(part)) for part in _split_line(line, budget))
+            continue
+        lines.append(line)
+        lines_tokens += line_tokens
+    if lines:
+        pieces.append((span, "\n".join(lines), lines_tokens))
+    return pieces
+
+
+def _split_line(line: str, budget: int) -> List[str]:
+    parts: List[str] = []
+    words: List[str] = []
+    words_tokens = 0
+    for word in line.split(" "):
+        word_tokens = estimate_text_tokens(word) + 1
+        if words and words_tokens + word_tokens > budget:
+            parts.append(" ".join(words))
+            words, words_tokens = [], 0
+        words.append(word)
+        words_tokens += word_tokens
+    if words:
+        parts.append(" ".join(words))
+    return parts
+
+
+def _overlap(
+    units: List[Tuple[Tuple[int, int], str, int]],
+    overlap_tokens: int,
+) -> List[Tuple[Tuple[int, int], str, int]]:
+    # The trailing statements of one chunk are repeated as read-only context in
+    # the next, so logic that spans the cut is not summarised blind.
+    kept: List[Tuple[Tuple[int, int], str, int]] = []
+    total = 0
+    for unit in reversed(units):
+        if total + unit[2] > overlap_tokens:
+            break
+        kept.insert(0, unit)
+        total += unit[2]
+    return kept
+
+
+def _make_chunk(
+    index: int,
+    units: List[Tuple[Tuple[int, int], str, int]],
+    context: List[Tuple[Tuple[int, int], str, int]],
+) -> ProcedureChunk:
+    return ProcedureChunk(
+        index=index,
+        text="\n".join(text for _, text, _ in units),
+        context="\n".join(text for _, text, _ in context),
+        span=(units[0][0][0], units[-1][0][1]),
+        tokens=sum(tokens for _, _, tokens in units),
+        context_tokens=sum(tokens for _, _, tokens in context),
+        segments=len({span for span, _, _ in units}),
+    )
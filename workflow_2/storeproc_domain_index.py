@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import fnmatch
+import logging
+import re
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+WILDCARD_CHARACTERS = frozenset("*?[")
+
+
+class DomainIndex:
+    def __init__(self, domain_mapping: Dict[str, List[str]]) -> None:
+        self.domains = list(domain_mapping)
+        self.exact: Dict[str, List[int]] = {}
+        # Trailing-wildcard rules such as `sales_*` are bucketed by prefix length, so a
+        # table is checked with one hash lookup per distinct length instead of per rule.
+        self.prefixes: Dict[int, Dict[str, List[int]]] = {}
+        self.patterns: List[Tuple[re.Pattern[str], int]] = []
+        for ordinal, entries in enumerate(domain_mapping.values()):
+            for entry in entries:
+                self._add(_unqualified(entry), ordinal)
+        self.prefix_lengths = sorted(self.prefixes, reverse=True)
+
+    def _add(self, entry: str, ordinal: int) -> None:
+        if not WILDCARD_CHARACTERS.intersection(entry):
+            _append_once(self.exact.setdefault(entry, []), ordinal)
+            return
+        prefix = entry[:-1]
+        if entry.endswith("*") and not WILDCARD_CHARACTERS.intersection(prefix):
+            _append_once(self.prefixes.setdefault(len(prefix), {}).setdefault(prefix, []), ordinal)
+            return
+        self.patterns.append((re.compile(fnmatch.translate(entry)), ordinal))
+
+    def lookup(self, table: str) -> List[str]:
+        ordinals = self.exact.get(table, [])
+        if self.prefixes or self.patterns:
+            matched = set(ordinals)
+            for length in self.prefix_lengths:
+                if length <= len(table):
+                    matched.update(self.prefixes[length].get(table[:length], ()))
+            for pattern, ordinal in self.patterns:
+                if pattern.match(table):
+                    matched.add(ordinal)
+            ordinals = sorted(matched)
+        return [self.domains[ordinal] for ordinal in ordinals]
+
+    def resolve(self, tables: Iterable[str]) -> Tuple[Dict[str, List[str]], List[str]]:
+        table_domains: Dict[str, List[str]] = {}
+        unmapped: List[str] = []
+        for table in tables:
+            domains = self.lookup(table)
+            table_domains[table] = domains
+            if not domains:
+                unmapped.append(table)
+        return table_domains, unmapped
+
+
+def _unqualified(entry: str) -> str:
+    # Parsed table names are schema-less (see normalize_identifier), so a rule such
+    # as `dbo.fin_*` is matched on its table part.
+    cleaned = entry.replace("`", "").replace('"', "").strip()
+    return cleaned.rsplit(".", 1)[-1].lower()
+
+
+def _append_once(ordinals: List[int], ordinal: int) -> None:
+    if not ordinals or ordinals[-1] != ordinal:
+        ordinals.append(ordinal)
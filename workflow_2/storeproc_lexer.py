@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import re
+import string
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import accumulate, compress, count, product, repeat
+from operator import itemgetter
+from typing import Dict, FrozenSet, List, Tuple
+
+KEYWORD = "keyword"
+NAME = "name"
+VARIABLE = "variable"
+NUMBER = "number"
+STRING = "string"
+COMMENT = "comment"
+PUNCT = "punct"
+
+KEYWORDS = frozenset(
+    {
+        "as",
+        "begin",
+        "by",
+        "case",
+        "create",
+        "declare",
+        "delete",
+        "end",
+        "from",
+        "group",
+        "having",
+        "insert",
+        "into",
+        "join",
+        "order",
+        "procedure",
+        "select",
+        "set",
+        "update",
+        "where",
+    }
+)
+
+# Keywords that open a procedural block without BEGIN (IF ... THEN, WHILE ... DO,
+# LOOP, REPEAT) or switch its branch (ELSE). T-SQL only uses BEGIN/END.
+BLOCK_OPENERS = frozenset({"then", "do", "loop", "repeat", "else"})
+
+# Splitting on the token alternatives yields [space, token, space, token, ...,
+# space]. Every non-space character starts some alternative, so the pieces tile
+# the source and offsets fall out of the accumulated lengths without any
+# per-token Python work. Alternatives must not add capturing groups.
+TOKEN_PATTERN = re.compile(
+    r"(--[^\n]*|/\*.*?(?:\*/|\Z)"
+    r"|'[^']*(?:''[^']*)*'?"
+    r"|[A-Za-z0-9_.\[\]\"`$]+"
+    r"|[@#][A-Za-z0-9_@#$]*"
+    r"|\S)",
+    re.DOTALL,
+)
+TSQL_TOKEN_PATTERN = re.compile(
+    r"(--[^\n]*|/\*.*?(?:\*/|\Z)"
+    r"|[Nn]?'[^']*(?:''[^']*)*'?"
+    r"|(?:\[[^\]\n]*\]?|\"[^\"\n]*\"?|[A-Za-z0-9_.$#])+"
+    r"|@@?[A-Za-z0-9_@#$]*"
+    r"|\S)",
+    re.DOTALL,
+)
+PLSQL_TOKEN_PATTERN = re.compile(
+    r"(--[^\n]*|/\*.*?(?:\*/|\Z)"
+    r"|[Qq]'(?:\[.*?\]|\{.*?\}|\(.*?\)|<.*?>|!.*?!)'"
+    r"|'[^']*(?:''[^']*)*'?"
+    r"|(?:\"[^\"\n]*\"?|[A-Za-z0-9_.$#])+"
+    r"|:=|=>|\|\|"
+    r"|\S)",
+    re.DOTALL,
+)
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+COMMENT_PREFIXES = ("--", "/*")
+
+# "-" and "/" also start operators and a leading digit does not make a number, so
+# COMMENT and NUMBER kinds are provisional until the token itself is checked.
+_KIND_BY_FIRST_CHAR: Dict[str, str] = {
+    **{char: NAME for char in string.ascii_letters + "_[\"`$."},
+    **{char: NUMBER for char in string.digits},
+    "'": STRING,
+    "@": VARIABLE,
+    "#": VARIABLE,
+    "-": COMMENT,
+    "/": COMMENT,
+}
+_PROVISIONAL_KINDS = frozenset({COMMENT, NUMBER})
+
+
+@dataclass(frozen=True)
+class DialectProfile:
+    name: str
+    keywords: FrozenSet[str]
+    token_pattern: re.Pattern[str]
+    kind_by_first_char: Dict[str, str]
+    # Prefixed string literals (N'...', q'[...]') start with a letter, so they are
+    # re-kinded after the first-character lookup.
+    string_prefixes: Tuple[str, ...] = ()
+    # Words that end a statement when they open a line, e.g. the T-SQL batch separator GO.
+    batch_separators: FrozenSet[str] = frozenset()
+    block_openers: FrozenSet[str] = frozenset()
+    detect_pattern: re.Pattern[str] | None = None
+    select_into_creates_table: bool = False
+
+
+ANSI = DialectProfile("ansi", KEYWORDS | BLOCK_OPENERS, TOKEN_PATTERN, _KIND_BY_FIRST_CHAR, block_openers=BLOCK_OPENERS)
+TSQL = DialectProfile(
+    "tsql",
+    KEYWORDS | {"merge", "using"},
+    TSQL_TOKEN_PATTERN,
+    {**_KIND_BY_FIRST_CHAR, "#": NAME},
+    string_prefixes=("N'", "n'"),
+    batch_separators=frozenset({"go"}),
+    detect_pattern=re.compile(
+        r"\bcreate\s+proc\b|\bset\s+nocount\b|^\s*go\s*$|\[dbo\]|\bnvarchar\b|\bbegin\s+tran"
+        r"|\btop\s*\(?\d|\bisnull\s*\(|\bgetdate\s*\(|@\w+\s+(?:int|varchar|datetime|bit|decimal|money)\b",
+        re.IGNORECASE | re.MULTILINE,
+    ),
+    select_into_creates_table=True,
+)
+PLSQL = DialectProfile(
+    "plsql",
+    KEYWORDS | BLOCK_OPENERS | {"merge", "using"},
+    PLSQL_TOKEN_PATTERN,
+    {**_KIND_BY_FIRST_CHAR, "#": NAME},
+    string_prefixes=("q'", "Q'"),
+    block_openers=BLOCK_OPENERS,
+    detect_pattern=re.compile(
+        r"\bcreate\s+or\s+replace\b|\bpackage\s+body\b|:=|%(?:row)?type\b|\bvarchar2\b"
+        r"|\bdbms_\w+|\bnvl\s*\(|\bsysdate\b",
+        re.IGNORECASE,
+    ),
+)
+DIALECTS: Dict[str, DialectProfile] = {profile.name: profile for profile in (ANSI, TSQL, PLSQL)}
+DETECTION_SAMPLE_CHARS = 4096
+
+
+@dataclass(frozen=True)
+class TokenStream:
+    source: str
+    kinds: Tuple[str, ...]
+    values: Tuple[str, ...]
+    starts: Tuple[int, ...]
+    ends: Tuple[int, ...]
+    keyword_positions: List[int]
+    dialect: str = ANSI.name
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def positions(self, kind: str, value: str | None = None) -> List[int]:
+        if value is None:
+            return list(compress(count(), map(kind.__eq__, self.kinds)))
+        kinds = self.kinds
+        return [index for index in compress(count(), map(value.__eq__, self.values)) if kinds[index] == kind]
+
+
+def tokenize(
+    source: str,
+    keywords: FrozenSet[str] | None = None,
+    start: int = 0,
+    end: int | None = None,
+    dialect: DialectProfile = ANSI,
+) -> TokenStream:
+    keywords = dialect.keywords if keywords is None else keywords
+    pieces = dialect.token_pattern.split(source[start:end])
+    offsets = list(accumulate(map(len, pieces), initial=start))
+    starts = offsets[1:-1:2]
+    ends = offsets[2::2]
+    values = pieces[1::2]
+    kinds = list(map(dialect.kind_by_first_char.get, map(itemgetter(0), values), repeat(PUNCT)))
+
+    for index in compress(count(), map(_PROVISIONAL_KINDS.__contains__, kinds)):
+        if kinds[index] == COMMENT:
+            if not values[index].startswith(COMMENT_PREFIXES):
+                kinds[index] = PUNCT
+        elif not NUMBER_PATTERN.fullmatch(values[index]):
+            kinds[index] = NAME
+    if dialect.string_prefixes:
+        for index in compress(count(), map(str.startswith, values, repeat(dialect.string_prefixes))):
+            kinds[index] = STRING
+    if dialect.batch_separators:
+        for index in compress(count(), map(dialect.batch_separators.__contains__, map(str.lower, values))):
+            if starts_line(source, starts[index]):
+                kinds[index], values[index] = PUNCT, ";"
+    keyword_positions = list(compress(count(), map(_spellings(keywords).__contains__, values)))
+    for index in keyword_positions:
+        kinds[index] = KEYWORD
+        values[index] = values[index].lower()
+    # Tuples of strings and ints are untracked by the garbage collector, so a large
+    # stream is not rescanned by every full collection during the parse.
+    return TokenStream(source, tuple(kinds), tuple(values), tuple(starts), tuple(ends), keyword_positions, dialect.name)
+
+
+@lru_cache(maxsize=16)
+def _spellings(keywords: FrozenSet[str]) -> FrozenSet[str]:
+    # Every upper/lower-case spelling of every keyword, so keywords are found
+    # without lower-casing each token first.
+    return frozenset("".join(chars) for keyword in keywords for chars in product(*map(_cases, keyword)))
+
+
+def _cases(char: str) -> Tuple[str, ...]:
+    return tuple({char.lower(), char.upper()})
+
+
+def resolve_dialect(source: str, name: str | None = None) -> DialectProfile:
+    if name and name != "auto":
+        profile = DIALECTS.get(name.lower())
+        if profile is None:
+            raise RuntimeError(f"Unknown SQL dialect '{name}'. Expected one of: auto, {', '.join(DIALECTS)}")
+        return profile
+    return detect_dialect(source)
+
+
+def detect_dialect(source: str) -> DialectProfile:
+    header = source[:DETECTION_SAMPLE_CHARS]
+    best, best_score = ANSI, 0
+    for profile in DIALECTS.values():
+        if profile.detect_pattern is None:
+            continue
+        score = len(profile.detect_pattern.findall(header))
+        if score > best_score:
+            best, best_score = profile, score
+    return best
+
+
+def starts_line(source: str, offset: int) -> bool:
+    line_start = source.rfind("\n", 0, offset) + 1
+    return not source[line_start:offset].strip()
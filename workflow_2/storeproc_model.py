@@ -0,0 +1,379 @@
+from __future__ import annotations
+
+import logging
+import sys
+from typing import Any, Dict, Iterable, List, Tuple
+
+from common.tools.tools import load_workflow_module
+
+logger = logging.getLogger(__name__)
+
+lineage_module = load_workflow_module("workflow_2", "storeproc_lineage")
+ColumnLineage = lineage_module.ColumnLineage
+
+READ = 1
+CREATE = 2
+UPDATE = 4
+DELETE = 8
+# Column operations in the order the parser has always reported them; DELETE is a
+# table-level flag rendered as the `*` column.
+OPERATIONS: Tuple[Tuple[str, int], ...] = (("read", READ), ("create", CREATE), ("update", UPDATE), ("delete", DELETE))
+OPERATION_NAMES = tuple(sorted(name for name, _ in OPERATIONS))
+ALL_COLUMNS = "*"
+DEFAULT_COLUMN_TYPE = "string"
+UNTYPED_COLUMN = (DEFAULT_COLUMN_TYPE, 0.0)
+NO_TABLE = -1
+STEP_FIELDS = frozenset({"type", "base_table", "tables", "description", "span", "statement_prefix", "steps", "else_steps"})
+
+intern = sys.intern
+
+
+class Column:
+    __slots__ = ("id", "table_id", "name", "type", "confidence", "operations")
+
+    def __init__(
+        self, column_id: int, table_id: int, name: str, column_type: str, operations: int, confidence: float = 0.0
+    ) -> None:
+        self.id = column_id
+        self.table_id = table_id
+        self.name = name
+        self.type = column_type
+        self.confidence = confidence
+        self.operations = operations
+
+    def __repr__(self) -> str:
+        return f"Column(id={self.id}, table_id={self.table_id}, name={self.name!r})"
+
+
+class Table:
+    __slots__ = ("id", "name", "columns", "operations", "dependencies", "domains", "listed")
+
+    def __init__(self, table_id: int, name: str) -> None:
+        self.id = table_id
+        self.name = name
+        self.columns: List[Column] = []
+        self.operations = 0
+        self.dependencies: List[int] = []
+        self.domains: Tuple[str, ...] = ()
+        self.listed = False
+
+    def field_names(self) -> List[str]:
+        return [column.name for column in self.columns]
+
+    def field_details(self) -> List[Dict[str, Any]]:
+        return [
+            {"name": column.name, "type": column.type, "confidence": column.confidence} for column in self.columns
+        ]
+
+    def operation_names(self) -> List[str]:
+        return [name for name in OPERATION_NAMES if self.operations & _OPERATION_BITS[name]]
+
+    def operation_columns(self) -> Dict[str, List[str]]:
+        columns: Dict[str, List[str]] = {}
+        for name, bit in OPERATIONS:
+            if not self.operations & bit:
+                continue
+            if bit == DELETE:
+                columns[name] = [ALL_COLUMNS]
+            else:
+                columns[name] = [column.name for column in self.columns if column.operations & bit]
+        return columns
+
+    def __repr__(self) -> str:
+        return f"Table(id={self.id}, name={self.name!r}, columns={len(self.columns)})"
+
+
+class Statement:
+    __slots__ = (
+        "id",
+        "type",
+        "base_table",
+        "tables",
+        "description",
+        "span",
+        "statement_prefix",
+        "steps",
+        "else_steps",
+        "details",
+    )
+
+    def __init__(
+        self,
+        statement_id: int,
+        statement_type: str,
+        base_table: int,
+        tables: Tuple[int, ...],
+        description: Tuple[str, ...],
+        span: Tuple[int, int] | None,
+        statement_prefix: str | None,
+    ) -> None:
+        self.id = statement_id
+        self.type = statement_type
+        self.base_table = base_table
+        self.tables = tables
+        self.description = description
+        self.span = span
+        self.statement_prefix = statement_prefix
+        # Control-flow steps (IF, loops) nest their bodies; details holds their
+        # condition, cursor and batching flags.
+        self.steps: Tuple[Statement, ...] | None = None
+        self.else_steps: Tuple[Statement, ...] | None = None
+        self.details: Dict[str, Any] | None = None
+
+    def __repr__(self) -> str:
+        return f"Statement(id={self.id}, type={self.type!r}, span={self.span})"
+
+
+class Procedure:
+    __slots__ = (
+        "name",
+        "tables",
+        "columns",
+        "statements",
+        "table_ids",
+        "alias_map",
+        "select_flows",
+        "domains",
+        "unmapped_tables",
+        "source",
+        "flagged_statements",
+        "column_lineage",
+        "overview_path",
+    )
+
+    def __init__(self, name: str) -> None:
+        self.name = intern(name)
+        self.tables: List[Table] = []
+        self.columns: List[Column] = []
+        self.statements: List[Statement] = []
+        self.table_ids: Dict[str, int] = {}
+        self.alias_map: Dict[str, int] = {}
+        self.select_flows: List[Tuple[int, ...]] = []
+        self.domains: Dict[str, List[str]] = {}
+        self.unmapped_tables: List[int] = []
+        self.source: Any = None
+        self.flagged_statements: List[Dict[str, Any]] = []
+        self.column_lineage = ColumnLineage()
+        self.overview_path: Any = None
+
+    def close(self) -> None:
+        # Releases a memory-mapped source; spans can no longer be rendered afterwards.
+        if self.source is not None:
+            self.source.close()
+
+    def table_id(self, name: str) -> int:
+        table_id = self.table_ids.get(name)
+        if table_id is None:
+            name = intern(name)
+            table_id = self.table_ids[name] = len(self.tables)
+            self.tables.append(Table(table_id, name))
+        return table_id
+
+    def table(self, name: str) -> Table | None:
+        table_id = self.table_ids.get(name)
+        return self.tables[table_id] if table_id is not None else None
+
+    def add_column(
+        self, table_id: int, name: str, column_type: str, operations: int, confidence: float = 0.0
+    ) -> Column:
+        column = Column(len(self.columns), table_id, intern(name), intern(column_type), operations, confidence)
+        self.columns.append(column)
+        self.tables[table_id].columns.append(column)
+        return column
+
+    def listed_tables(self) -> List[str]:
+        return sorted(table.name for table in self.tables if table.listed)
+
+    def fields(self, table: str) -> List[str]:
+        found = self.table(table)
+        return found.field_names() if found is not None else []
+
+    def field_details(self, table: str) -> List[Dict[str, Any]]:
+        found = self.table(table)
+        return found.field_details() if found is not None else []
+
+    def operations(self, table: str) -> List[str]:
+        found = self.table(table)
+        return found.operation_names() if found is not None else []
+
+    def operation_columns(self, table: str) -> Dict[str, List[str]]:
+        found = self.table(table)
+        return found.operation_columns() if found is not None else {}
+
+    def dependencies(self, table: str) -> List[str]:
+        found = self.table(table)
+        return [self.tables[table_id].name for table_id in found.dependencies] if found is not None else []
+
+    def get(self, key: str, default: Any = None) -> Any:
+        # Compatibility view for consumers written against the parse-result dict.
+        render = _VIEW_FIELDS.get(key)
+        if render is None:
+            return default
+        value = render(self)
+        return default if value is None else value
+
+    def __getitem__(self, key: str) -> Any:
+        render = _VIEW_FIELDS.get(key)
+        if render is None:
+            raise KeyError(key)
+        return render(self)
+
+    def __contains__(self, key: object) -> bool:
+        return key in _VIEW_FIELDS and (key != "overview_path" or self.overview_path is not None)
+
+    def to_dict(self, exclude: Iterable[str] = ()) -> Dict[str, Any]:
+        excluded = frozenset(exclude)
+        return {key: self[key] for key in _VIEW_FIELDS if key not in excluded and key in self}
+
+    @classmethod
+    def from_dict(cls, mapped: Dict[str, Any]) -> "Procedure":
+        procedure = cls(mapped.get("procedure_name", "procedure"))
+        table_id = procedure.table_id
+        for name in mapped.get("tables", []):
+            procedure.tables[table_id(name)].listed = True
+        field_types = {
+            table: {
+                detail["name"]: (detail.get("type", DEFAULT_COLUMN_TYPE), detail.get("confidence", 0.0))
+                for detail in details
+            }
+            for table, details in mapped.get("table_field_details", {}).items()
+        }
+        operation_columns = mapped.get("table_operation_columns", {})
+        for table_name in set(mapped.get("table_fields", {})).union(operation_columns):
+            table = procedure.tables[table_id(table_name)]
+            bits_by_column: Dict[str, int] = {}
+            for name, bit in OPERATIONS:
+                columns = operation_columns.get(table_name, {}).get(name)
+                if not columns:
+                    continue
+                table.operations |= bit
+                if bit == DELETE:
+                    continue
+                for column in columns:
+                    bits_by_column[column] = bits_by_column.get(column, 0) | bit
+            for column in mapped.get("table_fields", {}).get(table_name, []):
+                bits_by_column.setdefault(column, 0)
+            types = field_types.get(table_name, {})
+            for column in sorted(bits_by_column):
+                column_type, confidence = types.get(column, UNTYPED_COLUMN)
+                procedure.add_column(table.id, column, column_type, bits_by_column[column], confidence)
+        for table_name, dependencies in mapped.get("table_dependencies", {}).items():
+            procedure.tables[table_id(table_name)].dependencies = [table_id(name) for name in dependencies]
+        for table_name, domains in mapped.get("table_domains", {}).items():
+            procedure.tables[table_id(table_name)].domains = tuple(intern(domain) for domain in domains)
+        procedure.alias_map = {intern(alias): table_id(table) for alias, table in mapped.get("alias_map", {}).items()}
+        # Flows and step table lists repeat heavily across a procedure, so equal tuples
+        # are shared rather than rebuilt per statement.
+        shared: Dict[Tuple[Any, ...], Tuple[Any, ...]] = {}
+        procedure.select_flows = [
+            shared.setdefault(flow, flow)
+            for flow in (tuple(table_id(name) for name in names) for names in mapped.get("select_flows", []))
+        ]
+        procedure.statements = _build_statements(procedure, mapped.get("procedure_steps", []), shared, [0])
+        procedure.domains = mapped.get("domains", {})
+        procedure.unmapped_tables = [table_id(name) for name in mapped.get("unmapped_tables", [])]
+        procedure.source = mapped.get("source")
+        procedure.flagged_statements = mapped.get("flagged_statements", [])
+        procedure.column_lineage = ColumnLineage.from_dict(mapped.get("column_lineage", {}))
+        procedure.overview_path = mapped.get("overview_path")
+        return procedure
+
+    def __repr__(self) -> str:
+        return (
+            f"Procedure(name={self.name!r}, tables={len(self.tables)}, columns={len(self.columns)}, "
+            f"statements={len(self.statements)})"
+        )
+
+
+def as_procedure(value: Procedure | Dict[str, Any]) -> Procedure:
+    return value if isinstance(value, Procedure) else Procedure.from_dict(value)
+
+
+def _build_statements(
+    procedure: Procedure,
+    steps: Iterable[Dict[str, Any]],
+    shared: Dict[Tuple[Any, ...], Tuple[Any, ...]],
+    counter: List[int],
+) -> List[Statement]:
+    table_id = procedure.table_id
+    statements = []
+    for step in steps:
+        tables = tuple(table_id(name) for name in step.get("tables", []))
+        description = tuple(intern(line) for line in step.get("description", []))
+        prefix = step.get("statement_prefix")
+        statement = Statement(
+            counter[0],
+            intern(step["type"]),
+            table_id(step["base_table"]) if step["base_table"] else NO_TABLE,
+            shared.setdefault(tables, tables),
+            shared.setdefault(description, description),
+            tuple(step["span"]) if step.get("span") is not None else None,
+            intern(prefix) if prefix is not None else None,
+        )
+        counter[0] += 1
+        if "steps" in step:
+            statement.steps = tuple(_build_statements(procedure, step["steps"], shared, counter))
+        if "else_steps" in step:
+            statement.else_steps = tuple(_build_statements(procedure, step["else_steps"], shared, counter))
+        details = {key: value for key, value in step.items() if key not in STEP_FIELDS}
+        if details:
+            statement.details = details
+        statements.append(statement)
+    return statements
+
+
+def _render_steps(procedure: Procedure, statements: Iterable[Statement] | None = None) -> List[Dict[str, Any]]:
+    tables = procedure.tables
+    steps = []
+    for statement in procedure.statements if statements is None else statements:
+        step = {
+            "type": statement.type,
+            "base_table": tables[statement.base_table].name if statement.base_table != NO_TABLE else "",
+            "tables": [tables[table_id].name for table_id in statement.tables],
+            "description": list(statement.description),
+            "span": statement.span,
+        }
+        if statement.statement_prefix is not None:
+            step["statement_prefix"] = statement.statement_prefix
+        if statement.details is not None:
+            step.update(statement.details)
+        if statement.steps is not None:
+            step["steps"] = _render_steps(procedure, statement.steps)
+        if statement.else_steps is not None:
+            step["else_steps"] = _render_steps(procedure, statement.else_steps)
+        steps.append(step)
+    return steps
+
+
+def _listed(procedure: Procedure) -> List[Table]:
+    return [table for table in procedure.tables if table.listed]
+
+
+_OPERATION_BITS = dict(OPERATIONS)
+_VIEW_FIELDS = {
+    "tables": Procedure.listed_tables,
+    "domains": lambda procedure: procedure.domains,
+    "table_domains": lambda procedure: {table.name: list(table.domains) for table in _listed(procedure)},
+    "unmapped_tables": lambda procedure: [procedure.tables[table_id].name for table_id in procedure.unmapped_tables],
+    "source": lambda procedure: procedure.source,
+    "alias_map": lambda procedure: {alias: procedure.tables[table_id].name for alias, table_id in procedure.alias_map.items()},
+    "table_fields": lambda procedure: {table.name: table.field_names() for table in _listed(procedure)},
+    "table_field_details": lambda procedure: {table.name: table.field_details() for table in _listed(procedure)},
+    "procedure_name": lambda procedure: procedure.name,
+    "table_operations": lambda procedure: {
+        table.name: table.operation_names() for table in procedure.tables if table.operations
+    },
+    "table_operation_columns": lambda procedure: {
+        table.name: table.operation_columns() for table in procedure.tables if table.operations
+    },
+    "table_dependencies": lambda procedure: {
+        table.name: [procedure.tables[table_id].name for table_id in table.dependencies]
+        for table in procedure.tables
+        if table.dependencies
+    },
+    "select_flows": lambda procedure: [[procedure.tables[table_id].name for table_id in flow] for flow in procedure.select_flows],
+    "procedure_steps": _render_steps,
+    "flagged_statements": lambda procedure: procedure.flagged_statements,
+    "column_lineage": lambda procedure: procedure.column_lineage.to_dict(),
+    "overview_path": lambda procedure: procedure.overview_path,
+}
@@ -1,42 +1,126 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import marshal
 import re
 import logging
+import time
+import zlib
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
+from functools import lru_cache
+from heapq import merge
+from itertools import chain, compress, count
 from pathlib import Path
-from typing import Any, Dict, List, Set, Tuple
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Set, TextIO, Tuple
 
 from settings import PROJECT_SETTINGS
 from common.tools.tools import load_workflow_module
 
 logger = logging.getLogger(__name__)
 
-TABLE_PATTERN = re.compile(r"\bfrom\s+([a-zA-Z0-9_.\[\]\"`]+)(?:\s+(?:as\s+)?([a-zA-Z0-9_]+))?", re.IGNORECASE)
-JOIN_PATTERN = re.compile(r"\bjoin\s+([a-zA-Z0-9_.\[\]\"`]+)(?:\s+(?:as\s+)?([a-zA-Z0-9_]+))?", re.IGNORECASE)
-SELECT_PATTERN = re.compile(r"select\s+(.*?)\s+from", re.IGNORECASE | re.DOTALL)
-SELECT_BLOCK_PATTERN = re.compile(
-    r"select\s+(?P<columns>.*?)\s+from\s+(?P<base>[a-zA-Z0-9_.\[\]\"`]+)"
-    r"(?:\s+(?:as\s+)?(?P<alias>[a-zA-Z0-9_]+))?(?P<rest>.*?)(?=;|\bselect\b|\binsert\b|\bupdate\b|\bdelete\b|\bend\b|$)",
-    re.IGNORECASE | re.DOTALL,
-)
-PROCEDURE_PATTERN = re.compile(r"create\s+procedure\s+([a-zA-Z0-9_\.]+)", re.IGNORECASE)
-INSERT_PATTERN = re.compile(
-    r"insert\s+into\s+([a-zA-Z0-9_.\[\]\"`]+)\s*\(([^)]+)\)",
-    re.IGNORECASE | re.DOTALL,
-)
-UPDATE_PATTERN = re.compile(
-    r"update\s+([a-zA-Z0-9_.\[\]\"`]+)\s+set\s+(.+?)(?:\bwhere\b|;|$)",
-    re.IGNORECASE | re.DOTALL,
+lexer_module = load_workflow_module("workflow_2", "storeproc_lexer")
+tokenize = lexer_module.tokenize
+TokenStream = lexer_module.TokenStream
+KEYWORD = lexer_module.KEYWORD
+NAME = lexer_module.NAME
+NUMBER = lexer_module.NUMBER
+COMMENT = lexer_module.COMMENT
+PUNCT = lexer_module.PUNCT
+VARIABLE = lexer_module.VARIABLE
+STRING = lexer_module.STRING
+starts_line = lexer_module.starts_line
+DialectProfile = lexer_module.DialectProfile
+DIALECTS = lexer_module.DIALECTS
+resolve_dialect = lexer_module.resolve_dialect
+
+cache_module = load_workflow_module("workflow_2", "storeproc_cache")
+ParseCache = cache_module.ParseCache
+
+domain_index_module = load_workflow_module("workflow_2", "storeproc_domain_index")
+DomainIndex = domain_index_module.DomainIndex
+
+lineage_module = load_workflow_module("workflow_2", "storeproc_lineage")
+ColumnLineage = lineage_module.ColumnLineage
+DERIVES_FROM = lineage_module.DERIVES_FROM
+JOINS_ON = lineage_module.JOINS_ON
+
+source_module = load_workflow_module("workflow_2", "storeproc_source")
+SourceBuffer = source_module.SourceBuffer
+_clean_statement_text = source_module.clean_statement_text
+
+model_module = load_workflow_module("workflow_2", "storeproc_model")
+Procedure = model_module.Procedure
+
+types_module = load_workflow_module("workflow_2", "storeproc_types")
+type_category = types_module.type_category
+literal_category = types_module.literal_category
+SQL_TYPE_CATEGORIES = types_module.SQL_TYPE_CATEGORIES
+load_type_catalog = types_module.load_type_catalog
+apply_type_catalog = types_module.apply_type_catalog
+
+# Bump whenever parse_store_procedure or map_domains output changes so cached results are not reused.
+PARSER_VERSION = "13"
+
+COLUMN_REFERENCE_PATTERN = re.compile(r"([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)")
+CAST_PATTERN = re.compile(r"cast\s*\(\s*([A-Za-z_][A-Za-z0-9_.]*)\s+as\s+([A-Za-z_][A-Za-z0-9_]*(?:\s*\([^)]*\))?)", re.IGNORECASE)
+VALUES_PATTERN = re.compile(r"\bvalues\s*\(", re.IGNORECASE)
+PARENTHESIS_PATTERN = re.compile(r"[()]")
+VARIABLE_OPERAND_PATTERN = re.compile(r"[@:]?[A-Za-z_][A-Za-z0-9_$#@]*")
+CONVERT_PATTERN = re.compile(
+    r"convert\s*\(\s*([A-Za-z_][A-Za-z0-9_]*(?:\s*\([^)]*\))?)\s*,\s*([A-Za-z_][A-Za-z0-9_.]*)\s*[,)]", re.IGNORECASE
 )
-DELETE_PATTERN = re.compile(
-    r"delete\s+from\s+([a-zA-Z0-9_.\[\]\"`]+)",
-    re.IGNORECASE,
+# Function name -> (pattern matched at the name, SQL type group, operand group).
+TYPE_FUNCTION_PATTERNS: Dict[str, Tuple[re.Pattern[str], int, int]] = {
+    "cast": (CAST_PATTERN, 2, 1),
+    "convert": (CONVERT_PATTERN, 1, 2),
+}
+PROCEDURE_NAME_PATTERN = re.compile(r"[a-zA-Z0-9_.]+")
+ALIAS_PATTERN = re.compile(r"[a-zA-Z0-9_]+")
+OUTPUT_NAME_PATTERN = re.compile(r"\s+(?:as|into)\s+([a-zA-Z0-9_@#$\[\]\"`]+)\s*$", re.IGNORECASE)
+BARE_COLUMN_PATTERN = re.compile(r"[a-zA-Z_][a-zA-Z0-9_]*")
+JOIN_CONDITION_PATTERN = re.compile(r"([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)\s*=\s*([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)")
+NON_COLUMN_WORDS = frozenset(
+    {"null", "true", "false", "default", "current_timestamp", "current_date", "sysdate", "systimestamp"}
 )
+# Variables are table references too: T-SQL @table variables and, outside the T-SQL
+# profile, #temp tables.
+TABLE_REFERENCE_KINDS = frozenset({KEYWORD, NAME, VARIABLE})
+FLOW_BOUNDARY_KEYWORDS = frozenset({"select", "insert", "update", "delete", "end"})
+# Table variables and temporary tables live only as long as the procedure.
+LOCAL_TABLE_PREFIXES = ("@", "#")
+NO_CTES: FrozenSet[str] = frozenset()
+FILTER_TERMINATORS = {"order": "by", "group": "by"}
+BLOCK_KEYWORDS = frozenset({"begin", "end", "case"})
+BLOCK_WORDS = frozenset({"try", "catch"})
+TRANSACTION_WORDS = frozenset({"tran", "transaction", "distributed"})
+CONTROL_FLOW_WORDS = frozenset({"if", "loop", "while", "repeat", "case"})
+BLOCK_CLOSE_WORDS = frozenset({"if", "loop", "while", "repeat"})
+LABELLED_CLOSE_WORDS = frozenset({"loop", "while", "repeat"})
+ELSE_IF_WORDS = frozenset({"elseif", "elsif"})
+CONTROL_STATEMENT_TYPES = frozenset({"if", "elseif", "elsif", "else", "while", "loop", "repeat", "for", "declare", "cursor", "fetch", "create"})
+TEMPORARY_WORDS = frozenset({"temporary", "temp"})
+TABLE_CONSTRAINT_WORDS = frozenset({"primary", "constraint", "unique", "foreign", "check", "index", "key"})
+LOOP_STEP_TYPES = frozenset({"WHILE", "LOOP", "REPEAT", "FOR"})
+BLOCK_STEP_TYPES = LOOP_STEP_TYPES | {"IF"}
+BATCHABLE_STEP_TYPES = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE", "MERGE"})
+COMPARE_BLOCK = 4096
+SELECT_STATEMENT_TYPES = frozenset({"select", "with"})
+DEADLINE_CHECK_INTERVAL = 4096
+PROCEDURE_WORDS = frozenset({"procedure", "proc", "package"})
+PARAMETER_MODE_WORDS = frozenset({"in", "out", "inout", "nocopy", "as"})
+UNTYPED_COLUMN = (types_module.STRING, 0.0)
+# Comparison operators tokenize one character at a time (<>, !=, <=, >=).
+COMPARISON_CHARS = frozenset("=<>!")
+OPERAND_KINDS = frozenset({NAME, VARIABLE, NUMBER, STRING, KEYWORD})
 
 agents_module = load_workflow_module("workflow_1", "agents")
 bootstrap_agents = agents_module.bootstrap_agents
 
+_parse_cache: ParseCache | None = None
+_domain_index: Tuple[Dict[str, List[str]], DomainIndex] | None = None
+
 
 def read_file(path: Path) -> str:
     logger.debug("Reading file: %s", path)
@@ -51,24 +135,275 @@ def load_domain_mapping(path: Path) -> Dict[str, List[str]]:
     return normalized
 
 
-def parse_store_procedure(source: str) -> Dict[str, Any]:
-    tables: Set[str] = set()
-    alias_map: Dict[str, str] = {}
-    for matcher in (TABLE_PATTERN, JOIN_PATTERN):
-        extracted_tables, extracted_aliases = _extract_tables_and_aliases(matcher, source)
-        tables.update(extracted_tables)
-        alias_map.update(extracted_aliases)
-    crud_details = _extract_crud_details(source, tables, alias_map)
+def read_source(path: Path) -> SourceBuffer:
+    logger.debug("Reading source: %s", path)
+    threshold = int(PROJECT_SETTINGS.get("source_mmap_threshold_bytes", 16 * 1024 * 1024))
+    return SourceBuffer.from_path(path, threshold)
+
+
+def parse_store_procedure(source: str, dialect: str | None = None, lineage: bool = False) -> Dict[str, Any]:
+    # Column lineage costs an expression parse per select item and assignment, and
+    # column types a look at every comparison, so both are only built when asked
+    # for. Without lineage there is no column_lineage and every column is untyped.
+    stream = tokenize(source, dialect=_dialect_profile(source, dialect))
+    chunks = (
+        (
+            statement["comments"],
+            _analyze_statement(stream, statement, lineage),
+            (statement["start"], statement["end"]),
+            statement["block_step"],
+        )
+        for statement in iter_statements(stream)
+    )
+    return _assemble_parse_result(source, chunks, lineage)
+
+
+def _dialect_profile(source: str, dialect: str | None) -> DialectProfile:
+    profile = resolve_dialect(source, dialect or PROJECT_SETTINGS.get("sql_dialect", "auto"))
+    logger.debug("Parsing with the %s dialect profile", profile.name)
+    return profile
+
+
+class StatementScanTimeout(RuntimeError):
+    pass
+
+
+class Nesting(NamedTuple):
+    depths: List[int]
+    subqueries: List[Tuple[int, int]]
+
+
+class StatementChunk(NamedTuple):
+    end: int
+    block_step: int
+    semicolon: bool
+    comments: Tuple[str, ...]
+    key: str | None
+    span: Tuple[int, int] | None
+
+
+class LocalTableNames(dict):
+    # Whether a name is a table variable or temporary table, decided once per spelling.
+    def __init__(self, temp_tables: Iterable[str] = ()) -> None:
+        super().__init__()
+        self.temp_tables = frozenset(temp_tables)
+
+    def __missing__(self, table: str) -> bool:
+        local = self[table] = table in self.temp_tables or table.startswith(LOCAL_TABLE_PREFIXES)
+        return local
+
+
+class IncrementalParser:
+    def __init__(self) -> None:
+        self.source = ""
+        self.dialect = ""
+        self.chunks: List[StatementChunk] = []
+        self.fragments: Dict[str, Dict[str, Any]] = {}
+        self.dirty = False
+        self.last_run: Dict[str, int] = {}
+
+    def parse(self, source: str, dialect: str | None = None, lineage: bool = True) -> Dict[str, Any]:
+        # Fragments are kept across runs, so they always carry their lineage and typing
+        # evidence; the flag only decides whether column_lineage and types are assembled.
+        return self._parse(source, _dialect_profile(source, dialect), lineage)
+
+    def _parse(self, source: str, profile: DialectProfile, lineage: bool) -> Dict[str, Any]:
+        if profile.name != self.dialect:
+            # Chunk boundaries and fragments depend on the lexer profile.
+            self.chunks, self.fragments, self.dialect = [], {}, profile.name
+        head, region_start, region_end, tail = self._plan_reuse(source)
+        stream = tokenize(source, start=region_start, end=region_end, dialect=profile)
+        if tail and not _ends_with_semicolon(stream, region_end):
+            logger.debug("Edited region does not end on a statement boundary; re-tokenizing to the end")
+            region_end, tail = len(source), []
+            stream = tokenize(source, start=region_start, dialect=profile)
+
+        fragments: Dict[str, Dict[str, Any]] = {}
+        region_chunks: List[StatementChunk] = []
+        analysed = 0
+        token_count = len(stream)
+        for boundary, next_first, block_step, comments, statement in _iter_chunks(stream):
+            if boundary >= token_count and tail:
+                break
+            key = span = None
+            if statement is not None:
+                span = (statement["start"], statement["end"])
+                text = source[statement["start"] : statement["end"]]
+                key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+                fragment = fragments.get(key) or self.fragments.get(key)
+                if fragment is None:
+                    fragment = _analyze_statement(stream, statement)
+                    analysed += 1
+                fragments[key] = fragment
+            end = stream.ends[min(next_first, token_count) - 1] if token_count else region_start
+            semicolon = boundary < token_count and stream.values[boundary] == ";"
+            region_chunks.append(StatementChunk(end, block_step, semicolon, comments, key, span))
+
+        chunks = head + region_chunks + tail
+        for chunk in head + tail:
+            if chunk.key is not None:
+                fragments[chunk.key] = self.fragments[chunk.key]
+        self.source, self.chunks, self.fragments = source, chunks, fragments
+        self.dirty = True
+        self.last_run = {
+            "statements": sum(1 for chunk in chunks if chunk.key is not None),
+            "analysed": analysed,
+            "retokenized_chars": region_end - region_start,
+        }
+        logger.debug("Incremental parse: %s", self.last_run)
+        return _assemble_parse_result(
+            source,
+            (
+                (chunk.comments, fragments[chunk.key], chunk.span, chunk.block_step)
+                if chunk.key is not None
+                else (chunk.comments, None, None, chunk.block_step)
+                for chunk in chunks
+            ),
+            lineage,
+        )
+
+    def _plan_reuse(self, source: str) -> Tuple[List[StatementChunk], int, int, List[StatementChunk]]:
+        previous, chunks = self.source, self.chunks
+        if not chunks:
+            return [], 0, len(source), []
+        prefix = _common_prefix_length(previous, source)
+        suffix = _common_suffix_length(previous, source, min(len(previous), len(source)) - prefix)
+        ends = [chunk.end for chunk in chunks]
+
+        head_count = bisect_right(ends, prefix)
+        while head_count and not chunks[head_count - 1].semicolon:
+            head_count -= 1
+        region_start = ends[head_count - 1] if head_count else 0
+
+        # The last re-tokenized chunk must end on a ';' inside the unchanged suffix so
+        # the lexer and splitter resume in the same state as in the previous run.
+        closing = max(bisect_left(ends, len(previous) - suffix + 1), head_count)
+        while closing < len(chunks) and not chunks[closing].semicolon:
+            closing += 1
+        if closing >= len(chunks) - 1:
+            return chunks[:head_count], region_start, len(source), []
+        shift = len(source) - len(previous)
+        tail = [
+            chunk._replace(
+                end=chunk.end + shift,
+                span=(chunk.span[0] + shift, chunk.span[1] + shift) if chunk.span is not None else None,
+            )
+            for chunk in chunks[closing + 1 :]
+        ]
+        return chunks[:head_count], region_start, ends[closing] + shift, tail
+
+    def save(self, path: Path) -> None:
+        state = {
+            "parser_version": PARSER_VERSION,
+            "dialect": self.dialect,
+            "source": self.source,
+            "chunks": [tuple(chunk) for chunk in self.chunks],
+            "fragments": self.fragments,
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(zlib.compress(marshal.dumps(state), 6))
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: Path) -> "IncrementalParser":
+        parser = cls()
+        try:
+            state = marshal.loads(zlib.decompress(path.read_bytes()))
+        except FileNotFoundError:
+            return parser
+        except (OSError, ValueError, EOFError, TypeError, zlib.error) as exc:
+            logger.warning("Ignoring unreadable incremental parse state %s: %s", path, exc)
+            return parser
+        if state.get("parser_version") != PARSER_VERSION:
+            return parser
+        parser.source = state["source"]
+        parser.dialect = state.get("dialect", "")
+        parser.chunks = [StatementChunk(*chunk) for chunk in state["chunks"]]
+        parser.fragments = state["fragments"]
+        return parser
+
+
+def _ends_with_semicolon(stream: TokenStream, offset: int) -> bool:
+    return bool(len(stream)) and stream.values[-1] == ";" and stream.kinds[-1] == PUNCT and stream.ends[-1] == offset
+
+
+def _common_prefix_length(left: str, right: str) -> int:
+    limit = min(len(left), len(right))
+    length = 0
+    while length + COMPARE_BLOCK <= limit and left[length : length + COMPARE_BLOCK] == right[length : length + COMPARE_BLOCK]:
+        length += COMPARE_BLOCK
+    while length < limit and left[length] == right[length]:
+        length += 1
+    return length
+
+
+def _common_suffix_length(left: str, right: str, limit: int) -> int:
+    left_end, right_end = len(left), len(right)
+    length = 0
+    while length + COMPARE_BLOCK <= limit and (
+        left[left_end - length - COMPARE_BLOCK : left_end - length]
+        == right[right_end - length - COMPARE_BLOCK : right_end - length]
+    ):
+        length += COMPARE_BLOCK
+    while length < limit and left[left_end - length - 1] == right[right_end - length - 1]:
+        length += 1
+    return length
+
+
+def _assemble_parse_result(
+    source: str,
+    chunks: Iterable[Tuple[Tuple[str, ...], Dict[str, Any] | None, Tuple[int, int] | None, int]],
+    lineage: bool = False,
+) -> Dict[str, Any]:
+    # Each statement carries the block depth change up to the next statement, so a
+    # bare BEGIN/END between two statements is charged to the one before it.
+    # The statements are kept as parallel lists rather than a tuple each, which
+    # leaves the garbage collector fewer objects to rescan on a large procedure.
+    fragments: List[Dict[str, Any]] = []
+    statement_comments: List[Tuple[str, ...]] = []
+    spans: List[Tuple[int, int]] = []
+    block_steps: List[int] = []
+    pending_comments: Tuple[str, ...] = ()
+    for comments, fragment, span, block_step in chunks:
+        pending_comments += comments
+        if fragment is not None:
+            fragments.append(fragment)
+            statement_comments.append(pending_comments)
+            spans.append(span)
+            block_steps.append(block_step)
+            pending_comments = ()
+        elif fragments:
+            block_steps[-1] += block_step
+    flagged_statements = [
+        {"span": span, "reason": fragment["flag"]} for fragment, span in zip(fragments, spans) if fragment["flag"]
+    ]
+    for flagged in flagged_statements:
+        logger.warning("Statement at %s was only partially analysed: %s", flagged["span"], flagged["reason"])
+    # CTEs, table variables and temporary tables appear in procedure_steps but are
+    # not tables of the schema, so they are left out of every table-keyed result.
+    local_names = LocalTableNames(
+        fragment["control"]["name"]
+        for fragment in fragments
+        if fragment["control"] is not None and fragment["control"]["kind"] == "temp_table"
+    )
+    statement_ctes = [_cte_names(fragment["step"]) for fragment in fragments]
+    tables, alias_map = _collect_tables_and_aliases(fragments, local_names, statement_ctes)
+    crud_details = _collect_crud_details(fragments, tables, alias_map, local_names, statement_ctes, lineage)
     fields_map = crud_details["table_fields"]
     field_detail_map = crud_details["table_field_details"]
-    table_dependencies, select_flows, procedure_steps = _analyze_procedure_flow(source, alias_map)
-    procedure_name = _extract_procedure_name(source)
+    table_dependencies, select_flows, procedure_steps = _collect_procedure_flow(
+        zip(statement_comments, fragments, spans, block_steps), alias_map, local_names
+    )
+    procedure_name = next(
+        (fragment["procedure_name"] for fragment in fragments if fragment["procedure_name"]),
+        "procedure",
+    )
     logger.debug("Parsed tables: %s", tables)
     logger.debug("Alias map: %s", alias_map)
     logger.debug("Extracted fields map: %s", fields_map)
-    return {
+    parsed = {
         "tables": sorted(tables),
-        "raw": source,
+        "source": SourceBuffer.from_text(source),
         "alias_map": alias_map,
         "table_fields": fields_map,
         "procedure_name": procedure_name,
@@ -78,139 +413,883 @@ def parse_store_procedure(source: str) -> Dict[str, Any]:
         "table_dependencies": table_dependencies,
         "select_flows": select_flows,
         "procedure_steps": procedure_steps,
-   }
+        "flagged_statements": flagged_statements,
+    }
+    if lineage:
+        parsed["column_lineage"] = _collect_column_lineage(fragments, alias_map, procedure_name).to_dict()
+    return parsed
 
 
-def _extract_tables_and_aliases(pattern: re.Pattern[str], source: str) -> Tuple[Set[str], Dict[str, str]]:
-    tables: Set[str] = set()
-    alias_map: Dict[str, str] = {}
-    matches = pattern.findall(source)
-    for match in matches:
-        if isinstance(match, tuple):
-            table_ref, alias = match
+def _analyze_statement(stream: TokenStream, statement: Dict[str, Any], with_lineage: bool = True) -> Dict[str, Any]:
+    first, stop = statement["token_span"]
+    keyword_positions = stream.keyword_positions
+    statement_keywords = keyword_positions[
+        bisect_left(keyword_positions, first) : bisect_left(keyword_positions, stop)
+    ]
+    values = stream.values
+    references: List[Tuple[str, str, str]] = []
+    inserts: List[Tuple[str, List[str]]] = []
+    updates: List[Tuple[str, List[str]]] = []
+    deletes: List[str] = []
+    lineage: List[Tuple[int, str, str, List[Tuple[str, str]]]] = []
+    declarations: List[Tuple[str, str]] = []
+    procedure_name = ""
+    selects = 0
+    select_into = ""
+    select_list = False
+    for offset, index in enumerate(statement_keywords):
+        keyword = values[index]
+        if keyword == "select":
+            selects += 1
+            select_list = True
+        elif keyword == "from" or keyword == "join":
+            select_list = False
+            reference = _table_reference_at(stream, index + 1, stop)
+            if reference is not None:
+                references.append((keyword, reference[0], reference[1]))
+                if keyword == "join" and with_lineage:
+                    condition_end = statement_keywords[offset + 1] if offset + 1 < len(statement_keywords) else stop
+                    lineage.extend(_join_lineage(stream, reference[2], condition_end))
+        elif keyword == "insert":
+            match = _match_insert(stream, index, stop)
+            if match:
+                table_ref, column_list = match
+                columns = [col.strip().strip("`[]\"") for col in column_list.split(",") if col.strip()]
+                inserts.append((normalize_identifier(table_ref), columns))
+        elif keyword == "update":
+            match = _match_update(stream, index, stop)
+            if match:
+                table_ref, set_clause = match
+                columns = _assignment_lineage(set_clause, table_ref, lineage if with_lineage else None)
+                updates.append((normalize_identifier(table_ref), columns))
+        elif keyword == "delete":
+            if _keyword_at(stream, index + 1, stop, "from") and _table_reference_at(stream, index + 2, stop) is not None:
+                deletes.append(normalize_identifier(values[index + 2]))
+        elif keyword == "merge":
+            merge = _match_merge(stream, index, stop)
+            if merge is not None:
+                _merge_fragment(stream, merge, references, inserts, updates, deletes, lineage if with_lineage else None)
+        elif keyword == "into" and select_list:
+            if DIALECTS[stream.dialect].select_into_creates_table:
+                reference = _table_reference_at(stream, index + 1, stop)
+                if reference is not None:
+                    select_into = reference[0]
+        elif keyword == "create" and not procedure_name:
+            name_position = _procedure_name_position(stream, index, stop)
+            if name_position is not None:
+                procedure_name = _procedure_name_from(values[name_position])
+                declarations.extend(_parameter_declarations(stream, name_position + 1, stop))
+    control = query = None
+    if statement["type"] in CONTROL_STATEMENT_TYPES or values[stop - 1] in DIALECTS[stream.dialect].block_openers:
+        control, query = _control_info(stream, first, stop, statement_keywords)
+        if control is not None and control["kind"] == "fetch":
+            # FETCH ... FROM names a cursor, not a table.
+            references = []
+    if updates and references:
+        # UPDATE alias SET ... FROM table alias names the target by its alias.
+        local_aliases = {alias: table for _, table, alias in references if alias}
+        updates = [(local_aliases.get(table, table), columns) for table, columns in updates]
+    if statement["type"] == "declare" or statement["type"] not in DIALECTS[stream.dialect].keywords:
+        # Any other statement that opens with a keyword cannot declare a variable.
+        declarations.extend(_variable_declarations(stream, first, stop))
+    typing_evidence = _typing_evidence(stream, first, stop, inserts) if with_lineage else None
+    # Only statements with more than one SELECT can nest, so the per-token depth
+    # scan is skipped for everything else.
+    nesting = None
+    flag = None
+    if selects > 1:
+        timeout = float(PROJECT_SETTINGS.get("statement_scan_timeout_seconds", 2.0))
+        try:
+            nesting = _scan_nesting(stream, first, stop, statement_keywords, time.perf_counter() + timeout)
+        except StatementScanTimeout as exc:
+            flag = str(exc)
+    if flag is not None:
+        reads: Tuple[Tuple[str, str], ...] = ()
+        # Only the keyword and the first table are known without the nesting scan, but
+        # the statement stays in the flow so the flag can be seen where it happened.
+        kind = statement["type"].upper()
+        step = {
+            "type": kind,
+            "base_table": references[0][1] if references else "",
+            "statement_prefix": f"Partially analysed {kind} statement:",
+            "flag": flag,
+        }
+    else:
+        select_clauses = list(_iter_select_clauses(stream, statement_keywords, nesting))
+        # Aliases are lower-cased when they are resolved, not once per reference here.
+        reads = tuple(chain.from_iterable(map(_column_references, select_clauses)))
+        # SELECT INTO needs the output names even without lineage.
+        step = _analyze_step(stream, statement, statement_keywords, nesting, with_lineage or bool(select_into))
+        if step is None and query is not None:
+            # The query a cursor or FOR loop iterates over is described like a SELECT.
+            query_keywords = [position for position in statement_keywords if query[0] <= position < query[1]]
+            query_statement = dict(statement, type="select", token_span=query)
+            step = _analyze_step(stream, query_statement, query_keywords, None, with_lineage)
+        elif step is not None and statement["type"] == "with":
+            step["ctes"] = _cte_definitions(stream, first, stop, statement_keywords)
+        if step is not None and step["type"] == "SELECT":
+            outputs = step.pop("outputs")
+            lineage.extend((DERIVES_FROM, select_into, name, sources) for name, sources in outputs)
+            if select_into:
+                inserts.append((select_into, [name for name, _ in outputs]))
+        elif step is not None and step["type"] == "UPDATE" and updates:
+            table = updates[0][0]
+            step.update(base_table=table, statement_prefix=f"Update {table} with statement:")
+        elif inserts and select_clauses and with_lineage:
+            # INSERT ... SELECT pairs the target columns with the select list by position.
+            table, columns = inserts[0]
+            base = next((alias or name for keyword, name, alias in references if keyword == "from"), "")
+            for position, (column, expression) in enumerate(zip(columns, _split_columns(select_clauses[0]))):
+                _, sources = _expression_lineage(expression, base, position)
+                if sources:
+                    lineage.append((DERIVES_FROM, table, column, sources))
+    return {
+        "references": tuple(references),
+        "reads": reads,
+        "inserts": tuple((table, tuple(columns)) for table, columns in inserts) if inserts else (),
+        "updates": tuple((table, tuple(columns)) for table, columns in updates) if updates else (),
+        "deletes": tuple(deletes),
+        "procedure_name": procedure_name,
+        "step": step,
+        "control": control,
+        "flag": flag,
+        "lineage": tuple(lineage),
+        "declarations": tuple(declarations),
+        "typing_evidence": typing_evidence,
+    }
+
+
+def _parameter_declarations(stream: TokenStream, position: int, stop: int) -> List[Tuple[str, str]]:
+    # CREATE PROCEDURE p(IN a INT, ...) / p @a INT, ... AS / p (a IN NUMBER) IS v NUMBER;
+    values = stream.values
+    declarations: List[Tuple[str, str]] = []
+    if position < stop and values[position] == "(":
+        parameters = _parenthesised(stream, position, stop)
+        if parameters is None:
+            return declarations
+        declarations.extend(_declared_types(parameters[0]))
+        position = parameters[1]
+    else:
+        header_end = next((index for index in range(position, stop) if values[index].lower() in ("as", "is")), stop)
+        if header_end > position:
+            declarations.extend(
+                _declared_types(_clean_statement_text(stream.source, stream.starts[position], stream.ends[header_end - 1]))
+            )
+        position = header_end
+    if position + 1 < stop and values[position].lower() in ("as", "is"):
+        declarations.extend(
+            _declared_types(_clean_statement_text(stream.source, stream.starts[position + 1], stream.ends[stop - 1]))
+        )
+    return declarations
+
+
+def _variable_declarations(stream: TokenStream, first: int, stop: int) -> List[Tuple[str, str]]:
+    # DECLARE @a INT, @b DATE / DECLARE v DECIMAL(10,2) DEFAULT 0 / PL/SQL v NUMBER := 0
+    head, position, _ = _statement_head(stream, first, stop)
+    if head != "declare" and not (
+        position + 1 < stop and stream.kinds[position] == NAME and stream.values[position + 1].lower() in SQL_TYPE_CATEGORIES
+    ):
+        return []
+    if head == "declare":
+        position += 1
+    if position >= stop:
+        return []
+    return _declared_types(_clean_statement_text(stream.source, stream.starts[position], stream.ends[stop - 1]))
+
+
+def _declared_types(text: str) -> List[Tuple[str, str]]:
+    declarations: List[Tuple[str, str]] = []
+    for item in _split_by_comma_outside_parentheses(text):
+        words = [word for word in item.split() if word.lower() not in PARAMETER_MODE_WORDS]
+        if len(words) < 2:
+            continue
+        category = type_category(" ".join(words[1:]))
+        if category is not None:
+            declarations.append((words[0].lower(), category))
+    return declarations
+
+
+def _typing_evidence(
+    stream: TokenStream,
+    first: int,
+    stop: int,
+    inserts: List[Tuple[str, List[str]]],
+) -> Tuple[Tuple[Tuple[str, Tuple[str, ...]], ...], Tuple[Tuple[str, str], ...], Tuple[Tuple[str, str], ...], Tuple[Tuple[str, str, str], ...]] | None:
+    # Typing evidence is kept raw as (inserts, casts, comparisons, insert values) and
+    # only classified for the columns that reach the output, once the whole procedure
+    # is read. The inserts are those before SELECT INTO adds its target.
+    source, values = stream.source, stream.values
+    start, end = stream.starts[first], stream.ends[stop - 1]
+    # Lower-casing the statement once rules out the cast and VALUES scans for most statements.
+    text = source[start:end].lower()
+    casts: List[Tuple[str, str]] = []
+    if "cast" in text or "convert" in text:
+        for index in compress(count(first), map(TYPE_FUNCTION_PATTERNS.__contains__, map(str.lower, values[first:stop]))):
+            pattern, type_group, operand_group = TYPE_FUNCTION_PATTERNS[values[index].lower()]
+            match = pattern.match(source, stream.starts[index], end)
+            if match is not None:
+                category = type_category(match.group(type_group))
+                if category is not None:
+                    casts.append((match.group(operand_group), category))
+    comparisons: List[Tuple[str, str]] = []
+    for index in compress(count(first), map(COMPARISON_CHARS.__contains__, values[first:stop])):
+        if index == first or values[index - 1] in COMPARISON_CHARS:
+            continue
+        operator_end = index + 1
+        while operator_end < stop and values[operator_end] in COMPARISON_CHARS:
+            operator_end += 1
+        left = _operand_before(stream, index, first)
+        right = _operand_after(stream, operator_end, stop)
+        if left and right:
+            comparisons.append((left, right))
+    insert_values: List[Tuple[str, str, str]] = []
+    if len(inserts) == 1 and inserts[0][1] and "values" in text:
+        match = VALUES_PATTERN.search(source, start, end)
+        if match is not None:
+            table, columns = inserts[0]
+            values_text = _balanced_text(source, match.end() - 1, end)
+            for column, value in zip(columns, _split_by_comma_outside_parentheses(values_text)):
+                insert_values.append((table, column.lower(), value))
+    if not casts and not comparisons and not insert_values:
+        return None
+    return tuple((table, tuple(columns)) for table, columns in inserts), tuple(casts), tuple(comparisons), tuple(insert_values)
+
+
+def _evidence_typings(
+    fragment: Dict[str, Any],
+    field_names: Set[str],
+    classified: Dict[Tuple[str, str], List[Tuple[str, str, str, str, float]]],
+) -> List[Tuple[str, str, str, str, float, bool]]:
+    # Typings are (table or alias, column, type, variable, confidence, qualified).
+    # The same comparisons recur across statements, so each is classified once.
+    inserts, casts, comparisons, insert_values = fragment["typing_evidence"]
+    candidates: List[Tuple[str, str, str, str, float]] = []
+    for operand, category in casts:
+        qualifier, _, column = operand.rpartition(".")
+        column = normalize_identifier(column)
+        if column in field_names:
+            candidates.append((qualifier, column, category, "", types_module.CAST_CONFIDENCE))
+    for comparison in comparisons:
+        found = classified.get(comparison)
+        if found is None:
+            found = classified[comparison] = _comparison_typings(comparison, field_names)
+        candidates.extend(found)
+    typings: List[Tuple[str, str, str, str, float, bool]] = []
+    written: Dict[str, str] | None = None
+    default_table = ""
+    for qualifier, column, category, variable, confidence in candidates:
+        if qualifier:
+            table = normalize_identifier(qualifier)
         else:
-            table_ref, alias = match, ""
-        table_name = normalize_identifier(table_ref)
-        tables.add(table_name)
-        if alias:
-            alias_map[alias.lower()] = table_name
+            if written is None:
+                written, default_table = _typing_scope(fragment, inserts)
+            table = written.get(column) or default_table
+        if table:
+            typings.append((table, column, category, variable, confidence, bool(qualifier)))
+    for table, column, value in insert_values:
+        if column not in field_names:
+            continue
+        literal = literal_category(value)
+        if literal is not None:
+            typings.append((table, column, literal[0], "", literal[1], True))
+        elif VARIABLE_OPERAND_PATTERN.fullmatch(value):
+            typings.append((table, column, "", value.lstrip(":").lower(), types_module.VARIABLE_CONFIDENCE, True))
+    return typings
+
+
+def _comparison_typings(comparison: Tuple[str, str], field_names: Set[str]) -> List[Tuple[str, str, str, str, float]]:
+    # (qualifier, column, type, variable, confidence) for each side that is an output column.
+    left, right = comparison
+    typings: List[Tuple[str, str, str, str, float]] = []
+    for target, other in ((left, right), (right, left)):
+        if target[0] in "@:'" or "(" in target:
+            continue
+        qualifier, _, column = target.rpartition(".")
+        column = normalize_identifier(column)
+        if column not in field_names or literal_category(target) is not None:
+            continue
+        literal = literal_category(other)
+        if literal is not None:
+            typings.append((qualifier, column, literal[0], "", literal[1]))
+        elif other[0] in "@:" or ("." not in other and "(" not in other):
+            typings.append((qualifier, column, "", other.lstrip(":").lower(), types_module.VARIABLE_CONFIDENCE))
+    return typings
+
+
+def _typing_scope(fragment: Dict[str, Any], inserts: Iterable[Tuple[str, Iterable[str]]]) -> Tuple[Dict[str, str], str]:
+    # An unqualified column belongs to the table the statement writes it to, or to
+    # the statement's only table.
+    written = {column.lower(): table for table, columns in (*inserts, *fragment["updates"]) for column in columns}
+    tables = {table for _, table, _ in fragment["references"]}
+    tables.update(table for table, _ in inserts)
+    tables.update(table for table, _ in fragment["updates"])
+    tables.update(fragment["deletes"])
+    return written, next(iter(tables)) if len(tables) == 1 else ""
+
+
+def _operand_before(stream: TokenStream, index: int, first: int) -> str:
+    values = stream.values
+    if values[index - 1] == ")" and index - 3 >= first and values[index - 2] == "(":
+        return values[index - 3] + "()"
+    return values[index - 1] if stream.kinds[index - 1] in OPERAND_KINDS else ""
+
+
+def _operand_after(stream: TokenStream, index: int, stop: int) -> str:
+    if index >= stop:
+        return ""
+    values, kinds = stream.values, stream.kinds
+    if values[index] == "-" and index + 1 < stop and kinds[index + 1] == NUMBER:
+        return "-" + values[index + 1]
+    if kinds[index] not in OPERAND_KINDS:
+        return ""
+    if index + 2 < stop and values[index + 1] == "(" and values[index + 2] == ")":
+        return values[index] + "()"
+    return values[index]
+
+
+def _balanced_text(source: str, opened: int, end: int) -> str:
+    depth = 0
+    for match in PARENTHESIS_PATTERN.finditer(source, opened, end):
+        if match.group() == "(":
+            depth += 1
+        else:
+            depth -= 1
+            if not depth:
+                return source[opened + 1 : match.start()]
+    return source[opened + 1 : end]
+
+
+def _control_info(
+    stream: TokenStream, first: int, stop: int, statement_keywords: List[int]
+) -> Tuple[Dict[str, Any] | None, Tuple[int, int] | None]:
+    values = stream.values
+    head, position, label = _statement_head(stream, first, stop)
+    inline = values[stop - 1] in DIALECTS[stream.dialect].block_openers
+    body_stop = stop - 1 if inline else stop
+    if head == "else" and position + 1 < body_stop and values[position + 1].lower() == "if":
+        head, position = "elseif", position + 1
+    if head == "if" or head in ELSE_IF_WORDS:
+        kind = "if" if head == "if" else "elseif"
+        return {"kind": kind, "inline": inline, "condition": _condition_text(stream, position + 1, body_stop)}, None
+    if head == "else":
+        return {"kind": "else", "inline": inline}, None
+    if head == "while":
+        condition = _condition_text(stream, position + 1, body_stop)
+        return {"kind": "while", "inline": inline, "label": label, "condition": condition}, None
+    if head in ("loop", "repeat"):
+        return {"kind": head, "inline": inline, "label": label}, None
+    if head == "for" and inline:
+        return _for_loop(stream, position, body_stop, label)
+    if head == "fetch":
+        cursor = next(
+            (values[index - 1] for index in range(position + 2, stop) if values[index].lower() in ("into", "bulk")),
+            values[stop - 1],
+        )
+        return {"kind": "fetch", "inline": False, "cursor": normalize_identifier(cursor)}, None
+    if head == "cursor" or (head == "declare" and position + 2 < stop and values[position + 2].lower() == "cursor"):
+        # DECLARE c CURSOR FOR SELECT ... / PL/SQL CURSOR c IS SELECT ...
+        query_start = next((index for index in statement_keywords if values[index] == "select"), None)
+        query = (query_start, stop) if query_start is not None else None
+        return {"kind": "cursor", "inline": False, "name": normalize_identifier(values[position + 1])}, query
+    if head == "declare" and position + 2 < stop and values[position + 2].lower() == "table":
+        return _temp_table(stream, values[position + 1], "variable", position + 3, stop), None
+    if head == "create":
+        position += 1
+        scope = []
+        while position < stop and values[position].lower() in ("global", "local", *TEMPORARY_WORDS):
+            scope.append("temporary" if values[position].lower() in TEMPORARY_WORDS else values[position].lower())
+            position += 1
+        if position + 1 < stop and values[position].lower() == "table":
+            name = values[position + 1]
+            if "temporary" in scope or name.startswith("#"):
+                scope_name = "global temporary" if "global" in scope or name.startswith("##") else "temporary"
+                return _temp_table(stream, name, scope_name, position + 2, stop), None
+    return None, None
+
+
+def _for_loop(
+    stream: TokenStream, position: int, body_stop: int, label: str
+) -> Tuple[Dict[str, Any], Tuple[int, int] | None]:
+    # PL/SQL FOR record IN cursor LOOP / FOR record IN (SELECT ...) LOOP
+    values = stream.values
+    control = {
+        "kind": "for",
+        "inline": True,
+        "label": label,
+        "condition": _condition_text(stream, position + 1, body_stop),
+        "record": values[position + 1] if position + 1 < body_stop else "",
+        "cursor": "",
+    }
+    query = None
+    source = position + 3 if position + 2 < body_stop and values[position + 2].lower() == "in" else body_stop
+    if source < body_stop and values[source].lower() == "reverse":
+        source += 1
+    if source >= body_stop:
+        return control, None
+    if values[source] == "(":
+        body = _parenthesised(stream, source, body_stop)
+        if body is not None:
+            query = (source + 1, body[1] - 1)
+    elif stream.kinds[source] == NAME and "." not in values[source]:
+        control["cursor"] = normalize_identifier(values[source])
+    return control, query
+
+
+def _temp_table(stream: TokenStream, name: str, scope: str, position: int, stop: int) -> Dict[str, Any]:
+    columns: List[str] = []
+    definition = _parenthesised(stream, position, stop)
+    if definition is not None:
+        for item in _split_by_comma_outside_parentheses(definition[0]):
+            word = item.split(None, 1)[0]
+            if word.lower() not in TABLE_CONSTRAINT_WORDS:
+                columns.append(normalize_identifier(word))
+    return {"kind": "temp_table", "inline": False, "name": normalize_identifier(name), "scope": scope, "columns": columns}
+
+
+def _condition_text(stream: TokenStream, start: int, stop: int) -> str:
+    if start >= stop:
+        return ""
+    return " ".join(stream.source[stream.starts[start] : stream.ends[stop - 1]].split())
+
+
+def _cte_definitions(stream: TokenStream, first: int, stop: int, statement_keywords: List[int]) -> List[Dict[str, Any]]:
+    values, kinds = stream.values, stream.kinds
+    position = _statement_head(stream, first, stop)[1] + 1
+    if position < stop and values[position].lower() == "recursive":
+        position += 1
+    definitions: List[Dict[str, Any]] = []
+    while position < stop and kinds[position] in TABLE_REFERENCE_KINDS:
+        name = normalize_identifier(values[position])
+        position += 1
+        if position < stop and values[position] == "(":
+            column_list = _parenthesised(stream, position, stop)
+            if column_list is None:
+                break
+            position = column_list[1]
+        if not _keyword_at(stream, position, stop, "as"):
+            break
+        body = _parenthesised(stream, position + 1, stop)
+        if body is None:
+            break
+        opened, closed = position + 1, body[1] - 1
+        tables: List[str] = []
+        for index in statement_keywords[bisect_left(statement_keywords, opened) : bisect_left(statement_keywords, closed)]:
+            if values[index] == "from" or values[index] == "join":
+                reference = _table_reference_at(stream, index + 1, closed)
+                if reference is not None and reference[0] not in tables:
+                    tables.append(reference[0])
+        definitions.append(
+            {
+                "name": name,
+                "base_table": tables[0] if tables else "",
+                "tables": tables,
+                "span": (stream.starts[opened], stream.ends[closed]),
+            }
+        )
+        position = body[1]
+        if position >= stop or values[position] != ",":
+            break
+        position += 1
+    return definitions
+
+
+def _scan_nesting(
+    stream: TokenStream,
+    first: int,
+    stop: int,
+    statement_keywords: List[int],
+    deadline: float,
+) -> Nesting:
+    kinds, values = stream.kinds, stream.values
+    open_parens: List[int] = []
+    depth_by_position: Dict[int, int] = {}
+    subqueries: List[Tuple[int, int]] = []
+    keyword_set = set(statement_keywords)
+    for position in range(first, stop):
+        if (position - first) % DEADLINE_CHECK_INTERVAL == 0 and time.perf_counter() > deadline:
+            raise StatementScanTimeout(
+                f"nesting scan exceeded its time budget after {position - first} of {stop - first} tokens"
+            )
+        if position in keyword_set:
+            depth_by_position[position] = len(open_parens)
+        if kinds[position] != PUNCT:
+            continue
+        value = values[position]
+        if value == "(":
+            open_parens.append(position)
+        elif value == ")" and open_parens:
+            opened = open_parens.pop()
+            if _first_word_after(stream, opened, position) in SELECT_STATEMENT_TYPES:
+                subqueries.append((opened, position))
+    subqueries.sort()
+    return Nesting([depth_by_position[position] for position in statement_keywords], subqueries)
+
+
+def _first_word_after(stream: TokenStream, index: int, stop: int) -> str:
+    kinds = stream.kinds
+    for position in range(index + 1, stop):
+        if kinds[position] != COMMENT:
+            return stream.values[position].lower()
+    return ""
+
+
+def _clause_text(stream: TokenStream, start: int, end: int, nesting: Nesting | None) -> str:
+    source = stream.source
+    if nesting is None or not nesting.subqueries:
+        return source[start:end]
+    # Parenthesised subqueries are reported as clauses of their own, so the enclosing
+    # clause keeps only an empty placeholder where they were.
+    starts, ends = stream.starts, stream.ends
+    pieces: List[str] = []
+    cursor = start
+    for opened, closed in nesting.subqueries:
+        opened_at = starts[opened]
+        if opened_at < cursor:
+            continue
+        if opened_at >= end:
+            break
+        pieces.append(source[cursor:opened_at])
+        pieces.append("()")
+        cursor = min(ends[closed], end)
+    pieces.append(source[cursor:end])
+    return "".join(pieces)
+
+
+def _collect_tables_and_aliases(
+    fragments: List[Dict[str, Any]],
+    local_names: LocalTableNames | None = None,
+    statement_ctes: List[FrozenSet[str]] | None = None,
+) -> Tuple[Set[str], Dict[str, str]]:
+    local_names = local_names if local_names is not None else LocalTableNames()
+    tables: Set[str] = set()
+    from_aliases: Dict[str, str] = {}
+    join_aliases: Dict[str, str] = {}
+    for fragment, ctes in zip(fragments, statement_ctes or [NO_CTES] * len(fragments)):
+        for keyword, table_name, alias in fragment["references"]:
+            if table_name not in ctes:
+                tables.add(table_name)
+            # Aliases of local tables are kept so their columns still resolve to them.
+            if alias:
+                target = from_aliases if keyword == "from" else join_aliases
+                target[alias] = table_name
+    # Variables and temporary tables are dropped once per name rather than per reference.
+    tables.difference_update([table for table in tables if local_names[table]])
+    alias_map = dict(from_aliases)
+    alias_map.update(join_aliases)
     return tables, alias_map
 
 
-def _extract_procedure_name(source: str) -> str:
-    match = PROCEDURE_PATTERN.search(source)
-    if not match:
-        return "procedure"
-    name = match.group(1)
-    segments = name.split(".")
-    return segments[-1]
+def _cte_names(step: Dict[str, Any] | None) -> FrozenSet[str]:
+    # A CTE name is local to the statement that defines it.
+    ctes = step.get("ctes") if step is not None else None
+    return frozenset(cte["name"] for cte in ctes) if ctes else NO_CTES
 
 
-def _extract_table_fields(source: str, alias_map: Dict[str, str]) -> Dict[str, List[str]]:
-    fields: Dict[str, Set[str]] = defaultdict(set)
-    for match in SELECT_PATTERN.finditer(source):
-        select_clause = match.group(1)
-        for column_expr in _split_columns(select_clause):
-            column_expr = column_expr.strip()
-            if not column_expr:
-                continue
-            column_expr = column_expr.split("--")[0].strip()
-            if not column_expr:
-                continue
-            lower_expr = column_expr.lower()
-            if lower_expr.startswith("distinct "):
-                column_expr = column_expr[len("distinct ") :].strip()
-                lower_expr = column_expr.lower()
-            as_index = lower_expr.find(" as ")
-            if as_index != -1:
-                column_expr = column_expr[:as_index].strip()
-            if "(" in column_expr and ")" in column_expr:
-                continue
-            if "." in column_expr:
-                alias, column = column_expr.split(".", 1)
-                alias = alias.strip().lower()
-                column = column.strip()
-                if not column:
-                    continue
-                table = alias_map.get(alias, normalize_identifier(alias))
-                fields[table].add(column)
-            else:
-                continue
-    return {table: sorted(columns) for table, columns in fields.items()}
+def _table_reference_at(stream: TokenStream, index: int, stop: int) -> Tuple[str, str, int] | None:
+    if index >= stop:
+        return None
+    kinds, values, starts, ends = stream.kinds, stream.values, stream.starts, stream.ends
+    if kinds[index] not in TABLE_REFERENCE_KINDS or starts[index] == ends[index - 1]:
+        return None
+    table_name = normalize_identifier(values[index])
+    position = index + 1
+    if position >= stop or starts[position] == ends[index]:
+        return table_name, "", position
+    alias = _alias_word(kinds[position], values[position])
+    if alias == "as" and position + 1 < stop and starts[position + 1] > ends[position]:
+        explicit_alias = _alias_word(kinds[position + 1], values[position + 1])
+        if explicit_alias:
+            return table_name, explicit_alias.lower(), position + 2
+    if not alias:
+        return table_name, "", position
+    return table_name, alias.lower(), position + 1
+
+
+def _alias_word(kind: str, value: str) -> str:
+    if kind == KEYWORD:
+        return value
+    if kind != NAME and kind != NUMBER:
+        return ""
+    if value.isascii() and value.isalnum():
+        return value
+    match = ALIAS_PATTERN.match(value)
+    return match.group() if match else ""
+
+
+def _keyword_at(stream: TokenStream, index: int, stop: int, keyword: str) -> bool:
+    if index >= stop:
+        return False
+    return (
+        stream.kinds[index] == KEYWORD
+        and stream.values[index] == keyword
+        and stream.starts[index] > stream.ends[index - 1]
+    )
+
+
+def _procedure_name_position(stream: TokenStream, index: int, stop: int) -> int | None:
+    values = stream.values
+    position = index + 1
+    if position + 1 < stop and values[position].lower() == "or" and values[position + 1].lower() in ("replace", "alter"):
+        position += 2
+    if position >= stop or values[position].lower() not in PROCEDURE_WORDS:
+        return None
+    if values[position].lower() == "package" and position + 1 < stop and values[position + 1].lower() == "body":
+        position += 1
+    position += 1
+    if position >= stop or stream.starts[position] == stream.ends[position - 1]:
+        return None
+    return position
+
+
+def _procedure_name_from(value: str) -> str:
+    match = PROCEDURE_NAME_PATTERN.match(value.replace("[", "").replace("]", "").replace('"', ""))
+    return match.group().split(".")[-1] if match else ""
+
+
+def _iter_select_clauses(
+    stream: TokenStream,
+    keyword_positions: List[int],
+    nesting: Nesting | None = None,
+) -> Iterator[str]:
+    source, values, starts, ends = stream.source, stream.values, stream.starts, stream.ends
+    if nesting is not None:
+        pending_by_depth: Dict[int, int] = {}
+        for index, depth in zip(keyword_positions, nesting.depths):
+            if values[index] == "select":
+                pending_by_depth.setdefault(depth, index)
+            elif values[index] == "from" and depth in pending_by_depth:
+                yield _clause_text(stream, ends[pending_by_depth.pop(depth)], starts[index], nesting)
+        return
+    pending: int | None = None
+    for index in keyword_positions:
+        if pending is None:
+            if values[index] == "select":
+                pending = index
+        elif values[index] == "from":
+            yield source[ends[pending] : starts[index]]
+            pending = None
+
+
+def _resolve_alias(alias: str, alias_map: Dict[str, str]) -> str:
+    table = alias_map.get(alias)
+    if table is None:
+        table = normalize_identifier(alias)
+    return table
 
 
 def _split_columns(select_clause: str) -> List[str]:
-    columns = []
-    current = []
+    if "(" not in select_clause:
+        return select_clause.split(",")
+    columns: List[str] = []
+    pending: List[str] = []
     depth = 0
-    for char in select_clause:
-        if char == "," and depth == 0:
-            columns.append("".join(current))
-            current = []
-            continue
-        if char in "(":
+    for piece in select_clause.split(","):
+        pending.append(piece)
+        depth = _paren_depth(piece, depth)
+        if depth == 0:
+            columns.append(",".join(pending))
+            pending = []
+    if pending:
+        columns.append(",".join(pending))
+    return columns
+
+
+def _paren_depth(text: str, depth: int) -> int:
+    if ")" not in text:
+        return depth + text.count("(")
+    if "(" not in text:
+        return max(0, depth - text.count(")"))
+    for char in text:
+        if char == "(":
             depth += 1
-        elif char in ")":
+        elif char == ")":
             depth = max(0, depth - 1)
-        current.append(char)
-    if current:
-        columns.append("".join(current))
-    return columns
+    return depth
 
 
-def _extract_crud_details(
-    source: str,
+def _column_references(select_clause: str) -> List[Tuple[str, str]]:
+    if " as " not in select_clause.lower():
+        return COLUMN_REFERENCE_PATTERN.findall(select_clause)
+    references: List[Tuple[str, str]] = []
+    for column_expr in _split_columns(select_clause):
+        column_expr = column_expr.strip()
+        if not column_expr or column_expr == "*":
+            continue
+        lower_expr = column_expr.lower()
+        if lower_expr.startswith("distinct "):
+            column_expr = column_expr[len("distinct ") :].strip()
+            lower_expr = column_expr.lower()
+        as_index = lower_expr.find(" as ")
+        if as_index != -1:
+            column_expr = column_expr[:as_index].strip()
+        references.extend(COLUMN_REFERENCE_PATTERN.findall(column_expr))
+    return references
+
+
+def _join_lineage(stream: TokenStream, position: int, condition_end: int) -> List[Tuple[int, str, str, List[Tuple[str, str]]]]:
+    values = stream.values
+    if position > 0 and values[position - 1].lower() == "on":
+        position -= 1
+    if position >= condition_end or values[position].lower() != "on":
+        return []
+    condition = stream.source[stream.ends[position] : stream.starts[condition_end] if condition_end < len(stream) else stream.ends[-1]]
+    return [
+        (JOINS_ON, right_alias, right_column, [(left_alias, left_column)])
+        for left_alias, left_column, right_alias, right_column in JOIN_CONDITION_PATTERN.findall(condition)
+    ]
+
+
+def _expression_lineage(expression: str, default_alias: str, position: int) -> Tuple[str, List[Tuple[str, str]]]:
+    body = expression.strip()
+    if "(" not in body and " " not in body and "\n" not in body:
+        # Plain `alias.column` is by far the most common select item.
+        reference = COLUMN_REFERENCE_PATTERN.fullmatch(body)
+        if reference and not body[0].isdigit():
+            return reference.group(2), [reference.groups()]
+    lower = body.lower()
+    if lower.startswith("distinct "):
+        body = body[len("distinct ") :].strip()
+    name = ""
+    named = OUTPUT_NAME_PATTERN.search(body) if " as " in lower or " into " in lower else None
+    if named:
+        name = named.group(1).strip("`[]\"")
+        body = body[: named.start()].strip()
+    sources = [(alias, column) for alias, column in COLUMN_REFERENCE_PATTERN.findall(body) if not alias[0].isdigit()]
+    bare = BARE_COLUMN_PATTERN.fullmatch(body) is not None and body.lower() not in NON_COLUMN_WORDS
+    if not sources and bare and default_alias:
+        sources = [(default_alias, body)]
+    if not name:
+        if bare:
+            name = body
+        elif len(sources) == 1 and COLUMN_REFERENCE_PATTERN.fullmatch(body):
+            name = sources[0][1]
+        else:
+            name = f"expr{position + 1}"
+    return name, sources
+
+
+def _collect_column_lineage(
+    fragments: List[Dict[str, Any]],
+    alias_map: Dict[str, str],
+    procedure_name: str,
+) -> ColumnLineage:
+    lineage = ColumnLineage()
+    column_id = lineage.column_id
+    sources: List[int] = []
+    targets: List[int] = []
+    kinds: List[int] = []
+    result_sets = 0
+    for fragment in fragments:
+        if not fragment["lineage"]:
+            continue
+        # Aliases are resolved against the statement's own FROM/JOIN list first, so a
+        # short alias reused across statements maps to the right table each time.
+        local_aliases = {alias: table for _, table, alias in fragment["references"] if alias}
+        result_table = ""
+        for kind, target_alias, target_column, references in fragment["lineage"]:
+            if target_alias:
+                target_table = _lineage_table(target_alias, local_aliases, alias_map)
+            else:
+                if not result_table:
+                    result_sets += 1
+                    # Result sets get a dotted name, which no schema-less table name can collide with.
+                    result_table = f"{procedure_name}.result{result_sets}"
+                target_table = result_table
+            target = column_id(target_table, target_column)
+            for source_alias, source_column in references:
+                sources.append(column_id(_lineage_table(source_alias, local_aliases, alias_map), source_column))
+                targets.append(target)
+                kinds.append(kind)
+    lineage.extend(sources, targets, kinds)
+    return lineage
+
+
+def _lineage_table(alias: str, local_aliases: Dict[str, str], alias_map: Dict[str, str]) -> str:
+    alias = normalize_identifier(alias)
+    return local_aliases.get(alias) or _resolve_alias(alias, alias_map)
+
+
+def _collect_column_types(
+    fragments: List[Dict[str, Any]],
+    alias_map: Dict[str, str],
+    field_names: Set[str],
+) -> Dict[Tuple[str, str], Tuple[str, float]]:
+    variables: Dict[str, str] = {}
+    for fragment in fragments:
+        for name, category in fragment["declarations"]:
+            variables.setdefault(name, category)
+    column_types: Dict[Tuple[str, str], Tuple[str, float]] = {}
+    classified: Dict[Tuple[str, str], List[Tuple[str, str, str, str, float]]] = {}
+    for fragment in fragments:
+        if fragment["typing_evidence"] is None:
+            continue
+        typings = _evidence_typings(fragment, field_names, classified)
+        if not typings:
+            continue
+        local_aliases = {alias: table for _, table, alias in fragment["references"] if alias}
+        for table_ref, column, category, variable, confidence, qualified in typings:
+            if not qualified and column in variables:
+                # An unqualified name that is also a declared variable is the variable.
+                continue
+            if variable:
+                category = variables.get(variable)
+                if category is None:
+                    continue
+            key = (_lineage_table(table_ref, local_aliases, alias_map), column)
+            current = column_types.get(key)
+            if current is None or confidence > current[1]:
+                column_types[key] = (category, confidence)
+    return column_types
+
+
+def _collect_crud_details(
+    fragments: List[Dict[str, Any]],
     tables: Set[str],
     alias_map: Dict[str, str],
+    local_names: LocalTableNames | None = None,
+    statement_ctes: List[FrozenSet[str]] | None = None,
+    types: bool = True,
 ) -> Dict[str, Any]:
+    local_names = local_names if local_names is not None else LocalTableNames()
+    statement_ctes = statement_ctes or [NO_CTES] * len(fragments)
     operations: Dict[str, Dict[str, Set[str]]] = defaultdict(
         lambda: {"read": set(), "create": set(), "update": set(), "delete": set()}
     )
+    # Reads repeat the same few aliases, so each spelling is resolved once; a variable
+    # or temporary table resolves to "".
+    read_tables: Dict[str, str] = {}
+    for fragment, ctes in zip(fragments, statement_ctes):
+        for alias, column in fragment["reads"]:
+            table = read_tables.get(alias)
+            if table is None:
+                table = _resolve_alias(alias.lower(), alias_map)
+                table = read_tables[alias] = "" if local_names[table] else table
+            if table and table not in ctes:
+                operations[table]["read"].add(column)
+    tables.update(operations)
 
-    for match in SELECT_PATTERN.finditer(source):
-        select_clause = match.group(1)
-        for column_expr in _split_columns(select_clause):
-            column_expr = column_expr.strip()
-            if not column_expr or column_expr == "*":
+    for fragment, ctes in zip(fragments, statement_ctes):
+        for table, columns in fragment["inserts"]:
+            if local_names[table] or table in ctes:
                 continue
-            lower_expr = column_expr.lower()
-            if lower_expr.startswith("distinct "):
-                column_expr = column_expr[len("distinct ") :].strip()
-                lower_expr = column_expr.lower()
-            as_index = lower_expr.find(" as ")
-            if as_index != -1:
-                column_expr = column_expr[:as_index].strip()
-            for alias, column in re.findall(r"([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)", column_expr):
-                alias_lower = alias.lower()
-                table = alias_map.get(alias_lower, normalize_identifier(alias_lower))
-                operations[table]["read"].add(column)
-                tables.add(table)
-
-    for match in INSERT_PATTERN.finditer(source):
-        table_ref = match.group(1)
-        column_list = match.group(2)
-        table = normalize_identifier(table_ref)
-        tables.add(table)
-        columns = [col.strip().strip("`[]\"") for col in column_list.split(",") if col.strip()]
-        for column in columns:
-            operations[table]["create"].add(column)
-
-    for match in UPDATE_PATTERN.finditer(source):
-        table_ref = match.group(1)
-        set_clause = match.group(2)
-        table = normalize_identifier(table_ref)
-        tables.add(table)
-        assignments = _split_by_comma_outside_parentheses(set_clause)
-        for assignment in assignments:
-            column = assignment.split("=", 1)[0].strip().strip("`[]\"")
-            if column:
-                operations[table]["update"].add(column)
-
-    for match in DELETE_PATTERN.finditer(source):
-        table_ref = match.group(1)
-        table = normalize_identifier(table_ref)
-        tables.add(table)
-        operations[table]["delete"].add("*")
+            tables.add(table)
+            if columns:
+                operations[table]["create"].update(columns)
+
+    for fragment, ctes in zip(fragments, statement_ctes):
+        for table, columns in fragment["updates"]:
+            if local_names[table] or table in ctes:
+                continue
+            tables.add(table)
+            if columns:
+                operations[table]["update"].update(columns)
+
+    for fragment, ctes in zip(fragments, statement_ctes):
+        for table in fragment["deletes"]:
+            if local_names[table] or table in ctes:
+                continue
+            tables.add(table)
+            operations[table]["delete"].add("*")
 
     table_operations = {
         table: sorted([op for op, cols in op_map.items() if cols])
@@ -220,6 +1299,12 @@ def _extract_crud_details(
         table: {op: sorted(columns) for op, columns in op_map.items() if columns}
         for table, op_map in operations.items()
     }
+    column_types: Dict[Tuple[str, str], Tuple[str, float]] = {}
+    if types:
+        field_names = {
+            column.lower() for op_map in operations.values() for op in ("read", "create", "update") for column in op_map[op]
+        }
+        column_types = _collect_column_types(fragments, alias_map, field_names)
     table_fields = {}
     table_field_details = {}
     for table in tables:
@@ -228,7 +1313,11 @@ def _extract_crud_details(
             column_sets.append(set(table_operation_columns.get(table, {}).get(op, [])))
         columns = sorted(set().union(*column_sets)) if column_sets else []
         table_fields[table] = columns
-        table_field_details[table] = [{"name": column, "type": "string"} for column in columns]
+        table_field_details[table] = [
+            {"name": column, "type": column_type, "confidence": confidence}
+            for column in columns
+            for column_type, confidence in (column_types.get((table, column.lower()), UNTYPED_COLUMN),)
+        ]
     return {
         "table_operations": table_operations,
         "table_operation_columns": table_operation_columns,
@@ -237,185 +1326,804 @@ def _extract_crud_details(
     }
 
 
-def _split_statements_with_comments(source: str) -> List[Dict[str, Any]]:
-    statements: List[Dict[str, Any]] = []
-    pending_comments: List[str] = []
-    buffer = ""
-    for line in source.splitlines():
-        stripped = line.strip()
-        if not stripped:
+def _match_insert(stream: TokenStream, index: int, stop: int) -> Tuple[str, str] | None:
+    if not _keyword_at(stream, index + 1, stop, "into"):
+        return None
+    if _table_reference_at(stream, index + 2, stop) is None:
+        return None
+    kinds, values = stream.kinds, stream.values
+    if index + 3 >= stop or kinds[index + 3] != PUNCT or values[index + 3] != "(":
+        return None
+    for position in range(index + 4, stop):
+        if kinds[position] != PUNCT:
             continue
-        if stripped.startswith("--"):
-            pending_comments.append(stripped[2:].strip())
+        if values[position] == ")":
+            column_list = stream.source[stream.ends[index + 3] : stream.starts[position]]
+            return (values[index + 2], column_list) if column_list else None
+        if values[position] == ";":
+            return None
+    return None
+
+
+def _match_update(stream: TokenStream, index: int, stop: int) -> Tuple[str, str] | None:
+    if _table_reference_at(stream, index + 1, stop) is None:
+        return None
+    if not _keyword_at(stream, index + 2, stop, "set"):
+        return None
+    kinds, values = stream.kinds, stream.values
+    clause_end = stream.ends[stop - 1]
+    depth = 0
+    for position in range(index + 3, stop):
+        value = values[position]
+        kind = kinds[position]
+        if kind == PUNCT:
+            if value == "(":
+                depth += 1
+            elif value == ")":
+                depth = max(depth - 1, 0)
+            elif value == ";":
+                clause_end = stream.starts[position]
+                break
+        elif kind == KEYWORD and not depth and (value == "where" or value == "from"):
+            # UPDATE ... SET ... FROM (T-SQL) ends the assignments at the FROM list.
+            clause_end = stream.starts[position]
+            break
+    set_clause = stream.source[stream.ends[index + 2] : clause_end]
+    if not set_clause.strip():
+        return None
+    return values[index + 1], set_clause
+
+
+def _assignment_lineage(
+    set_clause: str,
+    table_ref: str,
+    lineage: List[Tuple[int, str, str, List[Tuple[str, str]]]] | None,
+) -> List[str]:
+    columns = []
+    qualifier = f"{table_ref.lower()}."
+    for assignment in _split_by_comma_outside_parentheses(set_clause):
+        target, _, expression = assignment.partition("=")
+        column = target.strip().strip("`[]\"")
+        if column.lower().startswith(qualifier):
+            column = column[len(qualifier) :]
+        if column:
+            columns.append(column)
+            if lineage is None:
+                continue
+            _, sources = _expression_lineage(expression, table_ref, 0)
+            if sources:
+                lineage.append((DERIVES_FROM, table_ref, column.rsplit(".", 1)[-1], sources))
+    return columns
+
+
+def _match_merge(stream: TokenStream, index: int, stop: int) -> Dict[str, Any] | None:
+    position = index + 2 if _keyword_at(stream, index + 1, stop, "into") else index + 1
+    target = _table_reference_at(stream, position, stop)
+    if target is None:
+        return None
+    table, alias, position = target
+    if alias == "using":
+        alias, position = "", position - 1
+    kinds, values, starts, ends = stream.kinds, stream.values, stream.starts, stream.ends
+    merge: Dict[str, Any] = {
+        "table": table,
+        "alias": alias,
+        "source": None,
+        "condition_end": stop,
+        "set": "",
+        "columns": "",
+        "values": "",
+        "delete": False,
+    }
+    depth = 0
+    while position < stop:
+        kind, word = kinds[position], values[position].lower()
+        if kind == PUNCT:
+            depth += 1 if word == "(" else -1 if word == ")" and depth else 0
+        elif depth == 0 and word == "using" and merge["source"] is None:
+            merge["source"] = _table_reference_at(stream, position + 1, stop)
+        elif depth == 0 and word == "when" and merge["condition_end"] == stop:
+            merge["condition_end"] = position
+        elif depth == 0 and word == "then" and position + 1 < stop:
+            action = values[position + 1].lower()
+            if action == "update" and _keyword_at(stream, position + 2, stop, "set"):
+                clause_end = _merge_clause_end(stream, position + 3, stop)
+                merge["set"] = stream.source[ends[position + 2] : starts[clause_end] if clause_end < stop else ends[stop - 1]]
+                position = clause_end
+                continue
+            if action == "insert":
+                columns = _parenthesised(stream, position + 2, stop)
+                if columns is not None and position + 2 < columns[1] < stop and values[columns[1]].lower() == "values":
+                    inserted = _parenthesised(stream, columns[1] + 1, stop)
+                    if inserted is not None:
+                        merge["columns"], merge["values"] = columns[0], inserted[0]
+                        position = inserted[1]
+                        continue
+            elif action == "delete":
+                merge["delete"] = True
+        position += 1
+    return merge
+
+
+def _merge_clause_end(stream: TokenStream, position: int, stop: int) -> int:
+    kinds, values = stream.kinds, stream.values
+    depth = 0
+    for position in range(position, stop):
+        if kinds[position] == PUNCT:
+            depth += 1 if values[position] == "(" else -1 if values[position] == ")" and depth else 0
+        elif not depth and values[position].lower() == "when":
+            return position
+    return stop
+
+
+def _parenthesised(stream: TokenStream, position: int, stop: int) -> Tuple[str, int] | None:
+    kinds, values = stream.kinds, stream.values
+    if position >= stop or kinds[position] != PUNCT or values[position] != "(":
+        return None
+    depth = 0
+    for closing in range(position, stop):
+        if kinds[closing] != PUNCT:
             continue
-        buffer += line + "\n"
-        while ";" in buffer:
-            stmt, buffer = buffer.split(";", 1)
-            text = stmt.strip()
-            if not text:
+        if values[closing] == "(":
+            depth += 1
+        elif values[closing] == ")":
+            depth -= 1
+            if not depth:
+                return stream.source[stream.ends[position] : stream.starts[closing]], closing + 1
+    return None
+
+
+def _merge_fragment(
+    stream: TokenStream,
+    merge: Dict[str, Any],
+    references: List[Tuple[str, str, str]],
+    inserts: List[Tuple[str, List[str]]],
+    updates: List[Tuple[str, List[str]]],
+    deletes: List[str],
+    lineage: List[Tuple[int, str, str, List[Tuple[str, str]]]] | None,
+) -> None:
+    table, alias = merge["table"], merge["alias"]
+    target_alias = alias or table
+    references.append(("merge", table, alias))
+    source = merge["source"]
+    if source is not None:
+        source_alias = "" if source[1] == "on" else source[1]
+        references.append(("using", source[0], source_alias))
+        if lineage is not None:
+            lineage.extend(_join_lineage(stream, source[2], merge["condition_end"]))
+    if merge["set"]:
+        updates.append((table, _assignment_lineage(merge["set"], target_alias, lineage)))
+    if merge["columns"]:
+        columns = [col.strip().strip("`[]\"") for col in merge["columns"].split(",") if col.strip()]
+        inserts.append((table, columns))
+        for position, (column, expression) in enumerate(zip(columns, _split_columns(merge["values"]))):
+            if lineage is None:
+                break
+            _, sources = _expression_lineage(expression, "", position)
+            if sources:
+                lineage.append((DERIVES_FROM, target_alias, column, sources))
+    if merge["delete"]:
+        deletes.append(table)
+
+
+def iter_statements(stream: TokenStream) -> Iterator[Dict[str, Any]]:
+    # Yields one record per statement as the token stream is split, holding back
+    # only the latest one: a bare BEGIN or END before the next statement still
+    # belongs to its block_step. Records carry type, start/end offsets into the
+    # source, the line comments since the previous statement, depth (the blocks
+    # enclosing the statement) and block_step (the depth change up to the next one).
+    pending: Dict[str, Any] | None = None
+    comments: Tuple[str, ...] = ()
+    depth = 0
+    for _, _, block_step, chunk_comments, statement in _iter_chunks(stream):
+        comments += chunk_comments
+        if statement is not None:
+            if pending is not None:
+                yield pending
+            statement["comments"] = comments
+            statement["depth"] = depth
+            statement["block_step"] = block_step
+            pending = statement
+            comments = ()
+        elif pending is not None:
+            pending["block_step"] += block_step
+        depth = max(depth + block_step, 0)
+    if pending is not None:
+        yield pending
+
+
+def _iter_chunks(
+    stream: TokenStream,
+) -> Iterator[Tuple[int, int, int, Tuple[str, ...], Dict[str, Any] | None]]:
+    source, values, starts = stream.source, stream.values, stream.starts
+    token_count = len(stream)
+    line_comments = [
+        position
+        for position in stream.positions(COMMENT)
+        if values[position].startswith("--") and starts_line(source, starts[position])
+    ]
+    openers = DIALECTS[stream.dialect].block_openers
+    block_words = BLOCK_KEYWORDS | openers
+    block_keywords = [position for position in stream.keyword_positions if values[position] in block_words]
+    boundaries = chain(merge(stream.positions(PUNCT, ";"), block_keywords), (token_count,))
+    comment_count = len(line_comments)
+    comment_cursor = 0
+    first = 0
+    case_depth = 0
+    for boundary in boundaries:
+        value = values[boundary] if boundary < token_count else ";"
+        if value == "case":
+            case_depth += 1
+            continue
+        if value == "end" and case_depth:
+            case_depth -= 1
+            continue
+        stop = boundary
+        next_first = boundary + 1
+        block_step = 0
+        if value in openers:
+            # THEN / DO / LOOP / REPEAT / ELSE end the statement that opens the block
+            # and stay part of it, so the control statement reads as written.
+            if case_depth or boundary < first:
                 continue
-            keyword = text.split(None, 1)[0].lower()
-            statements.append({"type": keyword, "text": text, "comments": pending_comments})
-            pending_comments = []
-    if buffer.strip():
-        keyword = buffer.strip().split(None, 1)[0].lower()
-        statements.append({"type": keyword, "text": buffer.strip(), "comments": pending_comments})
-    return statements
+            opened = _opener_step(stream, first, boundary, value)
+            if opened is None:
+                continue
+            block_step = opened
+            stop = next_first
+        elif value == "begin":
+            follower = _word_after(stream, boundary)
+            if follower in TRANSACTION_WORDS:
+                next_first += 1
+            else:
+                if follower in BLOCK_WORDS:
+                    next_first += 1
+                block_step = 1
+        elif value == "end":
+            follower = _word_after(stream, boundary)
+            closing = _control_end_length(stream, boundary, follower, openers) if follower in CONTROL_FLOW_WORDS else 0
+            if follower in BLOCK_WORDS:
+                next_first += 1
+                block_step = -1
+            elif closing:
+                next_first += closing
+                if openers and follower in BLOCK_CLOSE_WORDS:
+                    block_step = -1
+            else:
+                block_step = -1
 
+        comments: Tuple[str, ...] = ()
+        while comment_cursor < comment_count and line_comments[comment_cursor] < boundary:
+            position = line_comments[comment_cursor]
+            comments += (values[position][2:].strip(),)
+            if position == first:
+                first += 1
+            comment_cursor += 1
+        statement = _build_statement(stream, first, stop) if first < stop else None
+        yield boundary, next_first, block_step, comments, statement
+        first = next_first
+        case_depth = 0
 
-def _analyze_procedure_flow(
-    source: str,
+
+def _opener_step(stream: TokenStream, first: int, boundary: int, opener: str) -> int | None:
+    head = _statement_head(stream, first, boundary + 1)[0]
+    if opener == "then":
+        if head == "if":
+            return 1
+        return 0 if head in ELSE_IF_WORDS else None
+    if opener == "else":
+        return 0 if head == "else" else None
+    if opener == "do":
+        return 1 if head == "while" else None
+    if head == opener or (opener == "loop" and head in ("while", "for")):
+        return 1
+    return None
+
+
+def _control_end_length(stream: TokenStream, index: int, follower: str, openers: FrozenSet[str]) -> int:
+    # END IF; / END LOOP [label]; close a control block; anything else after END
+    # starts the next statement.
+    values, token_count = stream.values, len(stream)
+    if index + 2 < token_count and values[index + 2] == ";":
+        return 1
+    if (
+        openers
+        and follower in LABELLED_CLOSE_WORDS
+        and index + 3 < token_count
+        and stream.kinds[index + 2] == NAME
+        and values[index + 3] == ";"
+    ):
+        return 2
+    return 0
+
+
+def _statement_head(stream: TokenStream, first: int, stop: int) -> Tuple[str, int, str]:
+    kinds, values = stream.kinds, stream.values
+    position = first
+    while position < stop and kinds[position] == COMMENT:
+        position += 1
+    label = ""
+    if position + 1 < stop and kinds[position] == NAME and values[position + 1] == ":":
+        label = values[position]
+        position += 2
+    if position >= stop:
+        return "", position, label
+    return values[position].lower(), position, label
+
+
+def _word_after(stream: TokenStream, index: int) -> str:
+    position = index + 1
+    if position >= len(stream) or stream.kinds[position] not in TABLE_REFERENCE_KINDS:
+        return ""
+    return stream.values[position].lower()
+
+
+def _build_statement(stream: TokenStream, first: int, stop: int) -> Dict[str, Any] | None:
+    kinds, values = stream.kinds, stream.values
+    keyword = ""
+    for position in range(first, stop):
+        if kinds[position] != COMMENT:
+            keyword = values[position].lower()
+            break
+    start, end = stream.starts[first], stream.ends[stop - 1]
+    text = None
+    if not keyword:
+        text = _clean_statement_text(stream.source, start, end)
+        if not text:
+            return None
+        keyword = text.split(None, 1)[0].lower()
+    return {
+        "type": keyword,
+        "text": text,
+        "token_span": (first, stop),
+        "start": start,
+        "end": end,
+    }
+
+
+def _statement_text(stream: TokenStream, statement: Dict[str, Any]) -> str:
+    if statement["text"] is None:
+        statement["text"] = _clean_statement_text(stream.source, statement["start"], statement["end"])
+    return statement["text"]
+
+
+def _analyze_step(
+    stream: TokenStream,
+    statement: Dict[str, Any],
+    statement_keywords: List[int],
+    nesting: Nesting | None = None,
+    outputs: bool = True,
+) -> Dict[str, Any] | None:
+    stmt_type = statement["type"]
+    stop = statement["token_span"][1]
+    if stmt_type in SELECT_STATEMENT_TYPES:
+        block = _match_select_block(stream, statement_keywords, stop, nesting)
+        if block is None:
+            return None
+        columns, base_table, base_alias, rest_keywords, rest_stop = block
+        joins: List[str] = []
+        for position in rest_keywords:
+            if stream.values[position] != "join":
+                continue
+            reference = _table_reference_at(stream, position + 1, rest_stop)
+            if reference is not None:
+                joins.append(reference[0])
+        return {
+            "type": "SELECT",
+            "base_table": base_table,
+            "base_alias": base_alias,
+            "joins": tuple(joins),
+            "columns": tuple(COLUMN_REFERENCE_PATTERN.findall(columns)),
+            "filter": _filter_clause(stream, rest_keywords, rest_stop),
+            "outputs": [
+                _expression_lineage(expression, base_alias or base_table, position)
+                for position, expression in enumerate(_split_columns(columns))
+            ]
+            if outputs
+            else [],
+        }
+    if stmt_type == "update":
+        text = _statement_text(stream, statement)
+        words = text.split()
+        table = normalize_identifier(words[1]) if len(words) > 1 else "unknown"
+        return {"type": "UPDATE", "base_table": table, "statement_prefix": f"Update {table} with statement:"}
+    if stmt_type == "insert":
+        table = _first_table_after(stream, statement_keywords, stop, "into")
+        return {"type": "INSERT", "base_table": table, "statement_prefix": f"Insert into {table}:"}
+    if stmt_type == "delete":
+        table = _first_table_after(stream, statement_keywords, stop, "from")
+        return {"type": "DELETE", "base_table": table, "statement_prefix": f"Delete from {table}:"}
+    if stmt_type == "merge":
+        first = statement["token_span"][0]
+        position = first + 2 if _keyword_at(stream, first + 1, stop, "into") else first + 1
+        reference = _table_reference_at(stream, position, stop)
+        table = reference[0] if reference is not None else "unknown"
+        return {"type": "MERGE", "base_table": table, "statement_prefix": f"Merge into {table}:"}
+    return None
+
+
+def _collect_procedure_flow(
+    statements: Iterable[Tuple[Tuple[str, ...], Dict[str, Any], Tuple[int, int], int]],
     alias_map: Dict[str, str],
+    local_names: LocalTableNames | None = None,
 ) -> Tuple[Dict[str, List[str]], List[List[str]], List[Dict[str, Any]]]:
-    statements = _split_statements_with_comments(source)
+    local_names = local_names if local_names is not None else LocalTableNames()
     table_dependencies: Dict[str, List[str]] = defaultdict(list)
     flow_paths: List[List[str]] = []
-    flow_steps: List[Dict[str, Any]] = []
+    procedure_steps = _nest_steps(_flow_items(statements, alias_map, local_names, table_dependencies, flow_paths))
+    filtered_dependencies = {table: refs for table, refs in table_dependencies.items() if refs}
+    return filtered_dependencies, flow_paths, procedure_steps
 
-    for statement in statements:
-        stmt_type = statement.get("type", "").lower()
-        text = statement.get("text", "")
-        comments = statement.get("comments", [])
 
-        if stmt_type == "select":
-            match = SELECT_BLOCK_PATTERN.search(text)
-            if not match:
-                continue
-            columns = match.group("columns") or ""
-            base_raw = match.group("base") or ""
-            base_alias_raw = match.group("alias") or ""
-            rest = match.group("rest") or ""
-
-            base_table = normalize_identifier(base_raw)
-            base_alias = base_alias_raw.lower() if base_alias_raw else base_table
-            base_table = alias_map.get(base_alias, base_table)
-            if not base_table:
-                continue
+def _flow_items(
+    statements: Iterable[Tuple[Tuple[str, ...], Dict[str, Any], Tuple[int, int], int]],
+    alias_map: Dict[str, str],
+    local_names: LocalTableNames,
+    table_dependencies: Dict[str, List[str]],
+    flow_paths: List[List[str]],
+) -> Iterator[Tuple[Dict[str, Any] | None, Dict[str, Any] | None, int]]:
+    for comments, fragment, span, block_step in statements:
+        step = fragment["step"]
+        control = fragment["control"]
+        entry = None
+        if step is not None:
+            entry = _flow_step(step, comments, span, alias_map, local_names, table_dependencies, flow_paths)
+        if control is not None:
+            entry = _control_step(control, entry, comments, span)
+        yield entry, control, block_step
+
+
+def _flow_step(
+    step: Dict[str, Any],
+    comments: Tuple[str, ...],
+    span: Tuple[int, int],
+    alias_map: Dict[str, str],
+    local_names: LocalTableNames,
+    table_dependencies: Dict[str, List[str]],
+    flow_paths: List[List[str]],
+) -> Dict[str, Any] | None:
+    description_lines: List[str] = []
+    if comments:
+        description_lines.extend(comments)
 
-            joined_tables: List[str] = []
-            for join_match in JOIN_PATTERN.finditer(rest):
-                join_table = normalize_identifier(join_match.group(1))
-                if join_table and join_table != base_table and join_table not in joined_tables:
-                    joined_tables.append(join_table)
-                    if join_table not in table_dependencies[base_table]:
-                        table_dependencies[base_table].append(join_table)
-
-            column_usage: Dict[str, Set[str]] = defaultdict(set)
-            for alias, column in re.findall(r"([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)", columns):
-                alias_lower = alias.lower()
-                table = alias_map.get(alias_lower, normalize_identifier(alias_lower))
-                column_usage[table].add(column)
-                if table != base_table and table not in table_dependencies[base_table]:
-                    table_dependencies[base_table].append(table)
-                if table != base_table and table not in joined_tables:
-                    joined_tables.append(table)
-
-            if joined_tables:
-                flow_paths.append([base_table] + joined_tables)
-
-            description_lines: List[str] = []
-            if comments:
-                description_lines.extend(comments)
-
-            base_columns = sorted(column_usage.get(base_table, []))
-            if base_columns:
-                description_lines.append(
-                    f"Select from {base_table} retrieving {', '.join(base_columns)}."
-                )
+    if step["type"] != "SELECT" or "flag" in step:
+        # The statement text itself is left in the source and rendered on demand
+        # by SourceBuffer.describe_step.
+        entry = {
+            "type": step["type"],
+            "base_table": step["base_table"],
+            "tables": [step["base_table"]] if step["base_table"] else [],
+            "description": description_lines,
+            "span": span,
+            "statement_prefix": step["statement_prefix"],
+        }
+        if "flag" in step:
+            entry["flag"] = step["flag"]
+        return entry
+
+    base_table = step["base_table"]
+    base_alias = step["base_alias"] or base_table
+    base_table = alias_map.get(base_alias, base_table)
+    if not base_table:
+        return None
+
+    # Local tables stay in the step but are neither a dependency nor depend on anything.
+    ctes = _cte_names(step)
+    base_is_local = local_names[base_table] or base_table in ctes
+    dependencies: List[str] = [] if base_is_local else table_dependencies[base_table]
+    joined_tables: List[str] = []
+    for join_table in step["joins"]:
+        if join_table and join_table != base_table and join_table not in joined_tables:
+            joined_tables.append(join_table)
+            if join_table not in dependencies and not (local_names[join_table] or join_table in ctes):
+                dependencies.append(join_table)
+
+    # Columns are grouped by alias first, so each alias is resolved and each table
+    # checked against the dependency list once rather than once per column.
+    alias_columns: Dict[str, Set[str]] = defaultdict(set)
+    for alias, column in step["columns"]:
+        alias_columns[alias].add(column)
+    column_usage: Dict[str, Set[str]] = defaultdict(set)
+    for alias, columns in alias_columns.items():
+        column_usage[_resolve_alias(alias.lower(), alias_map)].update(columns)
+    for table in column_usage:
+        if table != base_table:
+            if table not in dependencies and not (local_names[table] or table in ctes):
+                dependencies.append(table)
+            if table not in joined_tables:
+                joined_tables.append(table)
+
+    if joined_tables:
+        flow_path = [table for table in [base_table, *joined_tables] if not (local_names[table] or table in ctes)]
+        if len(flow_path) > 1:
+            flow_paths.append(flow_path)
+
+    base_columns = sorted(column_usage.get(base_table, []))
+    if base_columns:
+        description_lines.append(
+            f"Select from {base_table} retrieving {', '.join(base_columns)}."
+        )
+    else:
+        description_lines.append(f"Select from {base_table}.")
+
+    for table, cols in column_usage.items():
+        if table == base_table:
+            continue
+        description_lines.append(
+            f"Join to {table} to access {', '.join(sorted(cols))}."
+        )
+
+    if step["filter"]:
+        description_lines.append(f"Filters: {step['filter']}.")
+
+    entry = {
+        "type": "SELECT",
+        "base_table": base_table,
+        "tables": [base_table] + joined_tables,
+        "description": description_lines,
+        "span": span,
+    }
+    if step.get("ctes"):
+        entry["steps"] = [
+            {
+                "type": "CTE",
+                "base_table": cte["base_table"],
+                "tables": cte["tables"],
+                "description": [f"Common table expression {cte['name']} reads {', '.join(cte['tables']) or 'no tables'}."],
+                "span": tuple(cte["span"]),
+                "name": cte["name"],
+            }
+            for cte in step["ctes"]
+        ]
+    return entry
+
+
+def _control_step(
+    control: Dict[str, Any],
+    entry: Dict[str, Any] | None,
+    comments: Tuple[str, ...],
+    span: Tuple[int, int],
+) -> Dict[str, Any] | None:
+    kind = control["kind"]
+    base_table = entry["base_table"] if entry is not None else ""
+    tables = entry["tables"] if entry is not None else []
+    query_lines = entry["description"][len(comments) :] if entry is not None else []
+    if kind == "else":
+        return None
+    if kind == "if" or kind == "elseif":
+        return {
+            "type": "IF",
+            "base_table": "",
+            "tables": [],
+            "description": [*comments, f"If {control['condition']}:"],
+            "span": span,
+            "condition": control["condition"],
+            "steps": [],
+            "else_steps": [],
+        }
+    if kind in ("while", "loop", "repeat", "for"):
+        if kind == "for":
+            heading = f"For each {control['record']} in {control['cursor'] or 'the query'}:"
+        elif kind == "while":
+            heading = f"While {control['condition']}:"
+        else:
+            heading = f"{kind.capitalize()}{' ' + control['label'] if control['label'] else ''}:"
+        return {
+            "type": kind.upper(),
+            "base_table": base_table,
+            "tables": tables,
+            "description": [*comments, heading, *query_lines],
+            "span": span,
+            "condition": control.get("condition", ""),
+            "label": control["label"],
+            "cursor": control.get("cursor", ""),
+            "steps": [],
+        }
+    if kind == "cursor":
+        return {
+            "type": "CURSOR",
+            "base_table": base_table,
+            "tables": tables,
+            "description": [*comments, f"Declare cursor {control['name']}.", *query_lines],
+            "span": span,
+            "cursor": control["name"],
+        }
+    if kind == "fetch":
+        return {
+            "type": "FETCH",
+            "base_table": "",
+            "tables": [],
+            "description": [*comments, f"Fetch the next row from cursor {control['cursor']}."],
+            "span": span,
+            "cursor": control["cursor"],
+        }
+    name, columns = control["name"], control["columns"]
+    verb = "Declare table variable" if control["scope"] == "variable" else f"Create {control['scope']} table"
+    return {
+        "type": "TEMP_TABLE",
+        "base_table": name,
+        "tables": [name],
+        "description": [*comments, f"{verb} {name}{' (' + ', '.join(columns) + ')' if columns else ''}."],
+        "span": span,
+        "scope": control["scope"],
+        "columns": columns,
+    }
+
+
+def _nest_steps(items: Iterable[Tuple[Dict[str, Any] | None, Dict[str, Any] | None, int]]) -> List[Dict[str, Any]]:
+    # Frames are [owner, children, branching IF, opened inline]. BEGIN/END blocks
+    # that are not a control statement's body are transparent and keep appending to
+    # the enclosing list.
+    root: List[Dict[str, Any]] = []
+    frames: List[List[Any]] = [[None, root, None, False]]
+    for entry, control, block_step in items:
+        frame = frames[-1]
+        kind = control["kind"] if control is not None else ""
+        branch = None
+        if kind == "else" or kind == "elseif":
+            # IF ... THEN ... ELSE switches the open IF's branch in place; T-SQL's
+            # END ELSE BEGIN follows the IF it belongs to as a sibling.
+            branch = frame[2] if frame[3] else _last_if(frame[1])
+        if branch is not None:
+            if kind == "elseif":
+                branch["else_steps"] = [entry]
+                target, children = entry, entry["steps"]
             else:
-                description_lines.append(f"Select from {base_table}.")
+                branch["else_steps"] = []
+                target, children = branch, branch["else_steps"]
+            if frame[3]:
+                frame[1], frame[2] = children, target
+            elif block_step > 0:
+                frames.append([target, children, target, False])
+                block_step -= 1
+        elif entry is not None:
+            frame[1].append(entry)
+            if block_step > 0 and entry["type"] in BLOCK_STEP_TYPES:
+                frames.append([entry, entry["steps"], entry if entry["type"] == "IF" else None, control["inline"]])
+                block_step -= 1
+        for _ in range(block_step):
+            frames.append([None, frames[-1][1], None, False])
+        for _ in range(-block_step):
+            if len(frames) > 1:
+                _close_frame(frames.pop())
+    while len(frames) > 1:
+        _close_frame(frames.pop())
+    return root
 
-            for table, cols in column_usage.items():
-                if table == base_table:
-                    continue
-                description_lines.append(
-                    f"Join to {table} to access {', '.join(sorted(cols))}."
-                )
-
-            where_match = re.search(r"\bwhere\b(.*)", rest, re.IGNORECASE | re.DOTALL)
-            if where_match:
-                clause = where_match.group(1)
-                clause = re.split(r"\border\s+by\b|\bgroup\s+by\b|\bhaving\b", clause, flags=re.IGNORECASE)[0]
-                clause = clause.strip()
-                if clause:
-                    description_lines.append(f"Filters: {clause}.")
-
-            flow_steps.append(
-                {
-                    "type": "SELECT",
-                    "base_table": base_table,
-                    "tables": [base_table] + joined_tables,
-                    "description": description_lines,
-                }
-            )
-        elif stmt_type == "update":
-            tokens = text.split()
-            table = normalize_identifier(tokens[1]) if len(tokens) > 1 else "unknown"
-            description_lines = []
-            if comments:
-                description_lines.extend(comments)
-            description_lines.append(f"Update {table} with statement: {text.strip()}.")
-            flow_steps.append(
-                {
-                    "type": "UPDATE",
-                    "base_table": table,
-                    "tables": [table],
-                    "description": description_lines,
-                }
-            )
-        elif stmt_type == "insert":
-            match = re.search(r"into\s+([a-zA-Z0-9_.\[\]\"`]+)", text, re.IGNORECASE)
-            table = normalize_identifier(match.group(1)) if match else "unknown"
-            description_lines = []
-            if comments:
-                description_lines.extend(comments)
-            description_lines.append(f"Insert into {table}: {text.strip()}.")
-            flow_steps.append(
-                {
-                    "type": "INSERT",
-                    "base_table": table,
-                    "tables": [table],
-                    "description": description_lines,
-                }
-            )
-        elif stmt_type == "delete":
-            match = re.search(r"from\s+([a-zA-Z0-9_.\[\]\"`]+)", text, re.IGNORECASE)
-            table = normalize_identifier(match.group(1)) if match else "unknown"
-            description_lines = []
-            if comments:
-                description_lines.extend(comments)
-            description_lines.append(f"Delete from {table}: {text.strip()}.")
-            flow_steps.append(
-                {
-                    "type": "DELETE",
-                    "base_table": table,
-                    "tables": [table],
-                    "description": description_lines,
-                }
-            )
 
-    filtered_dependencies = {table: refs for table, refs in table_dependencies.items() if refs}
-    return filtered_dependencies, flow_paths, flow_steps
+def _last_if(children: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    if not children or children[-1]["type"] != "IF":
+        return None
+    step = children[-1]
+    while len(step["else_steps"]) == 1 and step["else_steps"][0]["type"] == "IF":
+        step = step["else_steps"][0]
+    return step
 
-def _split_by_comma_outside_parentheses(clause: str) -> List[str]:
-    parts = []
-    current = []
-    depth = 0
-    for char in clause:
-        if char == "," and depth == 0:
-            parts.append("".join(current).strip())
-            current = []
+
+def _close_frame(frame: List[Any]) -> None:
+    loop = frame[0]
+    if loop is None or loop["type"] not in LOOP_STEP_TYPES:
+        return
+    operations: List[Dict[str, str]] = []
+    cursors: List[str] = []
+    for step in iter_procedure_steps(loop["steps"]):
+        if step["type"] in BATCHABLE_STEP_TYPES:
+            operation = {"type": step["type"], "table": step["base_table"]}
+            if operation not in operations:
+                operations.append(operation)
+        elif step["type"] == "FETCH" and step["cursor"] not in cursors:
+            cursors.append(step["cursor"])
+    cursor = loop["cursor"] or (cursors[0] if cursors else "")
+    loop["cursor"] = cursor
+    # A FOR loop over an inline query is an implicit cursor.
+    loop["row_by_row"] = bool(cursor or loop["base_table"])
+    loop["batching_candidate"] = bool(operations)
+    loop["batch_operations"] = operations
+    if operations:
+        targets = ", ".join(f"{operation['type']} {operation['table']}" for operation in operations)
+        if cursor:
+            repeated = f"for every row of cursor {cursor}"
+        else:
+            repeated = f"for every row of {loop['base_table']}" if loop["base_table"] else "on every iteration"
+        loop["description"].append(f"Batching candidate: {targets} runs {repeated}; consider one set-based statement.")
+
+
+def iter_procedure_steps(steps: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    for step in steps:
+        yield step
+        yield from iter_procedure_steps(step.get("steps", ()))
+        yield from iter_procedure_steps(step.get("else_steps", ()))
+
+
+def _match_select_block(
+    stream: TokenStream,
+    statement_keywords: List[int],
+    stop: int,
+    nesting: Nesting | None = None,
+) -> Tuple[str, str, str, List[int], int] | None:
+    values = stream.values
+    select_into = DIALECTS[stream.dialect].select_into_creates_table
+    columns_end = None
+    if nesting is None:
+        depths = [0] * len(statement_keywords)
+        base_depth = 0
+    else:
+        # The outermost SELECT is the statement's own; for a CTE it follows the
+        # parenthesised WITH definitions.
+        depths = nesting.depths
+        base_depth = min(
+            depth for position, depth in zip(statement_keywords, depths) if values[position] == "select"
+        )
+    select_index = None
+    for offset, position in enumerate(statement_keywords):
+        if depths[offset] != base_depth:
             continue
-        if char == "(":
-            depth += 1
-        elif char == ")":
-            depth = max(0, depth - 1)
-        current.append(char)
-    if current:
-        parts.append("".join(current).strip())
+        if select_index is None:
+            if values[position] == "select":
+                select_index = position
+            continue
+        if values[position] != "from":
+            if select_into and columns_end is None and values[position] == "into":
+                columns_end = stream.starts[position]
+            continue
+        reference = _table_reference_at(stream, position + 1, stop)
+        if reference is None:
+            continue
+        base_table, alias, rest_first = reference
+        rest_keywords: List[int] = []
+        rest_stop = stop
+        for candidate, depth in zip(statement_keywords[offset + 1 :], depths[offset + 1 :]):
+            if candidate < rest_first or depth != base_depth:
+                continue
+            if values[candidate] in FLOW_BOUNDARY_KEYWORDS:
+                rest_stop = candidate
+                break
+            rest_keywords.append(candidate)
+        columns = _clause_text(stream, stream.ends[select_index], columns_end or stream.starts[position], nesting)
+        if "--" in columns:
+            columns = _clean_statement_text(columns, 0, None)
+        return columns, base_table, alias, rest_keywords, rest_stop
+    return None
+
+
+def _filter_clause(stream: TokenStream, rest_keywords: List[int], rest_stop: int) -> str:
+    values = stream.values
+    where_index = None
+    clause_end = stream.ends[rest_stop - 1]
+    for position in rest_keywords:
+        value = values[position]
+        if where_index is None:
+            if value == "where":
+                where_index = position
+            continue
+        if value == "having":
+            clause_end = stream.starts[position]
+            break
+        follower = FILTER_TERMINATORS.get(value)
+        if follower and _keyword_at(stream, position + 1, rest_stop, follower):
+            clause_end = stream.starts[position]
+            break
+    if where_index is None:
+        return ""
+    return _clean_statement_text(stream.source, stream.ends[where_index], clause_end)
+
+
+def _first_table_after(stream: TokenStream, statement_keywords: List[int], stop: int, keyword: str) -> str:
+    for position in statement_keywords:
+        if stream.values[position] != keyword:
+            continue
+        reference = _table_reference_at(stream, position + 1, stop)
+        if reference is not None:
+            return reference[0]
+    return "unknown"
+
+
+def _split_by_comma_outside_parentheses(clause: str) -> List[str]:
+    parts = (part.strip() for part in _split_columns(clause))
     return [part for part in parts if part]
 
 
+@lru_cache(maxsize=4096)
 def normalize_identifier(identifier: str) -> str:
     cleaned = identifier.strip()
     for char in ("[", "]", "`", '"'):
@@ -425,17 +2133,16 @@ def normalize_identifier(identifier: str) -> str:
 
 
 def map_domains(parsed: Dict[str, List[str]], domain_mapping: Dict[str, List[str]]) -> Dict[str, Any]:
-    table_domains: Dict[str, List[str]] = {table: [] for table in parsed.get("tables", [])}
-    for domain, tables in domain_mapping.items():
-        for table in table_domains:
-            if table in tables:
-                table_domains[table].append(domain)
+    table_domains, unmapped_tables = get_domain_index(domain_mapping).resolve(parsed.get("tables", []))
     logger.debug("Table to domain mapping: %s", table_domains)
+    if unmapped_tables:
+        logger.info("%d tables are not mapped to any domain: %s", len(unmapped_tables), ", ".join(unmapped_tables))
     return {
         "tables": parsed.get("tables", []),
         "domains": domain_mapping,
         "table_domains": table_domains,
-        "raw": parsed.get("raw", ""),
+        "unmapped_tables": unmapped_tables,
+        "source": parsed.get("source"),
         "alias_map": parsed.get("alias_map", {}),
         "table_fields": parsed.get("table_fields", {}),
         "table_field_details": parsed.get("table_field_details", {}),
@@ -445,10 +2152,137 @@ def map_domains(parsed: Dict[str, List[str]], domain_mapping: Dict[str, List[str
         "table_dependencies": parsed.get("table_dependencies", {}),
         "select_flows": parsed.get("select_flows", []),
         "procedure_steps": parsed.get("procedure_steps", []),
+        "flagged_statements": parsed.get("flagged_statements", []),
+        "column_lineage": parsed.get("column_lineage", {}),
     }
 
 
-def create_storeproc_overview(domain_mapped_proc: Dict[str, Any], output_dir: Path | None = None) -> Path | None:
+def get_domain_index(domain_mapping: Dict[str, List[str]]) -> DomainIndex:
+    global _domain_index
+    # Mappings are loaded once and never mutated, so the index is reused for as long
+    # as the same mapping object is passed in.
+    if _domain_index is None or _domain_index[0] is not domain_mapping:
+        _domain_index = (domain_mapping, DomainIndex(domain_mapping))
+    return _domain_index[1]
+
+
+def get_parse_cache() -> ParseCache | None:
+    global _parse_cache
+    if not PROJECT_SETTINGS.get("parse_cache_enabled", True):
+        return None
+    if _parse_cache is None:
+        _parse_cache = ParseCache(
+            Path(PROJECT_SETTINGS.get("parse_cache_dir", "common/cache/parse")),
+            int(PROJECT_SETTINGS.get("parse_cache_max_bytes", 256 * 1024 * 1024)),
+        )
+    return _parse_cache
+
+
+def parse_cache_stats() -> Dict[str, int]:
+    return _parse_cache.stats() if _parse_cache is not None else {}
+
+
+def parse_and_map(
+    sql_text: str | None,
+    domain_mapping: Dict[str, List[str]],
+    cache: ParseCache | None = None,
+    parser: IncrementalParser | None = None,
+    source: SourceBuffer | None = None,
+    dialect: str | None = None,
+    type_catalog: Dict[str, Dict[str, str]] | None = None,
+) -> Dict[str, Any]:
+    # Without sql_text the source buffer is decoded only when the cache misses. On
+    # failure the buffer is closed here, since no result will carry it.
+    try:
+        return _parse_and_map(sql_text, domain_mapping, cache, parser, source, dialect, type_catalog)
+    except BaseException:
+        if source is not None:
+            source.close()
+        raise
+
+
+def _parse_and_map(
+    sql_text: str | None,
+    domain_mapping: Dict[str, List[str]],
+    cache: ParseCache | None,
+    parser: IncrementalParser | None,
+    source: SourceBuffer | None,
+    dialect: str | None,
+    type_catalog: Dict[str, Dict[str, str]] | None,
+) -> Dict[str, Any]:
+    parse = parser.parse if parser is not None else parse_store_procedure
+    dialect = dialect or PROJECT_SETTINGS.get("sql_dialect", "auto")
+    mapped = None
+    if cache is not None:
+        # The catalog overrides column types in the cached payload, so it is part of the key.
+        key = cache.key(
+            sql_text if sql_text is not None else source.encoded(),
+            domain_mapping,
+            f"{PARSER_VERSION}:{dialect}",
+            type_catalog,
+        )
+        mapped = cache.get(key)
+        if mapped is not None:
+            logger.debug("Parse cache hit for %s", key)
+    if mapped is None:
+        if sql_text is None:
+            sql_text = source.text()
+        mapped = map_domains(parse(sql_text, dialect, lineage=True), domain_mapping)
+        if type_catalog:
+            mapped["table_field_details"] = apply_type_catalog(mapped["table_field_details"], type_catalog)
+        if mapped["flagged_statements"]:
+            # A timed-out scan depends on machine load, so the next run may finish it.
+            logger.debug("Not caching a parse result with %d flagged statements", len(mapped["flagged_statements"]))
+        elif cache is not None:
+            # The source text is the cache key's input, so it is never stored.
+            cache.put(key, {field: value for field, value in mapped.items() if field != "source"})
+    if source is not None or "source" not in mapped:
+        mapped["source"] = source or SourceBuffer.from_text(sql_text)
+    return mapped
+
+
+def default_catalog_path(mapping_path: Path) -> Path:
+    return Path(mapping_path).parent / PROJECT_SETTINGS.get("column_type_catalog_filename", "column_types.json")
+
+
+def load_incremental_parser(proc_path: Path) -> IncrementalParser | None:
+    if not PROJECT_SETTINGS.get("incremental_parse_enabled", True):
+        return None
+    return IncrementalParser.load(_incremental_state_path(proc_path))
+
+
+def save_incremental_parser(parser: IncrementalParser, proc_path: Path) -> None:
+    if parser.dirty:
+        parser.save(_incremental_state_path(proc_path))
+        logger.info(
+            "Incremental parse re-analysed %d of %d statements",
+            parser.last_run["analysed"],
+            parser.last_run["statements"],
+        )
+
+
+def _incremental_state_path(proc_path: Path) -> Path:
+    digest = hashlib.sha256(str(Path(proc_path).resolve()).encode("utf-8")).hexdigest()[:32]
+    return Path(PROJECT_SETTINGS.get("incremental_state_dir", "common/cache/incremental")) / f"{digest}.bin"
+
+
+def _parse_source(
+    proc_path: Path,
+    domain_mapping: Dict[str, List[str]],
+    dialect: str | None = None,
+    type_catalog: Dict[str, Dict[str, str]] | None = None,
+) -> Dict[str, Any]:
+    # The buffer is decoded only for a parse and the decoded text lives only that
+    # long; later stages read spans from the buffer, and the procedure closes it.
+    source = read_source(proc_path)
+    parser = load_incremental_parser(proc_path)
+    mapped = parse_and_map(None, domain_mapping, get_parse_cache(), parser, source, dialect, type_catalog)
+    if parser is not None:
+        save_incremental_parser(parser, proc_path)
+    return mapped
+
+
+def create_storeproc_overview(domain_mapped_proc: Procedure, output_dir: Path | None = None) -> Path | None:
     agents = bootstrap_agents()
     overview_agent = agents.get("storeproc_overview")
     if overview_agent is None:
@@ -456,21 +2290,45 @@ def create_storeproc_overview(domain_mapped_proc: Dict[str, Any], output_dir: Pa
         return None
     target_dir = Path(output_dir or PROJECT_SETTINGS.get("output_dir", "output"))
     target_dir.mkdir(parents=True, exist_ok=True)
-    procedure_name = domain_mapped_proc.get("procedure_name", "procedure")
+    procedure_name = domain_mapped_proc.name
     sanitized_name = re.sub(r"[^a-zA-Z0-9_-]+", "_", procedure_name)
     overview_path = target_dir / f"{sanitized_name}_overview.txt"
     overview_text = overview_agent.summarize_procedure(domain_mapped_proc)
     operations_section = _format_operations_summary(
-        domain_mapped_proc.get("table_operations", {}),
-        domain_mapped_proc.get("table_operation_columns", {}),
+        domain_mapped_proc["table_operations"],
+        domain_mapped_proc["table_operation_columns"],
     )
     if operations_section:
         overview_text = f"{overview_text}\n\nCRUD Summary:\n{operations_section}"
-    overview_path.write_text(overview_text, encoding="utf-8")
+    with overview_path.open("w", encoding="utf-8") as overview_file:
+        overview_file.write(overview_text)
+        overview_file.flush()
+        if PROJECT_SETTINGS.get("overview_model_summary", False):
+            _stream_model_summary(overview_agent, domain_mapped_proc, overview_file)
     logger.info("Stored procedure overview written to %s", overview_path)
     return overview_path
 
 
+def _stream_model_summary(overview_agent: Any, domain_mapped_proc: Procedure, overview_file: TextIO) -> None:
+    # The parsed sections are already on disk; the model's summary is appended
+    # delta by delta so readers of the file see it while it is generated.
+    max_tokens = int(PROJECT_SETTINGS.get("overview_model_summary_max_tokens", 400))
+    try:
+        with overview_agent.narrate_procedure(domain_mapped_proc, max_tokens) as stream:
+            overview_file.write("\n\nModel Summary:\n")
+            for delta in stream:
+                overview_file.write(delta)
+                overview_file.flush()
+    except RuntimeError as exc:
+        logger.warning("Model summary for the overview failed: %s", exc)
+        return
+    logger.info(
+        "Model summary streamed into the overview: ttft=%s duration=%.3f seconds",
+        f"{stream.ttft:.3f}" if stream.ttft is not None else "n/a",
+        stream.duration,
+    )
+
+
 def _format_operations_summary(
     table_operations: Dict[str, List[str]],
     table_operation_columns: Dict[str, Dict[str, List[str]]],
@@ -494,12 +2352,17 @@ def run_storeproc_parse_mapper(
     proc_path: Path,
     mapping_path: Path,
     output_dir: Path | None = None,
-) -> Tuple[Dict[str, Any], Path | None]:
-    sql_text = read_file(proc_path)
+    dialect: str | None = None,
+    catalog_path: Path | None = None,
+) -> Tuple[Procedure, Path | None]:
     domain_mapping = load_domain_mapping(mapping_path)
-    parsed = parse_store_procedure(sql_text)
-    logger.info("Parsed stored procedure with %d tables", len(parsed.get("tables", [])))
-    mapped = map_domains(parsed, domain_mapping)
-    overview_path = create_storeproc_overview(mapped, output_dir)
-    mapped["overview_path"] = overview_path
-    return mapped, overview_path
+    type_catalog = load_type_catalog(catalog_path or default_catalog_path(mapping_path))
+    procedure = Procedure.from_dict(_parse_source(proc_path, domain_mapping, dialect, type_catalog))
+    logger.info("Parsed stored procedure %r", procedure)
+    try:
+        overview_path = create_storeproc_overview(procedure, output_dir)
+    except BaseException:
+        procedure.close()
+        raise
+    procedure.overview_path = overview_path
+    return procedure, overview_path
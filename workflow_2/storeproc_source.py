@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import logging
+import mmap
+from bisect import bisect_right
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_BLOCK_BYTES = 1 << 16
+
+
+class SourceBuffer:
+    def __init__(self, text: str | None = None, mapped: mmap.mmap | None = None, path: Path | None = None) -> None:
+        self._text = text
+        self._mapped = mapped
+        self.path = path
+        self._char_offsets: List[int] | None = None
+        self._byte_offsets: List[int] = []
+
+    @classmethod
+    def from_text(cls, text: str) -> "SourceBuffer":
+        return cls(text=text)
+
+    @classmethod
+    def from_path(cls, path: Path, mmap_threshold: int) -> "SourceBuffer":
+        path = Path(path)
+        size = path.stat().st_size
+        if size == 0 or size < mmap_threshold:
+            return cls(text=path.read_bytes().decode("utf-8"), path=path)
+        with path.open("rb") as handle:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        logger.debug("Memory-mapped %s (%d bytes)", path, size)
+        return cls(mapped=mapped, path=path)
+
+    @property
+    def mapped(self) -> bool:
+        return self._mapped is not None
+
+    def text(self, start: int = 0, end: int | None = None) -> str:
+        if self._mapped is None:
+            return self._text[start:end]
+        if start == 0 and end is None:
+            return str(self._mapped, "utf-8")
+        char_offsets = self._index()
+        length = char_offsets[-1]
+        end = length if end is None else min(end, length)
+        if start >= end:
+            return ""
+        if length == len(self._mapped):
+            return str(self._mapped[start:end], "utf-8")
+        first = bisect_right(char_offsets, start) - 1
+        last = bisect_right(char_offsets, end - 1)
+        block = str(self._mapped[self._byte_offsets[first] : self._byte_offsets[last]], "utf-8")
+        base = char_offsets[first]
+        return block[start - base : end - base]
+
+    def encoded(self) -> bytes | mmap.mmap:
+        # The UTF-8 bytes without decoding a mapped file; hashlib reads the mapping directly.
+        if self._mapped is None:
+            return self._text.encode("utf-8")
+        return self._mapped
+
+    def statement(self, span: Tuple[int, int]) -> str:
+        return clean_statement_text(self.text(*span), 0, None).strip()
+
+    def describe_step(self, step: Dict[str, Any]) -> List[str]:
+        prefix = step.get("statement_prefix")
+        if not prefix:
+            return step.get("description", [])
+        return [*step.get("description", []), f"{prefix} {self.statement(step['span'])}."]
+
+    def close(self) -> None:
+        if self._mapped is not None:
+            self._mapped.close()
+
+    def __enter__(self) -> "SourceBuffer":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        if self._mapped is None:
+            return len(self._text)
+        return self._index()[-1]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SourceBuffer):
+            return NotImplemented
+        return self is other or self.text() == other.text()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        # Parse results are logged whole; never let the source text leak into those lines.
+        if self._mapped is not None:
+            return f"SourceBuffer(path={str(self.path)!r}, bytes={len(self._mapped)}, mapped=True)"
+        return f"SourceBuffer(chars={len(self._text)})"
+
+    def _index(self) -> List[int]:
+        # Spans are character offsets into the decoded text. The mapped file is indexed
+        # once in blocks that start on UTF-8 character boundaries so a span decodes
+        # only the blocks it touches.
+        if self._char_offsets is None:
+            mapped = self._mapped
+            size = len(mapped)
+            char_offsets = [0]
+            byte_offsets = [0]
+            position = 0
+            while position < size:
+                block_end = min(position + INDEX_BLOCK_BYTES, size)
+                while block_end < size and mapped[block_end] & 0xC0 == 0x80:
+                    block_end -= 1
+                char_offsets.append(char_offsets[-1] + len(str(mapped[position:block_end], "utf-8")))
+                byte_offsets.append(block_end)
+                position = block_end
+            self._char_offsets, self._byte_offsets = char_offsets, byte_offsets
+        return self._char_offsets
+
+
+def clean_statement_text(source: str, start: int, end: int | None) -> str:
+    lines = source[start:end].splitlines()
+    if len(lines) == 1:
+        return lines[0].strip()
+    kept = [line for line in lines if line.strip() and not line.lstrip().startswith("--")]
+    return "\n".join(kept).strip()
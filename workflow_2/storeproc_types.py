@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+STRING = "string"
+INTEGER = "integer"
+DECIMAL = "decimal"
+DATE = "date"
+DATETIME = "datetime"
+BOOLEAN = "boolean"
+COLUMN_TYPES = (STRING, INTEGER, DECIMAL, DATE, DATETIME, BOOLEAN)
+
+# Confidence by kind of evidence; a column keeps the type from its strongest evidence.
+CATALOG_CONFIDENCE = 1.0
+CAST_CONFIDENCE = 0.9
+VARIABLE_CONFIDENCE = 0.8
+LITERAL_CONFIDENCE = 0.6
+STRING_LITERAL_CONFIDENCE = 0.4
+
+SQL_TYPE_CATEGORIES: Dict[str, str] = {
+    **dict.fromkeys(
+        ("int", "integer", "bigint", "smallint", "tinyint", "mediumint", "serial", "bigserial", "pls_integer", "binary_integer"),
+        INTEGER,
+    ),
+    **dict.fromkeys(
+        ("decimal", "dec", "numeric", "number", "money", "smallmoney", "float", "real", "double", "binary_float", "binary_double"),
+        DECIMAL,
+    ),
+    DATE: DATE,
+    **dict.fromkeys(("datetime", "datetime2", "smalldatetime", "datetimeoffset", "timestamp", "timestamptz"), DATETIME),
+    **dict.fromkeys(("bit", "boolean", "bool"), BOOLEAN),
+    **dict.fromkeys(
+        (
+            "string",
+            "char",
+            "varchar",
+            "nchar",
+            "nvarchar",
+            "varchar2",
+            "nvarchar2",
+            "text",
+            "ntext",
+            "clob",
+            "nclob",
+            "uniqueidentifier",
+            "uuid",
+            "xml",
+            "json",
+        ),
+        STRING,
+    ),
+}
+# NUMBER(10) and DECIMAL(10, 0) hold whole numbers only.
+SCALED_TYPES = frozenset({"decimal", "dec", "numeric", "number"})
+SQL_TYPE_PATTERN = re.compile(r"\s*([A-Za-z_][A-Za-z0-9_]*)\s*(?:\(\s*(\d+|max)?\s*(?:,\s*(-?\d+)\s*)?\))?", re.IGNORECASE)
+INTEGER_LITERAL_PATTERN = re.compile(r"-?\d+")
+DECIMAL_LITERAL_PATTERN = re.compile(r"-?\d*\.\d+")
+DATE_LITERAL_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+DATETIME_LITERAL_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}")
+# Function and keyword literals, compared lower-cased with whitespace removed.
+LITERAL_WORDS: Dict[str, str] = {
+    **dict.fromkeys(
+        ("getdate()", "getutcdate()", "sysdatetime()", "now()", "current_timestamp", "sysdate", "systimestamp", "localtimestamp"),
+        DATETIME,
+    ),
+    **dict.fromkeys(("current_date", "curdate()", "trunc(sysdate)"), DATE),
+    **dict.fromkeys(("true", "false"), BOOLEAN),
+}
+
+
+def type_category(sql_type: str) -> str | None:
+    match = SQL_TYPE_PATTERN.match(sql_type)
+    if match is None:
+        return None
+    base, precision, scale = match.group(1).lower(), match.group(2), match.group(3)
+    if base in SCALED_TYPES and precision and precision.isdigit() and scale in (None, "0"):
+        return INTEGER
+    return SQL_TYPE_CATEGORIES.get(base)
+
+
+@lru_cache(maxsize=4096)
+def literal_category(operand: str) -> Tuple[str, float] | None:
+    first = operand[:1]
+    if first == "'" or first in ("N", "n") and operand[1:2] == "'":
+        if len(operand) < 2 or not operand.endswith("'"):
+            return None
+        text = operand[operand.index("'") + 1 : -1]
+        if DATETIME_LITERAL_PATTERN.match(text):
+            return DATETIME, LITERAL_CONFIDENCE
+        if DATE_LITERAL_PATTERN.fullmatch(text):
+            return DATE, LITERAL_CONFIDENCE
+        return STRING, STRING_LITERAL_CONFIDENCE
+    if first.isdigit() or first in ("-", "."):
+        if INTEGER_LITERAL_PATTERN.fullmatch(operand):
+            return INTEGER, LITERAL_CONFIDENCE
+        if DECIMAL_LITERAL_PATTERN.fullmatch(operand):
+            return DECIMAL, LITERAL_CONFIDENCE
+        return None
+    category = LITERAL_WORDS.get("".join(operand.lower().split()))
+    return (category, LITERAL_CONFIDENCE) if category is not None else None
+
+
+def load_type_catalog(path: Path | None) -> Dict[str, Dict[str, str]]:
+    if path is None or not Path(path).is_file():
+        return {}
+    try:
+        raw = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as exc:
+        raise RuntimeError(f"Unable to read column type catalog {path}: {exc}") from exc
+    if not isinstance(raw, dict):
+        raise RuntimeError(f"Column type catalog {path} must map tables to {{column: type}} objects")
+    catalog: Dict[str, Dict[str, str]] = {}
+    for table, columns in raw.items():
+        if not isinstance(columns, dict):
+            raise RuntimeError(f"Column type catalog entry for {table!r} must be an object")
+        table_key = table.replace("[", "").replace("]", "").replace('"', "").replace("`", "").rsplit(".", 1)[-1].lower()
+        for column, sql_type in columns.items():
+            category = type_category(str(sql_type))
+            if category is None:
+                logger.warning("Ignoring unknown catalog type %r for %s.%s", sql_type, table, column)
+                continue
+            catalog.setdefault(table_key, {})[column.lower()] = category
+    logger.debug("Loaded column type catalog with %d tables from %s", len(catalog), path)
+    return catalog
+
+
+def apply_type_catalog(
+    table_field_details: Dict[str, List[Dict[str, Any]]],
+    catalog: Dict[str, Dict[str, str]],
+) -> Dict[str, List[Dict[str, Any]]]:
+    overridden: Dict[str, List[Dict[str, Any]]] = {}
+    for table, details in table_field_details.items():
+        overrides = catalog.get(table, {})
+        overridden[table] = [
+            {**detail, "type": overrides[detail["name"].lower()], "confidence": CATALOG_CONFIDENCE}
+            if detail["name"].lower() in overrides
+            else detail
+            for detail in details
+        ]
+    return overridden
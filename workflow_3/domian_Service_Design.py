@@ -8,6 +8,7 @@ from common.tools.tools import load_workflow_module
 agents_module = load_workflow_module("workflow_1", "agents")
 DomainDesignAgent = agents_module.DomainDesignAgent
 bootstrap_agents = agents_module.bootstrap_agents
+gather_in_order = agents_module.gather_in_order
 
 logger = logging.getLogger(__name__)
 
@@ -30,10 +31,12 @@ def design_domain_services(domain_mapped_proc: Dict[str, Any], agent: DomainDesi
         if used_tables:
             domain_usage[domain] = used_tables
 
+    logger.debug("Calling DomainDesignAgent for domains=%s", list(domain_usage))
+    plans = gather_in_order(
+        agent.plan_domain_services_async(domain, owned_tables) for domain, owned_tables in domain_usage.items()
+    )
     services = []
-    for domain, owned_tables in domain_usage.items():
-        logger.debug("Calling DomainDesignAgent for domain=%s", domain)
-        plan = agent.plan_domain_services(domain, owned_tables)
+    for (domain, owned_tables), plan in zip(domain_usage.items(), plans):
         plan["dependencies"] = _derive_dependencies(domain, owned_tables, table_domains, table_dependencies)
         services.append(plan)
     logger.info("Planned %d domain services", len(services))
@@ -11,28 +11,39 @@ from common.tools.tools import load_workflow_module
 agents_module = load_workflow_module("workflow_1", "agents")
 ArchitectAgent = agents_module.ArchitectAgent
 bootstrap_agents = agents_module.bootstrap_agents
+gather_in_order = agents_module.gather_in_order
+
+model_module = load_workflow_module("workflow_2", "storeproc_model")
+Procedure = model_module.Procedure
 
 logger = logging.getLogger(__name__)
 
 
 def define_service_architecture(
     domain_services: Dict[str, Any],
-    domain_mapped_proc: Dict[str, Any],
+    domain_mapped_proc: Procedure | Dict[str, Any],
     agent: ArchitectAgent,
 ) -> Dict[str, Any]:
+    procedure = model_module.as_procedure(domain_mapped_proc)
+    services = domain_services.get("services", [])
+    logger.debug("Calling ArchitectAgent for services=%s", [service.get("service_name") for service in services])
+    designs = gather_in_order(
+        agent.design_service_async(service["service_name"], service.get("dependencies", [])) for service in services
+    )
     service_specs = []
-    for service in domain_services.get("services", []):
-        logger.debug("Calling ArchitectAgent for service=%s", service.get("service_name"))
-        spec = agent.design_service(service["service_name"], service.get("dependencies", []))
+    for service, spec in zip(services, designs):
         spec["domain"] = service["domain"]
         spec["owned_tables"] = service.get("owned_tables", [])
-        _augment_service_spec(spec, service, domain_mapped_proc)
+        _augment_service_spec(spec, service, procedure)
         service_specs.append(spec)
     logger.info("Prepared architecture for %d services", len(service_specs))
     return {"services": service_specs}
 
 
-def run_service_architecture(domain_services: Dict[str, Any], domain_mapped_proc: Dict[str, Any]) -> Dict[str, Any]:
+def run_service_architecture(
+    domain_services: Dict[str, Any],
+    domain_mapped_proc: Procedure | Dict[str, Any],
+) -> Dict[str, Any]:
     agents = bootstrap_agents()
     architect: ArchitectAgent = agents["architect"]
     result = define_service_architecture(domain_services, domain_mapped_proc, architect)
@@ -40,7 +51,7 @@ def run_service_architecture(domain_services: Dict[str, Any], domain_mapped_proc
     return result
 
 
-def _augment_service_spec(spec: Dict[str, Any], service_data: Dict[str, Any], domain_mapped_proc: Dict[str, Any]) -> None:
+def _augment_service_spec(spec: Dict[str, Any], service_data: Dict[str, Any], procedure: Procedure) -> None:
     service_name = spec.get("service_name", "Service")
     entity_name = _derive_entity_name(service_name)
     service_kebab = _camel_to_kebab(service_name)
@@ -57,33 +68,19 @@ def _augment_service_spec(spec: Dict[str, Any], service_data: Dict[str, Any], do
     spec["service_kebab"] = service_kebab
     spec["service_slug"] = service_slug
     spec["modules"] = ["oasgen", "api"]
-    table_fields_map = {
-        table: list(domain_mapped_proc.get("table_fields", {}).get(table, []))
-        for table in service_data.get("owned_tables", [])
-    }
-    table_field_details_map = {
-        table: list(domain_mapped_proc.get("table_field_details", {}).get(table, []))
-        for table in service_data.get("owned_tables", [])
-    }
-    table_operations_map = {
-        table: dict(domain_mapped_proc.get("table_operation_columns", {}).get(table, {}))
-        for table in service_data.get("owned_tables", [])
-    }
-    table_dependencies_map = {
-        table: list(domain_mapped_proc.get("table_dependencies", {}).get(table, []))
-        for table in service_data.get("owned_tables", [])
-    }
-    table_id_map = {
-        table: _infer_id_column(table, table_fields_map.get(table, []))
-        for table in service_data.get("owned_tables", [])
-    }
+    owned_tables = service_data.get("owned_tables", [])
+    table_fields_map = {table: procedure.fields(table) for table in owned_tables}
+    table_field_details_map = {table: procedure.field_details(table) for table in owned_tables}
+    table_operations_map = {table: procedure.operation_columns(table) for table in owned_tables}
+    table_dependencies_map = {table: procedure.dependencies(table) for table in owned_tables}
+    table_id_map = {table: _infer_id_column(table, table_fields_map.get(table, [])) for table in owned_tables}
     for table, id_column in table_id_map.items():
         if id_column and id_column not in table_fields_map.get(table, []):
             table_fields_map.setdefault(table, []).insert(0, id_column)
         if id_column:
             detail_list = table_field_details_map.setdefault(table, [])
             if all(detail.get("name") != id_column for detail in detail_list):
-                detail_list.insert(0, {"name": id_column, "type": "string"})
+                detail_list.insert(0, {"name": id_column, "type": "string", "confidence": 0.0})
     spec["table_fields_map"] = table_fields_map
     spec["table_field_details_map"] = table_field_details_map
     spec["table_operation_columns_map"] = table_operations_map
@@ -97,21 +94,18 @@ def _augment_service_spec(spec: Dict[str, Any], service_data: Dict[str, Any], do
     spec["primary_table"] = primary_table
     spec["primary_table_fields"] = primary_fields
     spec["primary_id_column"] = primary_id_column
-    spec["endpoints"] = _plan_endpoints(service_data, domain_mapped_proc, spec, table_id_map)
+    spec["endpoints"] = _plan_endpoints(service_data, procedure, spec, table_id_map)
     spec["files"] = _build_clean_architecture_files(spec)
 
 
 def _plan_endpoints(
     service_data: Dict[str, Any],
-    domain_mapped_proc: Dict[str, Any],
+    procedure: Procedure,
     spec: Dict[str, Any],
     id_map: Dict[str, Optional[str]],
 ) -> List[Dict[str, Any]]:
     endpoints: List[Dict[str, Any]] = []
     service_name = spec.get("service_name", "")
-    table_operations = domain_mapped_proc.get("table_operations", {})
-    table_operation_columns = domain_mapped_proc.get("table_operation_columns", {})
-    table_fields = domain_mapped_proc.get("table_fields", {})
 
     # Common health endpoint
     endpoints.append(
@@ -131,9 +125,9 @@ def _plan_endpoints(
     )
 
     for table in service_data.get("owned_tables", []):
-        ops = table_operations.get(table, [])
-        columns_by_op = table_operation_columns.get(table, {})
-        all_table_columns = table_fields.get(table, [])
+        ops = procedure.operations(table)
+        columns_by_op = procedure.operation_columns(table)
+        all_table_columns = procedure.fields(table)
         id_column = id_map.get(table) or _infer_id_column(table, all_table_columns)
         tag = _pascal_case(table)
 
@@ -7,9 +7,12 @@ from pathlib import Path
 from typing import Any, Dict, List, Set
 
 from settings import PROJECT_SETTINGS
+from common.tools.tools import load_workflow_module
 
 logger = logging.getLogger(__name__)
 
+lineage_module = load_workflow_module("workflow_2", "storeproc_lineage")
+
 
 def build_graph(domain_services: Dict[str, Any], domain_mapped_proc: Dict[str, Any], request_id: str | None) -> Dict[str, Any]:
     req_id = request_id
@@ -128,6 +131,30 @@ def build_graph(domain_services: Dict[str, Any], domain_mapped_proc: Dict[str, A
                         {"table": table, "field": field, "request_ids": [req_id] if req_id else []},
                     )
 
+    # column lineage edges, next to the HAS_FIELD edges of the tables above
+    lineage = lineage_module.ColumnLineage.from_dict(domain_mapped_proc.get("column_lineage", {}))
+    for source_table, source_column, target_table, target_column, edge_type in lineage.edges():
+        source_id = f"field::{source_table}::{source_column}"
+        target_id = f"field::{target_table}::{target_column}"
+        for field_id, table, field in ((source_id, source_table, source_column), (target_id, target_table, target_column)):
+            add_node(
+                field_id,
+                "field",
+                field,
+                {"field": field, "table": table, "request_ids": [req_id] if req_id else []},
+            )
+        add_edge(
+            target_id if edge_type == "DERIVES_FROM" else source_id,
+            edge_type,
+            source_id if edge_type == "DERIVES_FROM" else target_id,
+            {
+                "source": f"{source_table}.{source_column}",
+                "target": f"{target_table}.{target_column}",
+                "procedure": procedure_name,
+                "request_ids": [req_id] if req_id else [],
+            },
+        )
+
     # service dependencies edges
     for domain, services in domain_service_map.items():
         for service in services:
@@ -13,6 +13,7 @@ logger = logging.getLogger(__name__)
 agents_module = load_workflow_module("workflow_1", "agents")
 CodeGeneratorAgent = agents_module.CodeGeneratorAgent
 bootstrap_agents = agents_module.bootstrap_agents
+gather_in_order = agents_module.gather_in_order
 
 DEFAULT_PROMPT_DIR = Path("common") / "prompts" / "generate"
 JAVA_VERSION = "21"
@@ -30,6 +31,28 @@ DYNAMIC_GENERATORS: Dict[str, str] = {
     "__dynamic_oasgen_record_model__": "_render_oasgen_record_model",
 }
 
+# Inferred column type -> (OpenAPI type, OpenAPI format) and Java type; anything
+# below the confidence threshold stays a string.
+OPENAPI_TYPES: Dict[str, Tuple[str, Optional[str]]] = {
+    "integer": ("integer", "int64"),
+    "decimal": ("number", None),
+    "date": ("string", "date"),
+    "datetime": ("string", "date-time"),
+    "boolean": ("boolean", None),
+}
+JAVA_TYPES: Dict[str, str] = {
+    "integer": "Long",
+    "decimal": "BigDecimal",
+    "date": "LocalDate",
+    "datetime": "LocalDateTime",
+    "boolean": "Boolean",
+}
+JAVA_TYPE_IMPORTS: Dict[str, str] = {
+    "BigDecimal": "java.math.BigDecimal",
+    "LocalDate": "java.time.LocalDate",
+    "LocalDateTime": "java.time.LocalDateTime",
+}
+
 
 def load_prompt(template_name: str, prompts_dir: Path) -> str:
     template_path = prompts_dir / template_name
@@ -60,8 +83,15 @@ def build_template_context(service_spec: Dict[str, Any]) -> Dict[str, Any]:
     return context
 
 
-def generate_service(service_spec: Dict[str, Any], agent: CodeGeneratorAgent, prompts_dir: Path, output_root: Path) -> List[Path]:
-    payload = agent.prepare_generation_payload(service_spec)
+def generate_service(
+    service_spec: Dict[str, Any],
+    agent: CodeGeneratorAgent,
+    prompts_dir: Path,
+    output_root: Path,
+    payload: Dict[str, Any] | None = None,
+) -> List[Path]:
+    if payload is None:
+        payload = agent.prepare_generation_payload(service_spec)
     writer = FileWriterTool()
     service_dir = output_root / service_spec["service_name"]
     generated_paths: List[Path] = []
@@ -99,14 +129,15 @@ def run_code_generator(service_architecture: Dict[str, Any], prompts_dir: Path |
     if isinstance(output_root, str):
         output_root = Path(output_root)
     output_root.mkdir(parents=True, exist_ok=True)
+    service_specs = service_architecture.get("services", [])
+    logger.debug(
+        "Calling CodeGeneratorAgent for services=%s",
+        [service_spec.get("service_name") for service_spec in service_specs],
+    )
+    payloads = gather_in_order(generator.prepare_generation_payload_async(service_spec) for service_spec in service_specs)
     all_paths: List[Path] = []
-    for service_spec in service_architecture.get("services", []):
-        logger.debug(
-            "Calling CodeGeneratorAgent for service=%s domain=%s",
-            service_spec.get("service_name"),
-            service_spec.get("domain"),
-        )
-        all_paths.extend(generate_service(service_spec, generator, Path(prompts_path), Path(output_root)))
+    for service_spec, payload in zip(service_specs, payloads):
+        all_paths.extend(generate_service(service_spec, generator, Path(prompts_path), Path(output_root), payload))
     logger.info("Generated %d total files", len(all_paths))
     return all_paths
 
@@ -122,11 +153,15 @@ def _render_openapi_spec(service_spec: Dict[str, Any], file_spec: Optional[Dict[
     endpoints = service_spec.get("endpoints", [])
     table_fields = service_spec.get("table_fields_map", {})
 
-    schemas: Dict[str, Dict[str, str]] = {}
+    schemas: Dict[str, Dict[str, Tuple[str, Optional[str]]]] = {}
     for table, columns in table_fields.items():
         schema_name = _schema_name(table)
         fields = columns or ["id"]
-        schemas[schema_name] = {column: _infer_openapi_type(column) for column in fields}
+        column_types = _column_types(service_spec, table)
+        schemas[schema_name] = {
+            column: OPENAPI_TYPES.get(column_types.get(column, ""), (_infer_openapi_type(column), None))
+            for column in fields
+        }
     health_schema = f"{entity_name}HealthResponse"
 
     lines: List[str] = [
@@ -207,9 +242,11 @@ def _render_openapi_spec(service_spec: Dict[str, Any], file_spec: Optional[Dict[
         lines.append(f"    {name}:")
         lines.append("      type: object")
         lines.append("      properties:")
-        for column, col_type in props.items():
+        for column, (col_type, col_format) in props.items():
             lines.append(f"        {column}:")
             lines.append(f"          type: {col_type}")
+            if col_format:
+                lines.append(f"          format: {col_format}")
     return "\n".join(lines) + "\n"
 
 
@@ -368,10 +405,12 @@ def _render_entity(service_spec: Dict[str, Any], file_spec: Optional[Dict[str, A
         fields.insert(0, id_column)
     id_field = _camel(id_column or "id")
     id_pascal = _pascal(id_column or "id")
+    java_types = _java_types(service_spec, table_name, fields)
 
     lines = [
         f"package {base_package}.entity;",
         "",
+        *_java_type_imports(java_types),
         "import jakarta.persistence.Column;",
         "import jakarta.persistence.Entity;",
         "import jakarta.persistence.GeneratedValue;",
@@ -394,7 +433,7 @@ def _render_entity(service_spec: Dict[str, Any], file_spec: Optional[Dict[str, A
             continue
         camel = _camel(field)
         lines.append(f"    @Column(name = \"{field}\")")
-        lines.append(f"    private String {camel};")
+        lines.append(f"    private {java_types[field]} {camel};")
     lines.append("")
     lines.append(f"    public String get{id_pascal}() {{")
     lines.append(f"        return {id_field};")
@@ -409,11 +448,11 @@ def _render_entity(service_spec: Dict[str, Any], file_spec: Optional[Dict[str, A
         camel = _camel(field)
         pascal = _pascal(field)
         lines.append("")
-        lines.append(f"    public String get{pascal}() {{")
+        lines.append(f"    public {java_types[field]} get{pascal}() {{")
         lines.append(f"        return {camel};")
         lines.append("    }")
         lines.append("")
-        lines.append(f"    public void set{pascal}(String {camel}) {{")
+        lines.append(f"    public void set{pascal}({java_types[field]} {camel}) {{")
         lines.append(f"        this.{camel} = {camel};")
         lines.append("    }")
     lines.append("}")
@@ -428,10 +467,12 @@ def _render_mapper(service_spec: Dict[str, Any], file_spec: Optional[Dict[str, A
     field_details = service_spec.get("table_field_details_map", {}).get(primary_table, [])
     if not field_details:
         field_details = [{"name": column, "type": "string"} for column in service_spec.get("primary_table_fields", [])]
+    java_types = _java_types(service_spec, primary_table, [field.get("name") for field in field_details])
 
     lines = [
         f"package {base_package}.mapper;",
         "",
+        *_java_type_imports(java_types, blank_line=False),
         "import java.time.OffsetDateTime;",
         "import java.util.Collections;",
         "import java.util.LinkedHashMap;",
@@ -476,7 +517,13 @@ def _render_mapper(service_spec: Dict[str, Any], file_spec: Optional[Dict[str, A
         camel = _camel(column)
         pascal = _pascal(column)
         lines.append(f"        if (source.containsKey(\"{column}\")) {{")
-        lines.append(f"            entity.set{pascal}(String.valueOf(source.get(\"{column}\")));")
+        java_type = java_types[column]
+        if java_type == "String":
+            lines.append(f"            entity.set{pascal}(String.valueOf(source.get(\"{column}\")));")
+        else:
+            lines.append(f"            Object {camel}Value = source.get(\"{column}\");")
+            conversion = _java_conversion(java_type, f"String.valueOf({camel}Value)")
+            lines.append(f"            entity.set{pascal}({camel}Value != null ? {conversion} : null);")
         lines.append("        }")
     lines.append("        return entity;")
     lines.append("    }")
@@ -562,21 +609,22 @@ def _render_oasgen_record_model(service_spec: Dict[str, Any], file_spec: Optiona
         class_name = _schema_name(table)
     if not class_name:
         class_name = "GenericRecord"
+    java_types = _java_types(service_spec, table, columns)
 
-    lines = [f"package {base_package}.model;", ""]
+    lines = [f"package {base_package}.model;", "", *_java_type_imports(java_types)]
     lines.append(f"public class {class_name} {{")
     for column in columns:
         camel = _camel(column)
-        lines.append(f"    private String {camel};")
+        lines.append(f"    private {java_types[column]} {camel};")
     for column in columns:
         camel = _camel(column)
         pascal = _pascal(column)
         lines.append("")
-        lines.append(f"    public String get{pascal}() {{")
+        lines.append(f"    public {java_types[column]} get{pascal}() {{")
         lines.append(f"        return {camel};")
         lines.append("    }")
         lines.append("")
-        lines.append(f"    public void set{pascal}(String {camel}) {{")
+        lines.append(f"    public void set{pascal}({java_types[column]} {camel}) {{")
         lines.append(f"        this.{camel} = {camel};")
         lines.append("    }")
     lines.append("}")
@@ -816,6 +864,34 @@ def _schema_name(table: Optional[str]) -> str:
     return _pascal(table) + "Record"
 
 
+def _column_types(service_spec: Dict[str, Any], table: Optional[str]) -> Dict[str, str]:
+    # Identifier columns stay strings so repository and path-variable signatures keep matching.
+    min_confidence = float(PROJECT_SETTINGS.get("type_inference_min_confidence", 0.6))
+    id_column = service_spec.get("table_id_columns", {}).get(table or "")
+    return {
+        detail["name"]: detail.get("type", "string")
+        for detail in service_spec.get("table_field_details_map", {}).get(table or "", [])
+        if detail.get("confidence", 0.0) >= min_confidence and detail["name"] != id_column
+    }
+
+
+def _java_types(service_spec: Dict[str, Any], table: Optional[str], columns: List[str]) -> Dict[str, str]:
+    column_types = _column_types(service_spec, table)
+    return {column: JAVA_TYPES.get(column_types.get(column, ""), "String") for column in columns}
+
+
+def _java_type_imports(java_types: Dict[str, str], blank_line: bool = True) -> List[str]:
+    imports = sorted({JAVA_TYPE_IMPORTS[java_type] for java_type in java_types.values() if java_type in JAVA_TYPE_IMPORTS})
+    lines = [f"import {name};" for name in imports]
+    return lines + [""] if lines and blank_line else lines
+
+
+def _java_conversion(java_type: str, text: str) -> str:
+    if java_type == "BigDecimal":
+        return f"new BigDecimal({text})"
+    return f"{java_type}.{'parse' if java_type.startswith('Local') else 'valueOf'}({text})"
+
+
 def _infer_openapi_type(column: str) -> str:
     lower = column.lower()
     if lower.endswith("_id") or lower == "id":
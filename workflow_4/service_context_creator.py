@@ -12,6 +12,7 @@ logger = logging.getLogger(__name__)
 
 agents_module = load_workflow_module("workflow_1", "agents")
 bootstrap_agents = agents_module.bootstrap_agents
+gather_in_order = agents_module.gather_in_order
 
 READ_ME_TEMPLATE = "service_readme.txt"
 CONTEXT_TEMPLATE = "service_context.json.txt"
@@ -114,14 +115,15 @@ def run_service_context_creator(
     readme_template = _load_template(prompts_path, READ_ME_TEMPLATE)
     context_template = _load_template(prompts_path, CONTEXT_TEMPLATE)
 
+    service_specs = service_architecture.get("services", [])
+    descriptions = gather_in_order(context_agent.describe_service_async(service_spec) for service_spec in service_specs)
     generated_paths: List[Path] = []
-    for service_spec in service_architecture.get("services", []):
+    for service_spec, service_description in zip(service_specs, descriptions):
         service_dir = output_root / service_spec.get("service_name", "service")
         table_details = "\n".join(
             f"- {table}: {', '.join(table_fields.get(table, [])) or 'all columns'}"
             for table in service_spec.get("owned_tables", [])
         ) or "No tables assigned"
-        service_description = context_agent.describe_service(service_spec)
         service_description.setdefault("table_details", table_details)
         service_description.setdefault("dependency_summary", _format_dependencies(service_spec))
         service_description.setdefault("one_liner", service_spec.get("service_name", ""))